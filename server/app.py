@@ -1,25 +1,41 @@
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, jsonify, request, send_file, Response, stream_with_context
 from flask_cors import CORS
 from datetime import datetime, timedelta
-import pandas as pd
-import io
 import cv2
 import numpy as np
 import base64
+import math
 
 # Import Models và AI Engine
-from models.db_models import db, User, Shift, Attendance, UserRole, AttendanceStatus, LeaveRequest, LeaveType, LeaveStatus
+from models.db_models import db, User, Shift, Attendance, AttendanceRollup, DailyAttendanceSummary, UserRole, AttendanceStatus, LeaveRequest, LeaveType, LeaveStatus, ReportJobStatus
 from sqlalchemy import func 
 from core.ai_engine import AIEngine
+from utils.image_utils import read_stream
+from core.face_gallery import face_gallery
+from core.face_template_manager import FaceTemplateManager
+from core.ai_worker_pool import ai_pool
 from core.security import hash_password, verify_password, generate_token, token_required
+from core.principal_cache import principal_cache
 from core.shift_manager import ShiftManager
 from core.leave_manager import LeaveManager
+from core.salary_manager import SalaryManager
+from core.report_manager import ReportManager
+from core.attendance_rollup import AttendanceRollupManager
+from core.checkin_manager import CheckinManager
+from core.checkin_stream import checkin_stream_hub
+from core.attendance_export import AttendanceExporter, EXPORT_FORMATS, LOG_COLUMNS
+from core.report_jobs import report_job_queue, REPORT_TYPES
+from core.attendance_archive import attendance_archive, arrow_available
 from utils.mail_service import init_mail
+from utils.pagination import PAGE_MAX_LIMIT, encode_cursor, decode_cursor
 
 app = Flask(__name__)
 init_mail(app)
+checkin_stream_hub.init_app(app)
+report_job_queue.init_app(app)
+attendance_archive.init_app(app)
 # Allow Authorization header for JWT
-CORS(app, resources={r"/api/*": {"origins": "*"}}, supports_credentials=True, expose_headers=["Authorization"], allow_headers=["Authorization", "Content-Type"])
+CORS(app, resources={r"/api/*": {"origins": "*"}}, supports_credentials=True, expose_headers=["Authorization", "X-Next-Cursor"], allow_headers=["Authorization", "Content-Type"])
 
 @app.errorhandler(500)
 def internal_server_error(e):
@@ -41,6 +57,10 @@ db.init_app(app)
 # Khởi tạo AI Engine
 ai_engine = AIEngine()
 
+def ensure_face_gallery():
+    """Nạp gallery khuôn mặt từ DB vào RAM (chỉ 1 lần mỗi process)"""
+    FaceTemplateManager.ensure_gallery()
+
 # ==========================================
 # 4. API LEAVE MANAGEMENT
 # ==========================================
@@ -81,25 +101,49 @@ def create_leave_request(current_user):
     
     return jsonify({"success": True, "message": "Đã gửi yêu cầu nghỉ phép"})
 
+LEAVE_PAGE_LIMIT = 50    # số đơn nghỉ / trang mặc định
+LOG_PAGE_LIMIT = 20      # số dòng log chấm công / trang mặc định
+
+def read_page_args(default_limit):
+    """?limit=&cursor= cho các API danh sách. Returns: (limit, cursor | None, error)"""
+    limit = request.args.get('limit', default=default_limit, type=int)
+    if limit is None or not 1 <= limit <= PAGE_MAX_LIMIT:
+        return None, None, f"limit phải trong khoảng 1..{PAGE_MAX_LIMIT}"
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return limit, None, None
+    try:
+        return limit, decode_cursor(cursor), None
+    except ValueError:
+        return None, None, "cursor không hợp lệ"
+
+def page_response(results, rows, limit, sort_attr):
+    """Body là list như cũ, cursor của trang sau nằm ở header X-Next-Cursor (rỗng = hết)."""
+    response = jsonify(results)
+    last = rows[limit - 1] if len(rows) > limit else None
+    response.headers['X-Next-Cursor'] = encode_cursor(getattr(last, sort_attr), last.id) if last else ""
+    return response
+
 @app.route('/api/leaves', methods=['GET'])
 @token_required()
 def get_leave_requests(current_user):
     scope = request.args.get("scope", "me")
+    limit, cursor, error = read_page_args(LEAVE_PAGE_LIMIT)
+    if error:
+        return jsonify({"success": False, "message": error}), 400
     
     if scope == "all" and current_user.role == UserRole.ADMIN:
-        requests = LeaveRequest.query.order_by(LeaveRequest.created_at.desc()).all()
+        rows = LeaveManager.list_leave_requests(limit, cursor)
     else:
         # Fallback to "me" scope or if the user is not an Admin trying to access "all"
-        requests = LeaveRequest.query.filter_by(user_id=current_user.id).order_by(LeaveRequest.created_at.desc()).all()
+        rows = LeaveManager.list_leave_requests(limit, cursor, user_id=current_user.id)
         
     results = []
-    for r in requests:
-        user_name = r.user.name if r.user else "Unknown User"
-        
+    for r in rows[:limit]:
         results.append({
             "id": r.id,
             "user_id": r.user_id,
-            "user_name": user_name,
+            "user_name": r.user_name or "Unknown User",
             "leave_type": r.leave_type.value,
             "start_date": r.start_date.strftime("%Y-%m-%d"),
             "end_date": r.end_date.strftime("%Y-%m-%d"),
@@ -108,7 +152,7 @@ def get_leave_requests(current_user):
             "created_at": r.created_at.strftime("%Y-%m-%d %H:%M")
         })
 
-    return jsonify(results)
+    return page_response(results, rows, limit, "created_at")
 
 @app.route('/api/leaves/<int:id>', methods=['PUT'])
 @token_required(roles=['admin'])
@@ -142,6 +186,22 @@ def update_leave_request(current_user, id):
         return jsonify({"success": False, "message": "Trạng thái không hợp lệ"}), 400
 
 
+@app.route('/api/leaves/approve-batch', methods=['POST'])
+@token_required(roles=['admin'])
+def approve_leave_requests(current_user):
+    data = request.json or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        return jsonify({"success": False, "message": "Danh sách yêu cầu trống"}), 400
+
+    approved, results = LeaveManager.approve_leave_requests(ids, current_user.id)
+    return jsonify({
+        "success": approved == len(results),
+        "approved": approved,
+        "results": results
+    }), 200 if approved else 400
+
+
 # ==========================================
 # 1. API AUTH: ĐĂNG KÝ & ĐĂNG NHẬP
 # ==========================================
@@ -172,6 +232,12 @@ def login():
         "user": user.to_dict()
     })
 
+@app.route('/api/auth/stats', methods=['GET'])
+@token_required(roles=['admin'])
+def get_auth_stats(current_user):
+    """Hit ratio / số lần invalidate của principal cache (token_required)"""
+    return jsonify({"success": True, "principal_cache": principal_cache.stats()})
+
 @app.route('/api/profile', methods=['PUT'])
 @token_required()
 def update_profile(current_user):
@@ -194,6 +260,18 @@ def update_profile(current_user):
     db.session.commit()
     return jsonify({"success": True, "message": "Cập nhật thông tin thành công!", "user": current_user.to_dict()}), 200
 
+def read_base_salary(value):
+    """base_salary từ body (số hoặc chuỗi số, >= 0). Returns: (float | None nếu bỏ trống, error)"""
+    if value is None or value == "":
+        return None, None
+    try:
+        number = None if isinstance(value, bool) else float(value)
+    except (TypeError, ValueError):
+        number = None
+    if number is None or not math.isfinite(number) or number < 0:
+        return None, "Lương cơ bản không hợp lệ"
+    return number, None
+
 @app.route('/api/employees', methods=['POST'])
 @token_required(roles=['admin'])
 def create_employee(current_user):
@@ -202,6 +280,9 @@ def create_employee(current_user):
     # 1. Validate trùng username
     if User.query.filter_by(username=data.get('username')).first():
         return jsonify({"success": False, "message": "Tên đăng nhập đã tồn tại!"}), 400
+    base_salary, error = read_base_salary(data.get('base_salary'))
+    if error:
+        return jsonify({"success": False, "message": error}), 400
 
     encodings_to_save = None
     
@@ -209,7 +290,7 @@ def create_employee(current_user):
     if data.get('image'):
         img = AIEngine.base64_to_image(data.get('image'))
         if img is not None:
-             embedding, msg = AIEngine.get_embedding(img)
+             embedding, msg = ai_pool.get_embedding(img)
              if embedding is not None:
                  encodings_to_save = embedding
              else:
@@ -235,10 +316,17 @@ def create_employee(current_user):
         dob=data.get('dob'),
         role=role_enum, 
         face_encoding=encodings_to_save,
-        shift_id=int(data.get('shift_id')) if data.get('shift_id') else None
+        shift_id=int(data.get('shift_id')) if data.get('shift_id') else None,
+        base_salary=base_salary or 0.0
     )
     db.session.add(new_user)
+    db.session.flush()
+    if encodings_to_save is not None:
+        FaceTemplateManager.add_templates(new_user.id, [encodings_to_save], ["center"])
     db.session.commit()
+
+    if encodings_to_save is not None:
+        FaceTemplateManager.refresh_gallery(new_user.id)
     
     return jsonify({"success": True, "message": "Thêm nhân viên thành công!", "user": new_user.to_dict()})
 
@@ -250,12 +338,17 @@ def update_employee(current_user, id):
         return jsonify({"success": False, "message": "Nhân viên không tồn tại"}), 404
     
     data = request.json
+    base_salary, error = read_base_salary(data.get('base_salary'))
+    if error:
+        return jsonify({"success": False, "message": error}), 400
     
     # Update Basic Fields
     user.name = data.get('name', user.name)
     user.email = data.get('email', user.email)
     user.phone = data.get('phone', user.phone)
     user.dob = data.get('dob', user.dob)
+    if base_salary is not None:
+        user.base_salary = base_salary
     
     if 'is_active' in data:
         user.is_active = bool(data.get('is_active'))
@@ -285,15 +378,21 @@ def update_employee(current_user, id):
         # Critical Fix 2: Use AIEngine.base64_to_image
         img = AIEngine.base64_to_image(data.get('image'))
         if img is not None:
-            embedding, msg = AIEngine.get_embedding(img)
+            embedding, msg = ai_pool.get_embedding(img)
             if embedding is not None:
                 user.face_encoding = embedding
+                # Ảnh mới thay thế toàn bộ template cũ
+                FaceTemplateManager.add_templates(user.id, [embedding], ["center"], replace=True)
             else:
                 return jsonify({"message": f"Ảnh lỗi: {msg}"}), 400
         else:
              return jsonify({"message": "Lỗi dữ liệu ảnh"}), 400
 
     db.session.commit()
+    principal_cache.invalidate(user.id)
+
+    if data.get('image'):
+        FaceTemplateManager.refresh_gallery(user.id)
     return jsonify({"success": True, "message": "Cập nhật thành công!"})
 
 @app.route('/api/employees/<int:id>', methods=['DELETE'])
@@ -303,10 +402,17 @@ def delete_employee(current_user, id):
     if not user:
         return jsonify({"success": False, "message": "Nhân viên không tồn tại"}), 404
         
-    # Cascade Delete
-    Attendance.query.filter_by(user_id=id).delete()
+    # Cascade Delete (Attendance + bảng tổng hợp)
+    AttendanceRollupManager.delete_user(id)
     db.session.delete(user)
     db.session.commit()
+    principal_cache.invalidate(id)
+    face_gallery.remove_user(id)
+    # Ghi lại file archive chỉ sau khi DB đã commit (lỗi -> migrations.archive_attendance dọn lại)
+    try:
+        attendance_archive.purge_user(id)
+    except Exception as e:
+        print(f"[ERROR archive] purge user {id}: {str(e)}")
     return jsonify({"success": True, "message": "Đã xóa nhân viên"})
 
 @app.route('/api/employees', methods=['GET'])
@@ -328,98 +434,81 @@ def get_employee_by_id(current_user, id):
 # 2. API CHẤM CÔNG (CORE AI)
 # ==========================================
 
+BINARY_IMAGE_MIMETYPES = ('application/octet-stream', 'image/jpeg', 'image/png')
+
+def read_request_image_source(field='image'):
+    """
+    Đọc dữ liệu ảnh thô từ request (chưa decode), hỗ trợ:
+    - application/json: {"image": "<base64>"}
+    - multipart/form-data: file field `image`
+    - application/octet-stream | image/jpeg | image/png: body là bytes ảnh
+    Returns: bytearray / chuỗi base64, hoặc None
+    """
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get(field)
+        return read_stream(upload.stream) if upload else None
+
+    if request.mimetype in BINARY_IMAGE_MIMETYPES:
+        return read_stream(request.stream, request.content_length)
+
+    data = request.get_json(silent=True) or {}
+    return data.get(field)
+
+def read_request_image(field='image'):
+    """Như read_request_image_source nhưng trả về ảnh BGR đã decode (stream thẳng vào decoder)."""
+    return AIEngine.load_image(read_request_image_source(field))
+
 @app.route('/api/checkin', methods=['POST'])
 def checkin():
-    data = request.json
-    img = AIEngine.base64_to_image(data.get('image'))
+    # JSON base64 (cũ), multipart hoặc binary body - cùng JSON response
+    img = read_request_image()
     
     if img is None:
         return jsonify({"success": False, "message": "Lỗi ảnh đầu vào!"}), 400
 
-    users = User.query.all()
-    valid_users = [u for u in users if u.face_encoding is not None]
-
-    if not valid_users:
-        return jsonify({"success": False, "message": "Chưa có dữ liệu khuôn mặt nào trong hệ thống!"}), 400
+    payload, status_code = CheckinManager.process_checkin(img)
+    return jsonify(payload), status_code
 
-    # Extract & Match (Anti-Spoofing handled inside AIEngine)
-    input_embedding, msg = AIEngine.get_embedding(img)
-    if input_embedding is None:
-        return jsonify({"success": False, "message": f"Không nhận diện được khuôn mặt: {msg}"}), 400
-
-    matched_user, distance = AIEngine.find_match(input_embedding, users)
-
-    if matched_user:
-        user = matched_user
-        now = datetime.now()
-        
-        # 1. Tìm ca làm việc tự động
-        matched_shift = ShiftManager.get_matching_shift(now)
-        
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # Check existing attendance
-        attendance = Attendance.query.filter(
-            Attendance.user_id == user.id,
-            Attendance.checkin_time >= today_start
-        ).first()
-
-        if attendance:
-             # SPAM PREVENTION
-            last_action_time = attendance.checkout_time if attendance.checkout_time else attendance.checkin_time
-            if (now - last_action_time) < timedelta(seconds=60):
-                 status_str = "Check-out" if attendance.checkout_time else "Check-in"
-                 return jsonify({
-                    "success": True, 
-                    "name": user.name, 
-                    "status": status_str,
-                    "message": "Bạn vừa thao tác rồi (Chờ 60s)!"
-                })
-
-            # Handle Check-out
-            attendance.checkout_time = now
-            db.session.commit()
-            
-            return jsonify({
-                "success": True,
-                "type": "CHECK_OUT",
-                "name": user.name,
-                "status": "Đã về",
-                "message": "Check-out thành công!"
-            })
-        else:
-            # Handle Check-in
-            status = AttendanceStatus.ON_TIME
-            shift_id = None
-            
-            if matched_shift:
-                shift_id = matched_shift.id
-                status = ShiftManager.calculate_status(now, matched_shift)
-            else:
-                status = AttendanceStatus.OVERTIME
-                
-            new_attendance = Attendance(
-                user_id=user.id,
-                shift_id=shift_id,
-                checkin_time=now,
-                status=status
-            )
-            db.session.add(new_attendance)
-            db.session.commit()
-            
-            status_vn = "Đúng giờ" if status == AttendanceStatus.ON_TIME else ("Đi muộn" if status == AttendanceStatus.LATE else "Ngoài giờ")
-            shift_name = matched_shift.name if matched_shift else "Tăng ca"
+# ==========================================
+# 2.0. CHECK-IN STREAM (SSE, kiosk camera liên tục)
+# ==========================================
+@app.route('/api/checkin/stream', methods=['POST'])
+def open_checkin_stream():
+    session = checkin_stream_hub.open()
+    if session is None:
+        return jsonify({"success": False, "message": "Quá nhiều kênh check-in đang mở!"}), 503
+    return jsonify({"success": True, "session_id": session.id}), 201
+
+@app.route('/api/checkin/stream/<sid>/events', methods=['GET'])
+def checkin_stream_events(sid):
+    session = checkin_stream_hub.get(sid)
+    if session is None:
+        return jsonify({"success": False, "message": "Kênh check-in không tồn tại!"}), 404
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(checkin_stream_hub.events(session)),
+                    mimetype='text/event-stream', headers=headers)
+
+@app.route('/api/checkin/stream/<sid>/frames', methods=['POST'])
+def submit_checkin_frame(sid):
+    session = checkin_stream_hub.get(sid)
+    if session is None:
+        return jsonify({"success": False, "message": "Kênh check-in không tồn tại!"}), 404
+
+    # Cùng 3 định dạng body như /api/checkin, decode trên worker thread
+    source = read_request_image_source()
+    if not source:
+        return jsonify({"success": False, "message": "Lỗi ảnh đầu vào!"}), 400
 
-            return jsonify({
-                "success": True,
-                "type": "CHECK_IN",
-                "name": user.name,
-                "status": status_vn,
-                "message": f"Check-in thành công ({status_vn}) - {shift_name}"
-            })
+    frame_id = checkin_stream_hub.submit(session, source)
+    if frame_id is None:
+        return jsonify({"success": False, "message": "Đang xử lý frame trước, bỏ qua frame này."}), 429
+    return jsonify({"success": True, "frame_id": frame_id}), 202
 
-    else:
-        return jsonify({"success": False, "message": "Không nhận diện được khuôn mặt!"}), 400
+@app.route('/api/checkin/stream/<sid>', methods=['DELETE'])
+def close_checkin_stream(sid):
+    if not checkin_stream_hub.close(sid):
+        return jsonify({"success": False, "message": "Kênh check-in không tồn tại!"}), 404
+    return jsonify({"success": True})
 
 # ==========================================
 # 2.1. API ĐĂNG KÝ KHUÔN MẶT (3 GÓC)
@@ -439,8 +528,7 @@ def analyze_face_pose(current_user):
         return jsonify({"success": False, "message": "Anh loi"}), 400
 
     # check goc mat
-    from core.ai_engine import FaceQualityEngine
-    pose, msg = FaceQualityEngine.check_pose(img)
+    pose, msg = ai_pool.check_pose(img)
     print(f"[face-setup] step {step} - detected {pose} ({msg})")
 
     # check step co khop ko
@@ -453,7 +541,7 @@ def analyze_face_pose(current_user):
 
     try:
         # lay embedding (Anti-spoofing is now inside get_embedding)
-        embedding, msg = AIEngine.get_embedding(img)
+        embedding, msg = ai_pool.get_embedding(img)
         if not embedding:
             return jsonify({"success": False, "message": f"Lỗi: {msg}"}), 400
 
@@ -482,6 +570,11 @@ def finish_face_setup(current_user):
     if len(embeddings) == 0:
         return jsonify({"success": False, "message": "Vector trong"}), 400
 
+    # Mỗi vector 1 góc mặt (thiếu góc -> zip() sẽ bỏ mất vector)
+    poses = data.get('poses') or (['center', 'left', 'right'] if len(embeddings) == 3 else None)
+    if poses is not None and (not isinstance(poses, list) or len(poses) != len(embeddings)):
+        return jsonify({"success": False, "message": "So goc mat khong khop so vector"}), 400
+
     from core.ai_engine import FaceQualityEngine
     avg_emb = FaceQualityEngine.avg_embedding(embeddings)
 
@@ -489,11 +582,29 @@ def finish_face_setup(current_user):
     if not user:
         return jsonify({"success": False, "message": "User khong ton tai"}), 404
 
+    # Giữ vector trung bình cho tương thích, matching dùng từng template riêng
     user.face_encoding = avg_emb
+    FaceTemplateManager.add_templates(user.id, embeddings, poses)
     db.session.commit()
+    FaceTemplateManager.refresh_gallery(user.id)
 
     return jsonify({"success": True, "message": "Dang ky khuon mat xong (3 goc)"})
 
+@app.route('/api/ai/stats', methods=['GET'])
+@token_required(roles=['admin'])
+def get_ai_stats(current_user):
+    from core.ai_engine import inference_batcher
+    from core.embedding_cache import embedding_cache
+    from core.frame_quality import frame_quality_gate
+    return jsonify({
+        "gallery_size": len(face_gallery),
+        "quality_gate": frame_quality_gate.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "inference_batcher": inference_batcher.stats(),
+        "worker_pool": ai_pool.stats(),
+        "checkin_stream": checkin_stream_hub.stats()
+    })
+
 # ==========================================
 # 3. API BÁO CÁO & SHIFT
 # ==========================================
@@ -501,11 +612,12 @@ def finish_face_setup(current_user):
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     total_users = User.query.count()
-    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    logs_today = Attendance.query.filter(Attendance.checkin_time >= today_start).all()
+    today = datetime.now().date()
+    # Số lần muộn đọc từ bảng tổng hợp theo ngày, số người có mặt đếm distinct user_id
+    counts = AttendanceRollupManager.get_daily_counts(today, today).get(today, {})
     
-    present_count = len(set([l.user_id for l in logs_today]))
-    late_count = len([l for l in logs_today if l.status == AttendanceStatus.LATE])
+    present_count = ReportManager.count_present_users(today)
+    late_count = counts.get(AttendanceStatus.LATE, 0)
     
     return jsonify({
         "total_employees": total_users,
@@ -518,18 +630,17 @@ def get_stats():
 @token_required(roles=['admin'])
 def get_top_late_stats(current_user):
     today = datetime.now()
-    start_of_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     
+    # Số lần muộn trong tháng đã có sẵn trong attendance_rollup
     results = db.session.query(
-        Attendance.user_id, 
-        func.count(Attendance.id)
+        AttendanceRollup.user_id, 
+        AttendanceRollup.late_count
     ).filter(
-        Attendance.checkin_time >= start_of_month,
-        Attendance.status == AttendanceStatus.LATE
-    ).group_by(
-        Attendance.user_id
+        AttendanceRollup.year == today.year,
+        AttendanceRollup.month == today.month,
+        AttendanceRollup.late_count > 0
     ).order_by(
-        func.count(Attendance.id).desc()
+        AttendanceRollup.late_count.desc()
     ).limit(5).all()
     
     data = []
@@ -550,29 +661,13 @@ def get_chart_stats(current_user):
     today = datetime.now()
     dates = [(today - timedelta(days=i)).date() for i in range(6, -1, -1)]
     
-    # Initialize data structure
-    stats_map = {d: {'late': 0, 'ontime': 0} for d in dates}
-    
-    start_date = dates[0]
-    end_date = dates[-1] + timedelta(days=1) # Ensure we cover the full last day
-    
-    logs = Attendance.query.filter(
-        Attendance.checkin_time >= start_date,
-        Attendance.checkin_time < end_date
-    ).all()
-    
-    for log in logs:
-        log_date = log.checkin_time.date()
-        if log_date in stats_map:
-            if log.status == AttendanceStatus.LATE:
-                stats_map[log_date]['late'] += 1
-            elif log.status == AttendanceStatus.ON_TIME:
-                stats_map[log_date]['ontime'] += 1
+    # 7 ngày x vài trạng thái -> vài chục dòng tổng hợp
+    counts = AttendanceRollupManager.get_daily_counts(dates[0], dates[-1])
     
     # Format for output
     labels = [d.strftime("%d/%m") for d in dates]
-    data_late = [stats_map[d]['late'] for d in dates]
-    data_ontime = [stats_map[d]['ontime'] for d in dates]
+    data_late = [counts.get(d, {}).get(AttendanceStatus.LATE, 0) for d in dates]
+    data_ontime = [counts.get(d, {}).get(AttendanceStatus.ON_TIME, 0) for d in dates]
     
     return jsonify({
         "labels": labels,
@@ -582,14 +677,20 @@ def get_chart_stats(current_user):
 
 @app.route('/api/logs', methods=['GET'])
 def get_logs():
-    logs = Attendance.query.order_by(Attendance.checkin_time.desc()).limit(20).all()
+    limit, cursor, error = read_page_args(LOG_PAGE_LIMIT)
+    if error:
+        return jsonify({"success": False, "message": error}), 400
+
+    # 1 query join lấy tên NV, chỉ các cột hiển thị
+    logs = ReportManager.list_attendance_logs(limit, cursor)
+
     results = [{
-        "name": l.user.name, 
+        "name": l.name, 
         "time": l.checkin_time.strftime("%H:%M:%S %d/%m") if l.checkin_time else "", 
         "checkout": l.checkout_time.strftime("%H:%M:%S %d/%m") if l.checkout_time else "-",
         "status": l.status.value if hasattr(l.status, 'value') else str(l.status)
-    } for l in logs]
-    return jsonify(results)
+    } for l in logs[:limit]]
+    return page_response(results, logs, limit, "checkin_time")
 
 @app.route('/api/shifts', methods=['GET'])
 def get_shifts():
@@ -617,6 +718,7 @@ def create_shift(current_user): # Added decorator logic
     new_shift = Shift(name=name, start_time=start_time, end_time=end_time, grace_period_minutes=grace)
     db.session.add(new_shift)
     db.session.commit()
+    ShiftManager.invalidate_schedule()
     
     return jsonify({"success": True, "message": "Tạo ca làm việc thành công"})
 
@@ -634,34 +736,174 @@ def update_shift(current_user, id):
     shift.grace_period_minutes = data.get('grace_period_minutes', shift.grace_period_minutes)
     
     db.session.commit()
+    ShiftManager.invalidate_schedule()
     return jsonify({"success": True, "message": "Cập nhật thành công"})
 
+# ==========================================
+# 5. API PAYROLL (Tính lương)
+# ==========================================
+def read_payroll_period():
+    """month/year từ query string, mặc định tháng hiện tại"""
+    now = datetime.now()
+    month = request.args.get('month', default=now.month, type=int)
+    year = request.args.get('year', default=now.year, type=int)
+    if not 1 <= month <= 12:
+        return None, None
+    return month, year
+
+@app.route('/api/payroll/calculate', methods=['GET'])
+@token_required(roles=['admin'])
+def calculate_payroll(current_user):
+    month, year = read_payroll_period()
+    if month is None:
+        return jsonify({"success": False, "message": "Tháng không hợp lệ"}), 400
+    return jsonify({"success": True, "data": SalaryManager.calculate_salary_for_all(month, year)})
+
+@app.route('/api/payroll/calculate/me', methods=['GET'])
+@token_required()
+def calculate_my_payroll(current_user):
+    month, year = read_payroll_period()
+    if month is None:
+        return jsonify({"success": False, "message": "Tháng không hợp lệ"}), 400
+    return jsonify({"success": True, "data": SalaryManager.calculate_salary_for_user(current_user.id, month, year)})
+
+@app.route('/api/payroll/confirm', methods=['POST'])
+@token_required(roles=['admin'])
+def confirm_payroll(current_user):
+    success, msg, payroll_id = SalaryManager.confirm_payroll(request.json or {}, current_user.id)
+    if not success:
+        return jsonify({"success": False, "message": msg}), 400
+    return jsonify({"success": True, "message": msg, "payroll_id": payroll_id})
+
+@app.route('/api/payroll/confirm/batch', methods=['POST'])
+@token_required(roles=['admin'])
+def confirm_payroll_batch(current_user):
+    data = request.json or {}
+    payrolls = data.get('payrolls')
+    mode = data.get('mode')
+    if not isinstance(payrolls, list) or not payrolls:
+        return jsonify({"success": False, "message": "Danh sách lương trống"}), 400
+    if not all(isinstance(item, dict) for item in payrolls):
+        return jsonify({"success": False, "message": "Mỗi dòng lương phải là 1 object"}), 400
+    if mode not in (None, 'partial', 'atomic'):
+        return jsonify({"success": False, "message": "mode phải là 'partial' hoặc 'atomic'"}), 400
+
+    saved, results = SalaryManager.confirm_payroll_batch(payrolls, current_user.id, mode)
+    return jsonify({
+        "success": saved == len(results),
+        "saved": saved,
+        "failed": len(results) - saved,
+        "results": results
+    }), 200 if saved else 400
+
+@app.route('/api/payroll/history', methods=['GET'])
+@token_required()
+def get_payroll_history(current_user):
+    user_id = request.args.get('user_id', type=int)
+    # Nhân viên chỉ xem được lương của mình
+    if current_user.role != UserRole.ADMIN:
+        user_id = current_user.id
+    history = SalaryManager.get_payroll_history(
+        user_id=user_id,
+        month=request.args.get('month', type=int),
+        year=request.args.get('year', type=int)
+    )
+    return jsonify({"success": True, "data": history})
+
 @app.route('/api/export_excel', methods=['GET'])
 def export_excel():
-    logs = Attendance.query.all()
-    data = []
-    for l in logs:
-        data.append({
-            "Mã NV": l.user.id,
-            "Họ Tên": l.user.name,
-            "Email": l.user.email,
-            "Check-in": l.checkin_time.strftime("%Y-%m-%d %H:%M:%S") if l.checkin_time else "",
-            "Check-out": l.checkout_time.strftime("%Y-%m-%d %H:%M:%S") if l.checkout_time else "",
-            "Trạng Thái": l.status.value if hasattr(l.status, 'value') else str(l.status)
-        })
-    
-    df = pd.DataFrame(data)
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Log Chấm Công')
-    
-    output.seek(0)
-    return send_file(
-        output, 
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True, 
-        download_name='BaoCaoChamCong.xlsx'
-    )
+    # ?format=xlsx (mặc định) | csv | arrow, dữ liệu được stream theo từng chunk
+    fmt = request.args.get('format', 'xlsx').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"success": False, "message": "Định dạng không hỗ trợ (xlsx, csv, arrow)"}), 400
+
+    if fmt == 'arrow':
+        # Arrow IPC stream cho BI: cột có kiểu, status / ca dictionary-encoded
+        if not arrow_available():
+            return jsonify({"success": False, "message": "Server chưa cài pyarrow"}), 501
+        body = AttendanceExporter.stream_arrow(AttendanceExporter.iter_rows())
+    else:
+        rows = (AttendanceExporter.log_row(r) for r in AttendanceExporter.iter_rows())
+        body = AttendanceExporter.stream(fmt, 'Log Chấm Công', LOG_COLUMNS, rows)
+    headers = {"Content-Disposition": f"attachment; filename=BaoCaoChamCong.{fmt}"}
+    return Response(stream_with_context(body), mimetype=EXPORT_FORMATS[fmt], headers=headers)
+
+# ==========================================
+# 5.1. API XUẤT BÁO CÁO CHẠY NỀN (job + cache file)
+# ==========================================
+def read_report_params(report_type, data):
+    """Tham số báo cáo từ body JSON. Returns: (params, error)"""
+    if report_type == 'payroll':
+        now = datetime.now()
+        try:
+            month = int(data.get('month') or now.month)
+            year = int(data.get('year') or now.year)
+        except (TypeError, ValueError):
+            return None, "Tháng / năm không hợp lệ"
+        if not 1 <= month <= 12:
+            return None, "Tháng không hợp lệ"
+        return {"month": month, "year": year}, None
+
+    params = {}
+    for key in ('start_date', 'end_date'):
+        value = data.get(key)
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except (TypeError, ValueError):
+                return None, "Định dạng ngày không hợp lệ (YYYY-MM-DD)"
+        params[key] = value or None
+    if params['start_date'] and params['end_date'] and params['start_date'] > params['end_date']:
+        return None, "Ngày bắt đầu phải trước ngày kết thúc"
+    try:
+        params['user_id'] = int(data['user_id']) if data.get('user_id') else None
+    except (TypeError, ValueError):
+        return None, "user_id không hợp lệ"
+    return params, None
+
+@app.route('/api/reports/jobs', methods=['POST'])
+@token_required(roles=['admin'])
+def create_report_job(current_user):
+    data = request.json or {}
+    report_type = data.get('type')
+    if report_type not in REPORT_TYPES:
+        return jsonify({"success": False, "message": f"Loại báo cáo không hỗ trợ ({', '.join(REPORT_TYPES)})"}), 400
+
+    if REPORT_TYPES[report_type].get("requires_arrow") and not arrow_available():
+        return jsonify({"success": False, "message": "Server chưa cài pyarrow"}), 501
+
+    params, error = read_report_params(report_type, data)
+    if error:
+        return jsonify({"success": False, "message": error}), 400
+
+    job = report_job_queue.submit(report_type, params, created_by=current_user.id)
+    # File đã có sẵn trong cache -> 200, đang / sẽ dựng -> 202
+    return jsonify({"success": True, "data": job.to_dict()}), 200 if job.status == ReportJobStatus.DONE else 202
+
+@app.route('/api/reports/jobs/<job_id>', methods=['GET'])
+@token_required(roles=['admin'])
+def get_report_job(current_user, job_id):
+    job = report_job_queue.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Job không tồn tại hoặc đã hết hạn"}), 404
+    return jsonify({"success": True, "data": job.to_dict()})
+
+@app.route('/api/reports/jobs/<job_id>/download', methods=['GET'])
+@token_required(roles=['admin'])
+def download_report_job(current_user, job_id):
+    job = report_job_queue.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Job không tồn tại hoặc đã hết hạn"}), 404
+    path = report_job_queue.open_file(job)
+    if path is None:
+        return jsonify({"success": False, "message": "Báo cáo chưa sẵn sàng", "data": job.to_dict()}), 409
+    return send_file(path, mimetype=REPORT_TYPES[job.report_type]["mimetype"], as_attachment=True, download_name=job.download_name)
+
+@app.route('/api/reports/stats', methods=['GET'])
+@token_required(roles=['admin'])
+def get_report_stats(current_user):
+    """Số job / cache hit / dung lượng cache của hàng đợi báo cáo"""
+    return jsonify({"success": True, "report_jobs": report_job_queue.stats()})
 
 # ==========================================
 # 5. PASSWORD MANAGEMENT APIs
@@ -699,6 +941,7 @@ def reset_password(current_user, user_id):
     user.must_change_password = True
     user.change_password_request = False
     db.session.commit()
+    principal_cache.invalidate(user.id)
     
     send_reset_email(user.email, new_pwd)
     
@@ -720,6 +963,7 @@ def force_change_password(current_user):
     current_user.password_hash = hash_password(new_password)
     current_user.must_change_password = False
     db.session.commit()
+    principal_cache.invalidate(current_user.id)
     
     return jsonify({"success": True, "message": "Đã đổi mật khẩu thành công. Vui lòng đăng nhập lại."})
 
@@ -750,8 +994,15 @@ if __name__ == '__main__':
             db.session.commit()
             print(">>> Init Admin: admin | Admin@123")
 
-    # Warm-up AI Models before starting server
-    from core.ai_engine import AIEngine
-    AIEngine.warm_up_models()
+        # DB cũ chưa có bảng tổng hợp -> backfill 1 lần
+        missing_rollup = AttendanceRollup.query.first() is None or DailyAttendanceSummary.query.first() is None
+        if missing_rollup and Attendance.query.first() is not None:
+            print(f">>> Backfill attendance rollup: {AttendanceRollupManager.rebuild()} dòng")
+
+        # Nạp gallery khuôn mặt vào RAM
+        ensure_face_gallery()
+
+    # Warm-up AI Models before starting server (in-process hoặc worker pool)
+    ai_pool.warm_up()
 
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -1,9 +1,17 @@
 import cv2
 import numpy as np
-import base64
 import logging
+import time
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future
 from deepface import DeepFace
 import mediapipe as mp
+from core.face_gallery import FaceGallery, face_gallery
+from utils.image_utils import decode_image
+from core.embedding_cache import embedding_cache
+from core.frame_quality import frame_quality_gate, QUALITY_GATE_ENABLED, REASON_MESSAGES
 
 # Configure Logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -14,15 +22,30 @@ MODEL = "ArcFace"
 BACKEND = "opencv"
 MATCH_THRESHOLD = 0.68
 
+# messages
+MSG_NO_FACE = "Không tìm thấy khuôn mặt nào!"
+MSG_SPOOF = "Spoofing detected: Phát hiện hình ảnh giả mạo!"
+MSG_NO_EMBEDDING = "Không thể trích xuất vector khuôn mặt."
+MSG_PROCESSING_ERROR = "Lỗi xử lý hình ảnh."
+
+# micro-batching cho ArcFace
+BATCH_INFERENCE = True
+BATCH_MAX_SIZE = 16        # số frame tối đa / 1 forward pass
+BATCH_MAX_WAIT_MS = 5      # thời gian chờ gom batch tối đa
+BATCH_TIMEOUT_S = 10       # timeout chờ kết quả của 1 request
+
 class AIEngine:
     @staticmethod
     def base64_to_image(b64_str):
-        if "base64," in b64_str:
-            b64_str = b64_str.split(",")[1]
-        bytes_data = base64.b64decode(b64_str)
-        nparr = np.frombuffer(bytes_data, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        return img
+        return decode_image(b64_str)
+
+    @staticmethod
+    def load_image(source):
+        """
+        Decode ảnh đầu vào: chuỗi base64, raw bytes hoặc file upload (multipart).
+        JPEG lớn được decode ở độ phân giải giảm. Returns: ảnh BGR hoặc None.
+        """
+        return decode_image(source)
 
     @staticmethod
     def warm_up_models():
@@ -38,6 +61,8 @@ class AIEngine:
             DeepFace.extract_faces(img_path=dummy_img, enforce_detection=False, anti_spoofing=True)
             # Call represent to load Face Recognition model
             DeepFace.represent(img_path=dummy_img, model_name=MODEL, enforce_detection=False, detector_backend=BACKEND)
+            # Fasnet dùng trực tiếp trong get_embedding_timed
+            AIEngine._spoof_model()
             logger.info("Warm-up hoàn tất! Model đã sẵn sàng xử lý request.")
         except Exception as e:
             logger.warning(f"Warm-up exception (non-fatal): {e}")
@@ -47,83 +72,251 @@ class AIEngine:
         """
         Extracts face embedding with Anti-spoofing protection.
         Returns: (embedding_vector, "OK") or (None, error_message)
+        Kết quả (kể cả lý do từ chối) được cache theo hash nội dung ảnh.
         """
+        key = embedding_cache.key_for(img)
+        cached = embedding_cache.get(key)
+        if cached is not None:
+            return cached
+
+        embedding, msg, _ = AIEngine.get_embedding_timed(img)
+        # Lỗi xử lý tạm thời thì không cache
+        if msg != MSG_PROCESSING_ERROR:
+            embedding_cache.put(key, embedding, msg)
+        return embedding, msg
+
+    @staticmethod
+    def get_embedding_timed(img):
+        """
+        Single-pass pipeline: cheap quality gate, then detect + align once,
+        run Fasnet on the detected face, then feed the same aligned crop to
+        ArcFace (detector skipped).
+        Returns: (embedding_vector | None, message, timings_ms)
+            timings_ms: {"quality_gate": .., "detect": .., "anti_spoofing": .., "embedding": .., "total": ..}
+        """
+        timings = {}
+        t_start = time.perf_counter()
         try:
-            # Step 1: Detect face and check for spoofing
+            # Step 0: Quality gate rẻ, loại frame không dùng được trước khi chạy DeepFace
+            if QUALITY_GATE_ENABLED:
+                t0 = time.perf_counter()
+                ok, reason, _ = frame_quality_gate.check(img)
+                timings["quality_gate"] = (time.perf_counter() - t0) * 1000
+                if not ok:
+                    return None, REASON_MESSAGES[reason], AIEngine._finish_timings(timings, t_start)
+
+            # Step 1: Detect + align (chỉ chạy detector 1 lần)
+            t0 = time.perf_counter()
             faces = DeepFace.extract_faces(
                 img_path=img,
                 enforce_detection=True,
                 detector_backend=BACKEND,
                 align=True,
-                anti_spoofing=True
+                anti_spoofing=False
             )
-            
+            timings["detect"] = (time.perf_counter() - t0) * 1000
+
             if not faces:
-                return None, "Không tìm thấy khuôn mặt nào!"
-                
+                return None, MSG_NO_FACE, AIEngine._finish_timings(timings, t_start)
+
             face_obj = faces[0]
-            
-            # Step 2 & 3: Anti-spoofing check
-            if not face_obj.get("is_real", True):
-                logger.warning("Spoofing detected!")
-                return None, "Spoofing detected: Phát hiện hình ảnh giả mạo!"
-                
-            # Step 4: Extract embedding on the cropped face to save time/recalculation
-            cropped_face = face_obj["face"]
-            # DeepFace returns face in RGB and scaled [0, 1]. Represent handles this if we pass the numpy array.
-            # Convert back to uint8 [0, 255] for standard represent pipeline if needed, but represent handles floats too.
-            # Actually, the safest way is to call represent on the original image but with enforce_detection=False
-            # because we already know a real face is there. Let's do that for simplicity and accuracy.
-            res = DeepFace.represent(
-                img_path=img,
-                model_name=MODEL,
-                enforce_detection=False,
-                detector_backend=BACKEND
+
+            # Step 2: Anti-spoofing (Fasnet) trên vùng mặt đã detect
+            t0 = time.perf_counter()
+            area = face_obj["facial_area"]
+            is_real, _ = AIEngine._spoof_model().analyze(
+                img=img, facial_area=(area["x"], area["y"], area["w"], area["h"])
             )
-            
-            if res:
-                return res[0]["embedding"], "OK"
-            return None, "Không thể trích xuất vector khuôn mặt."
-            
+            timings["anti_spoofing"] = (time.perf_counter() - t0) * 1000
+
+            if not is_real:
+                logger.warning("Spoofing detected!")
+                return None, MSG_SPOOF, AIEngine._finish_timings(timings, t_start)
+
+            # Step 3: Embedding trực tiếp trên crop đã align (detector_backend="skip")
+            # extract_faces trả về RGB [0, 1] -> đổi lại BGR uint8 như ảnh đầu vào gốc
+            t0 = time.perf_counter()
+            cropped_face = (face_obj["face"][:, :, ::-1] * 255).astype(np.uint8)
+            if BATCH_INFERENCE:
+                embedding = inference_batcher.embed(cropped_face, timeout=BATCH_TIMEOUT_S)
+            else:
+                res = DeepFace.represent(
+                    img_path=cropped_face,
+                    model_name=MODEL,
+                    enforce_detection=False,
+                    detector_backend="skip"
+                )
+                embedding = res[0]["embedding"] if res else None
+            timings["embedding"] = (time.perf_counter() - t0) * 1000
+
+            if embedding is not None:
+                return embedding, "OK", AIEngine._finish_timings(timings, t_start)
+            return None, MSG_NO_EMBEDDING, AIEngine._finish_timings(timings, t_start)
+
         except ValueError as ve:
             # DeepFace raises ValueError if no face is found when enforce_detection=True
             if "Face could not be detected" in str(ve):
-                return None, "Không tìm thấy khuôn mặt nào!"
+                return None, MSG_NO_FACE, AIEngine._finish_timings(timings, t_start)
             logger.error(f"[get_embedding ValueError] {ve}")
-            return None, "Lỗi xử lý hình ảnh."
+            return None, MSG_PROCESSING_ERROR, AIEngine._finish_timings(timings, t_start)
         except Exception as e:
             logger.error(f"[get_embedding Exception] {e}")
-            return None, "Lỗi xử lý hình ảnh."
+            return None, MSG_PROCESSING_ERROR, AIEngine._finish_timings(timings, t_start)
+
+    @staticmethod
+    def _finish_timings(timings, t_start):
+        timings["total"] = (time.perf_counter() - t_start) * 1000
+        logger.debug("[get_embedding timings ms] " + ", ".join(f"{k}={v:.1f}" for k, v in timings.items()))
+        return timings
+
+    @staticmethod
+    def _spoof_model():
+        # build_model cache model bên trong DeepFace, gọi nhiều lần không load lại
+        return DeepFace.build_model(model_name="Fasnet", task="spoofing")
 
     @staticmethod
     def find_match(emb_input, users):
-        if not emb_input:
+        """
+        Match against an explicit list of users (vectorized, one pass).
+        Returns: (user, distance) or (None, distance)
+        """
+        if emb_input is None or len(emb_input) == 0:
             return None, 1.0
 
-        target = np.array(emb_input)
-        best_user = None
-        min_dist = float("inf")
-
-        for u in users:
-            if not u.face_encoding:
-                continue
-            db_emb = np.array(u.face_encoding)
+        candidates = [u for u in users if u.face_encoding is not None and len(u.face_encoding) > 0]
+        if not candidates:
+            return None, 1.0
 
-            dot = np.dot(target, db_emb)
-            n1 = np.linalg.norm(target)
-            n2 = np.linalg.norm(db_emb)
+        gallery = FaceGallery(backend="exact")
+        gallery.rebuild((idx, u.face_encoding) for idx, u in enumerate(candidates))
+        idx, min_dist = gallery.search(emb_input)
 
-            dist = 1.0 if n1 == 0 or n2 == 0 else 1 - (dot / (n1 * n2))
+        if idx is not None and min_dist < MATCH_THRESHOLD:
+            return candidates[idx], min_dist
+        return None, min_dist
 
-            if dist < min_dist:
-                min_dist = dist
-                best_user = u
+    @staticmethod
+    def identify(emb_input):
+        """
+        Match against the resident gallery index (core.face_gallery).
+        Returns: (user_id, distance) or (None, distance)
+        """
+        if emb_input is None or len(emb_input) == 0:
+            return None, 1.0
 
-        if min_dist < MATCH_THRESHOLD:
-            return best_user, min_dist
+        user_id, min_dist = face_gallery.search(emb_input, threshold=MATCH_THRESHOLD)
+        if user_id is not None and min_dist < MATCH_THRESHOLD:
+            return user_id, min_dist
         return None, min_dist
 
 
+class InferenceBatcher:
+    """
+    Gom các request embedding đồng thời thành 1 forward pass ArcFace.
+
+    Mỗi caller nhận một Future riêng; worker thread chờ tối đa `max_wait_ms`
+    (hoặc đến khi đủ `max_batch_size` frame) rồi chạy model một lần cho cả batch.
+    """
+
+    def __init__(self, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._max_queue_depth = 0
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="arcface-batcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, face_bgr):
+        """Đưa 1 crop khuôn mặt (BGR uint8) vào hàng đợi, trả về Future -> embedding list."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((face_bgr, future))
+        with self._stats_lock:
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return future
+
+    def embed(self, face_bgr, timeout=None):
+        return self.submit(face_bgr).result(timeout=timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "batches": sum(self._batch_sizes.values()),
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms
+            }
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+            try:
+                embeddings = self._forward([face for face, _ in batch])
+                for (_, future), emb in zip(batch, embeddings):
+                    future.set_result(emb)
+            except Exception as e:
+                logger.error(f"[InferenceBatcher] batch of {len(batch)} failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+
+    @staticmethod
+    def _preprocess(face_bgr, target_size):
+        """Giống pipeline represent() của DeepFace: BGR->RGB, resize giữ tỉ lệ + pad, scale [0, 1]."""
+        img = face_bgr[:, :, ::-1]
+        factor = min(target_size[0] / img.shape[0], target_size[1] / img.shape[1])
+        dsize = (int(img.shape[1] * factor), int(img.shape[0] * factor))
+        img = cv2.resize(img, dsize)
+        diff_0 = target_size[0] - img.shape[0]
+        diff_1 = target_size[1] - img.shape[1]
+        img = np.pad(
+            img,
+            ((diff_0 // 2, diff_0 - diff_0 // 2), (diff_1 // 2, diff_1 - diff_1 // 2), (0, 0)),
+            "constant"
+        )
+        if img.shape[0:2] != tuple(target_size):
+            img = cv2.resize(img, (target_size[1], target_size[0]))
+        return img.astype(np.float32) / 255.0
+
+    @staticmethod
+    def _forward(faces):
+        model = DeepFace.build_model(model_name=MODEL)
+        # represent() của DeepFace truyền input_shape theo thứ tự đảo (w, h)
+        target_size = (model.input_shape[1], model.input_shape[0])
+        batch = np.stack([InferenceBatcher._preprocess(f, target_size) for f in faces])
+        output = model.model.predict_on_batch(batch)
+        return [np.asarray(row).tolist() for row in output]
+
+
+inference_batcher = InferenceBatcher()
+
+
 class FaceQualityEngine:
     # model 3d points (giong client)
     model_3d = np.array([
@@ -0,0 +1,170 @@
+import os
+import logging
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+from core.ai_engine import AIEngine, FaceQualityEngine, MSG_PROCESSING_ERROR
+from core.embedding_cache import embedding_cache
+
+logger = logging.getLogger(__name__)
+
+# config
+AI_WORKER_PROCESSES = int(os.environ.get("AI_WORKER_PROCESSES", "0"))  # 0 = chạy trong process Flask
+AI_POOL_MAX_PENDING = int(os.environ.get("AI_POOL_MAX_PENDING", "64"))  # back-pressure
+AI_POOL_TIMEOUT_S = float(os.environ.get("AI_POOL_TIMEOUT_S", "15"))
+
+MSG_OVERLOADED = "Hệ thống đang quá tải, vui lòng thử lại sau."
+MSG_TIMEOUT = "Xử lý khuôn mặt quá thời gian, vui lòng thử lại."
+
+
+# ==========================================
+# Worker side (chạy trong process con)
+# ==========================================
+
+def _init_worker():
+    # Mỗi worker load model đúng 1 lần
+    AIEngine.warm_up_models()
+
+
+def _read_frame(shm_name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+
+
+def _embedding_task(shm_name, shape, dtype):
+    img = _read_frame(shm_name, shape, dtype)
+    return AIEngine.get_embedding(img)
+
+
+def _pose_task(shm_name, shape, dtype):
+    img = _read_frame(shm_name, shape, dtype)
+    return FaceQualityEngine.check_pose(img)
+
+
+# ==========================================
+# Client side (Flask request threads)
+# ==========================================
+
+class AIWorkerPool:
+    """
+    Optional process-pool tier for the AI models.
+
+    Frames are handed to workers through shared memory (only the segment
+    name is pickled). When `processes` is 0 every call runs in-process,
+    exactly like calling AIEngine / FaceQualityEngine directly.
+    """
+
+    def __init__(self, processes=AI_WORKER_PROCESSES, max_pending=AI_POOL_MAX_PENDING, timeout=AI_POOL_TIMEOUT_S):
+        self.processes = processes
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._start_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._stats_lock = threading.Lock()
+        self._stats = {"submitted": 0, "rejected": 0, "timeouts": 0, "errors": 0, "pending": 0}
+
+    @property
+    def enabled(self):
+        return self.processes > 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._start_lock:
+                if self._executor is None:
+                    # spawn: không fork state của TensorFlow từ process cha
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.processes,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker
+                    )
+                    logger.info(f"AI worker pool started with {self.processes} processes")
+        return self._executor
+
+    def _bump(self, key, delta=1):
+        with self._stats_lock:
+            self._stats[key] += delta
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats, processes=self.processes, max_pending=self.max_pending)
+
+    def _release(self, shm):
+        """Trả slot + shared memory khi worker thực sự xong frame (kể cả sau timeout)."""
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+        self._bump("pending", -1)
+        self._slots.release()
+
+    def _run(self, task, img, failure):
+        """Gửi frame qua shared memory, chờ kết quả có timeout. `failure(msg)` tạo kết quả lỗi."""
+        if not self._slots.acquire(timeout=self.timeout):
+            self._bump("rejected")
+            return failure(MSG_OVERLOADED)
+
+        shm = None
+        future = None
+        self._bump("pending")
+        try:
+            img = np.ascontiguousarray(img)
+            shm = shared_memory.SharedMemory(create=True, size=img.nbytes)
+            np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)[:] = img
+
+            future = self._get_executor().submit(task, shm.name, img.shape, img.dtype.str)
+            self._bump("submitted")
+            # cancel() không dừng được task worker đã nhận -> slot chỉ được trả khi future xong,
+            # nên max_pending giới hạn đúng số frame worker còn phải xử lý
+            future.add_done_callback(lambda f: self._release(shm))
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                self._bump("timeouts")
+                return failure(MSG_TIMEOUT)
+        except Exception as e:
+            logger.error(f"[AIWorkerPool] {e}")
+            self._bump("errors")
+            return failure(MSG_PROCESSING_ERROR)
+        finally:
+            if future is None:
+                self._release(shm)
+
+    def get_embedding(self, img):
+        """Same contract as AIEngine.get_embedding: (embedding, msg)."""
+        if not self.enabled:
+            return AIEngine.get_embedding(img)
+
+        # Check cache ở process cha trước khi gửi frame sang worker
+        key = embedding_cache.key_for(img)
+        cached = embedding_cache.get(key)
+        if cached is not None:
+            return cached
+        embedding, msg = self._run(_embedding_task, img, lambda msg: (None, msg))
+        if embedding is not None or msg not in (MSG_PROCESSING_ERROR, MSG_OVERLOADED, MSG_TIMEOUT):
+            embedding_cache.put(key, embedding, msg)
+        return embedding, msg
+
+    def check_pose(self, img):
+        """Same contract as FaceQualityEngine.check_pose: (pose, msg)."""
+        if not self.enabled:
+            return FaceQualityEngine.check_pose(img)
+        return self._run(_pose_task, img, lambda msg: ("unknown", msg))
+
+    def warm_up(self):
+        """Khởi động worker ngay (thay vì đợi request đầu tiên)."""
+        if not self.enabled:
+            AIEngine.warm_up_models()
+            return
+        executor = self._get_executor()
+        # initializer chạy khi worker được tạo -> submit no-op cho mỗi worker
+        for f in [executor.submit(os.getpid) for _ in range(self.processes)]:
+            f.result()
+
+
+ai_pool = AIWorkerPool()
@@ -0,0 +1,84 @@
+import numpy as np
+
+
+class IVFQuantizer:
+    """
+    IVF (inverted file) coarse quantizer viết bằng NumPy.
+
+    Vectors (đã normalize) được chia vào `nlist` cụm bằng spherical k-means.
+    Khi search chỉ quét `nprobe` cụm gần nhất thay vì toàn bộ gallery:
+    nprobe lớn -> recall cao hơn nhưng chậm hơn.
+    """
+
+    def __init__(self, nlist, train_iters=10, max_train_points=64, seed=0):
+        self.nlist = max(1, int(nlist))
+        self.train_iters = train_iters
+        self.max_train_points = max_train_points  # số điểm train tối đa / cụm
+        self.seed = seed
+        self.centroids = None
+        self.trained_size = 0
+
+        # Inverted lists dạng CSR: order[offsets[l]:offsets[l+1]] là các row thuộc cụm l
+        self._order = np.empty(0, dtype=np.int64)
+        self._offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    @staticmethod
+    def _normalize_rows(mat):
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return mat / norms
+
+    def train(self, vectors):
+        """Spherical k-means trên một mẫu của gallery."""
+        n = vectors.shape[0]
+        rng = np.random.default_rng(self.seed)
+        self.nlist = max(1, min(self.nlist, n))
+        self._offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+
+        sample_size = min(n, self.nlist * self.max_train_points)
+        sample = vectors[rng.choice(n, sample_size, replace=False)] if sample_size < n else vectors
+        centroids = sample[rng.choice(sample.shape[0], self.nlist, replace=False)].copy()
+
+        for _ in range(self.train_iters):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=self.nlist)
+            empty = counts == 0
+            # Cụm rỗng -> khởi tạo lại bằng một điểm ngẫu nhiên
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()))]
+            centroids = self._normalize_rows(sums).astype(np.float32)
+
+        self.centroids = centroids
+        self.trained_size = n
+
+    def assign(self, vectors, chunk_size=8192):
+        """Trả về id cụm gần nhất cho từng vector."""
+        vectors = np.atleast_2d(vectors)
+        labels = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], chunk_size):
+            block = vectors[start:start + chunk_size]
+            labels[start:start + chunk_size] = np.argmax(block @ self.centroids.T, axis=1)
+        return labels
+
+    def build_lists(self, labels):
+        """Dựng lại inverted lists từ mảng nhãn (row -> cụm)."""
+        self._order = np.argsort(labels, kind="stable").astype(np.int64)
+        sorted_labels = labels[self._order]
+        self._offsets = np.searchsorted(sorted_labels, np.arange(self.nlist + 1)).astype(np.int64)
+
+    def candidates(self, probe, nprobe):
+        """Các row thuộc `nprobe` cụm gần probe nhất."""
+        nprobe = max(1, min(nprobe, self.nlist))
+        scores = self.centroids @ probe
+        if nprobe < self.nlist:
+            lists = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        else:
+            lists = np.arange(self.nlist)
+        parts = [self._order[self._offsets[l]:self._offsets[l + 1]] for l in lists]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
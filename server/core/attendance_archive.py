@@ -0,0 +1,397 @@
+import os
+import re
+import heapq
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+from datetime import datetime
+from models.db_models import db, User, Shift, Attendance, AttendanceStatus
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow chỉ cần cho export Arrow / Parquet và archive
+    pa = pc = pq = None
+
+# config
+ARCHIVE_DIR = os.environ.get("ATTENDANCE_ARCHIVE_DIR")      # mặc định: <instance>/attendance_archive
+ARCHIVE_KEEP_MONTHS = int(os.environ.get("ATTENDANCE_ARCHIVE_KEEP_MONTHS", "12"))  # số tháng giữ trong SQLite
+ARCHIVE_BATCH_ROWS = 10000      # số dòng / record batch khi ghi Parquet
+PARQUET_COMPRESSION = "zstd"
+
+PARTITION_RE = re.compile(r"^month=(\d{4})-(\d{2})$")
+
+# Cùng thứ tự cột với AttendanceExporter.iter_rows
+AttendanceRow = namedtuple("AttendanceRow", "id user_id user_name email shift_id shift_name checkin_time checkout_time status")
+
+
+def arrow_available():
+    return pa is not None
+
+
+def _require_arrow():
+    if pa is None:
+        raise RuntimeError("Chức năng Arrow / Parquet cần cài pyarrow (pip install pyarrow)")
+
+
+def _dict_string():
+    return pa.dictionary(pa.int32(), pa.string())
+
+
+def archive_schema():
+    """Schema file archive: chỉ lưu dữ kiện, tên NV / ca được join lúc đọc như bảng SQLite."""
+    _require_arrow()
+    return pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.int32()),
+        ("shift_id", pa.int32()),
+        ("status", _dict_string()),
+        ("checkin_time", pa.timestamp("us")),
+        ("checkout_time", pa.timestamp("us")),
+    ])
+
+
+def export_schema():
+    """Schema export cho BI: status / ca / tên NV dictionary-encoded."""
+    _require_arrow()
+    return pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.int32()),
+        ("user_name", _dict_string()),
+        ("shift_id", pa.int32()),
+        ("shift_name", _dict_string()),
+        ("status", _dict_string()),
+        ("checkin_time", pa.timestamp("us")),
+        ("checkout_time", pa.timestamp("us")),
+    ])
+
+
+def _status_value(status):
+    return status.value if hasattr(status, 'value') else status
+
+
+def rows_to_batch(rows, schema):
+    """List các dòng (AttendanceRow / Row của iter_rows) -> RecordBatch theo schema."""
+    columns = []
+    for field in schema:
+        if field.name == "status":
+            values = [_status_value(r.status) for r in rows]
+        else:
+            values = [getattr(r, field.name) for r in rows]
+        if pa.types.is_dictionary(field.type):
+            columns.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            columns.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def iter_batches(rows, size=ARCHIVE_BATCH_ROWS):
+    """Gom generator dòng thành các list tối đa `size` dòng."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def month_range(year, month):
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def partition_name(year, month):
+    return f"month={year:04d}-{month:02d}"
+
+
+class AttendanceArchive:
+    """
+    Kho lưu trữ Attendance các tháng cũ dưới dạng Parquet, mỗi tháng 1 partition
+    (<dir>/month=YYYY-MM/part-0.parquet, đọc được trực tiếp bằng pyarrow / pandas / DuckDB).
+
+    archive_month() chuyển bản ghi của 1 tháng từ SQLite sang Parquet rồi xoá khỏi
+    bảng attendance; attendance_rollup / attendance_daily_summary giữ nguyên nên
+    lương và Dashboard không đổi. AttendanceExporter.iter_rows() đọc kèm các tháng
+    đã archive, nên export / báo cáo vẫn thấy đủ dữ liệu.
+    """
+
+    def __init__(self, base_dir=ARCHIVE_DIR):
+        self.base_dir = base_dir
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        if self.base_dir is None:
+            self.base_dir = os.path.join(app.instance_path, "attendance_archive")
+
+    # ------------------------------------------------------------------
+    # Partitions
+    # ------------------------------------------------------------------
+    def _path(self, year, month):
+        return os.path.join(self.base_dir, partition_name(year, month), "part-0.parquet")
+
+    def months(self):
+        """Các tháng đã archive, sắp tăng dần: [(year, month), ...]"""
+        if not self.base_dir or not os.path.isdir(self.base_dir):
+            return []
+        found = []
+        for name in os.listdir(self.base_dir):
+            m = PARTITION_RE.match(name)
+            if m and os.path.exists(os.path.join(self.base_dir, name, "part-0.parquet")):
+                found.append((int(m.group(1)), int(m.group(2))))
+        return sorted(found)
+
+    def months_in_range(self, start_date=None, end_date=None):
+        result = []
+        for year, month in self.months():
+            first, next_first = month_range(year, month)
+            if start_date and next_first <= start_date:
+                continue
+            if end_date and first > end_date:
+                continue
+            result.append((year, month))
+        return result
+
+    def version(self, start_date=None, end_date=None):
+        """(tháng, size, mtime) của các partition trong phạm vi - dùng cho cache báo cáo."""
+        result = []
+        for year, month in self.months_in_range(start_date, end_date):
+            st = os.stat(self._path(year, month))
+            result.append((year, month, st.st_size, st.st_mtime_ns))
+        return result
+
+    def _read_month(self, year, month, start_date=None, end_date=None, user_id=None):
+        filters = []
+        if start_date:
+            filters.append(("checkin_time", ">=", pa.scalar(start_date, pa.timestamp("us"))))
+        if end_date:
+            filters.append(("checkin_time", "<=", pa.scalar(end_date, pa.timestamp("us"))))
+        if user_id:
+            filters.append(("user_id", "=", int(user_id)))
+        return pq.read_table(self._path(year, month), filters=filters or None, schema=archive_schema())
+
+    def _scan_month(self, year, month, start_date=None, end_date=None, user_id=None):
+        """Generator dict các dòng của 1 tháng theo thứ tự trong file (đã sắp theo id), đọc từng batch."""
+        parquet_file = pq.ParquetFile(self._path(year, month))
+        for batch in parquet_file.iter_batches(batch_size=ARCHIVE_BATCH_ROWS):
+            mask = None
+            if start_date:
+                mask = pc.greater_equal(batch.column("checkin_time"), pa.scalar(start_date, pa.timestamp("us")))
+            if end_date:
+                cond = pc.less_equal(batch.column("checkin_time"), pa.scalar(end_date, pa.timestamp("us")))
+                mask = cond if mask is None else pc.and_(mask, cond)
+            if user_id:
+                cond = pc.equal(batch.column("user_id"), int(user_id))
+                mask = cond if mask is None else pc.and_(mask, cond)
+            if mask is not None:
+                batch = batch.filter(mask)
+            yield from batch.to_pylist()
+
+    # ------------------------------------------------------------------
+    # Đọc
+    # ------------------------------------------------------------------
+    def iter_rows(self, start_date=None, end_date=None, user_id=None, newest_first=False):
+        """
+        Generator AttendanceRow của các tháng đã archive trong phạm vi lọc,
+        cùng thứ tự với AttendanceExporter.iter_rows.
+
+        newest_first: partition chia theo tháng của checkin_time nên đọc từng tháng
+        (mới -> cũ) rồi sắp trong tháng. Theo id: id không tăng theo tháng (vd. duyệt
+        nghỉ phép tạo bản ghi cho ngày tương lai) nên merge các tháng theo id.
+        """
+        months = self.months_in_range(start_date, end_date)
+        if not months:
+            return
+        _require_arrow()
+
+        users = dict(db.session.query(User.id, User.name).all())
+        emails = dict(db.session.query(User.id, User.email).all())
+        shifts = dict(db.session.query(Shift.id, Shift.name).all())
+
+        if newest_first:
+            sort_keys = [("checkin_time", "descending"), ("id", "descending")]
+            records = (
+                r
+                for year, month in reversed(months)
+                for batch in self._read_month(year, month, start_date, end_date, user_id).sort_by(sort_keys).to_batches(ARCHIVE_BATCH_ROWS)
+                for r in batch.to_pylist()
+            )
+        else:
+            records = heapq.merge(
+                *(self._scan_month(year, month, start_date, end_date, user_id) for year, month in months),
+                key=lambda r: r["id"]
+            )
+
+        for r in records:
+            yield AttendanceRow(
+                id=r["id"],
+                user_id=r["user_id"],
+                user_name=users.get(r["user_id"]),
+                email=emails.get(r["user_id"]),
+                shift_id=r["shift_id"],
+                shift_name=shifts.get(r["shift_id"]),
+                checkin_time=r["checkin_time"],
+                checkout_time=r["checkout_time"],
+                status=AttendanceStatus(r["status"])
+            )
+
+    def iter_facts(self):
+        """Generator (user_id, checkin_time, shift_id, status) của toàn bộ archive (rebuild tổng hợp)."""
+        for year, month in self.months():
+            table = self._read_month(year, month).select(["user_id", "checkin_time", "shift_id", "status"])
+            for record in table.to_batches(ARCHIVE_BATCH_ROWS):
+                for r in record.to_pylist():
+                    yield r["user_id"], r["checkin_time"], r["shift_id"], AttendanceStatus(r["status"])
+
+    # ------------------------------------------------------------------
+    # Ghi
+    # ------------------------------------------------------------------
+    def _rewrite(self, year, month, batches):
+        """Ghi các batch ra file tạm rồi thay thế partition (atomic). Returns: số dòng."""
+        path = self._path(year, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        os.close(fd)
+        written = 0
+        try:
+            with pq.ParquetWriter(tmp_path, archive_schema(), compression=PARQUET_COMPRESSION) as writer:
+                for batch in batches:
+                    if batch.num_rows:
+                        writer.write_batch(batch)
+                        written += batch.num_rows
+            if written:
+                os.replace(tmp_path, path)
+            else:
+                os.remove(tmp_path)
+                shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return written
+
+    def archive_month(self, year, month, batch_size=ARCHIVE_BATCH_ROWS):
+        """
+        Chuyển Attendance của tháng year/month sang Parquet rồi xoá khỏi SQLite. Có commit.
+        Chạy lại được: dòng đã có trong file (theo id) không bị ghi trùng.
+
+        Returns: số bản ghi đã chuyển
+        """
+        _require_arrow()
+        from core.attendance_export import AttendanceExporter
+
+        start, end = month_range(year, month)
+        schema = archive_schema()
+        with self._lock:
+            existing = self._read_month(year, month) if (year, month) in self.months() else schema.empty_table()
+            archived_ids = set(existing.column("id").to_pylist())
+            moved = {"count": 0, "max_id": None}
+
+            batches = []
+            rows = AttendanceExporter.iter_rows(start, end, batch_size=batch_size, include_archive=False)
+            for chunk in iter_batches(rows, batch_size):
+                moved["max_id"] = max(moved["max_id"] or 0, chunk[-1].id)
+                chunk = [r for r in chunk if r.checkin_time < end and r.id not in archived_ids]
+                moved["count"] += len(chunk)
+                if chunk:
+                    batches.append(rows_to_batch(chunk, schema))
+
+            # File luôn sắp theo id (iter_rows merge các tháng theo id)
+            table = pa.concat_tables([existing, pa.Table.from_batches(batches, schema=schema)]).sort_by("id")
+            self._rewrite(year, month, table.to_batches(batch_size))
+
+            if moved["max_id"] is not None:
+                # Chỉ xoá các dòng đã đọc (id <= id lớn nhất đã ghi)
+                Attendance.query.filter(
+                    Attendance.checkin_time >= start,
+                    Attendance.checkin_time < end,
+                    Attendance.id <= moved["max_id"]
+                ).delete(synchronize_session=False)
+                db.session.commit()
+            return moved["count"]
+
+    def archive_before(self, year, month):
+        """
+        Archive mọi tháng có dữ liệu trước tháng year/month (không gồm tháng đó).
+
+        Returns: dict "YYYY-MM" -> số bản ghi đã chuyển
+        """
+        month_expr = db.func.strftime("%Y-%m", Attendance.checkin_time)
+        periods = [
+            p for (p,) in db.session.query(month_expr).filter(
+                Attendance.checkin_time < datetime(year, month, 1)
+            ).distinct().order_by(month_expr)
+        ]
+        result = {}
+        for period in periods:
+            y, m = (int(v) for v in period.split("-"))
+            result[period] = self.archive_month(y, m)
+        return result
+
+    def user_facts(self, user_id):
+        """
+        Bản ghi archive của 1 user (khi xoá nhân viên, để trừ khỏi bảng tổng hợp). Chỉ đọc:
+        file chỉ được ghi lại bởi purge_user() sau khi transaction xoá nhân viên đã commit.
+
+        Returns: list (checkin_time, shift_id, status)
+        """
+        months = self.months()
+        if not months:
+            return []
+        _require_arrow()
+
+        facts = []
+        for year, month in months:
+            table = self._read_month(year, month, user_id=user_id).select(["checkin_time", "shift_id", "status"])
+            for r in table.to_pylist():
+                facts.append((r["checkin_time"], r["shift_id"], AttendanceStatus(r["status"])))
+        return facts
+
+    def purge_user(self, user_id):
+        """
+        Xoá bản ghi archive của 1 user, ghi lại các partition bị ảnh hưởng.
+        Gọi sau khi xoá nhân viên đã commit; chạy lại được (không còn dòng -> không ghi).
+
+        Returns: số bản ghi đã xoá
+        """
+        months = self.months()
+        if not months:
+            return 0
+        _require_arrow()
+
+        removed = 0
+        with self._lock:
+            for year, month in months:
+                table = self._read_month(year, month)
+                mask = pc.equal(table.column("user_id"), int(user_id))
+                hits = pc.sum(mask).as_py() or 0
+                if not hits:
+                    continue
+                self._rewrite(year, month, table.filter(pc.invert(mask)).to_batches(ARCHIVE_BATCH_ROWS))
+                removed += hits
+        return removed
+
+    def purge_deleted_users(self):
+        """
+        Xoá bản ghi archive của các user không còn trong bảng user
+        (purge_user lỗi sau khi đã xoá nhân viên).
+
+        Returns: dict user_id -> số bản ghi đã xoá
+        """
+        months = self.months()
+        if not months:
+            return {}
+        _require_arrow()
+
+        existing = {uid for (uid,) in db.session.query(User.id)}
+        orphans = set()
+        for year, month in months:
+            ids = pc.unique(self._read_month(year, month).column("user_id")).to_pylist()
+            orphans.update(uid for uid in ids if uid is not None and uid not in existing)
+        return {uid: self.purge_user(uid) for uid in sorted(orphans)}
+
+attendance_archive = AttendanceArchive()
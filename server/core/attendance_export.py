@@ -0,0 +1,253 @@
+import io
+import csv
+import heapq
+import zipfile
+from itertools import chain
+from xml.sax.saxutils import escape, quoteattr
+from openpyxl.utils import get_column_letter
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from models.db_models import db, User, Shift, Attendance
+from core.attendance_archive import attendance_archive, export_schema, rows_to_batch, iter_batches, pa
+
+# config
+EXPORT_BATCH_ROWS = 2000            # số dòng đọc mỗi lần từ DB
+EXPORT_CHUNK_BYTES = 64 * 1024      # kích thước mỗi chunk HTTP
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_MIMETYPE = 'text/csv; charset=utf-8'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+EXPORT_FORMATS = {"xlsx": XLSX_MIMETYPE, "csv": CSV_MIMETYPE, "arrow": ARROW_MIMETYPE}
+
+# Cột của /api/export_excel
+LOG_COLUMNS = ["Mã NV", "Họ Tên", "Email", "Check-in", "Check-out", "Trạng Thái"]
+
+
+def format_datetime(value, fmt="%Y-%m-%d %H:%M:%S", empty=""):
+    return value.strftime(fmt) if value else empty
+
+
+def status_value(status):
+    return status.value if hasattr(status, 'value') else str(status)
+
+
+# Các part tối thiểu của 1 file .xlsx 1 sheet (sheet ghi riêng, theo từng dòng)
+_XLSX_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_XLSX_CONTENT_TYPES = _XLSX_HEADER + (
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_XLSX_ROOT_RELS = _XLSX_HEADER + (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK_RELS = _XLSX_HEADER + (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = _XLSX_HEADER + (
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name={name} sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+_XLSX_SHEET_HEAD = _XLSX_HEADER + '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+_XLSX_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+def _xlsx_row(index, values):
+    """1 dòng <row> của sheet XML: số -> <v>, còn lại -> inline string."""
+    cells = []
+    for col, value in enumerate(values, 1):
+        if value is None:
+            continue
+        ref = f"{get_column_letter(col)}{index}"
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        else:
+            text = escape(ILLEGAL_CHARACTERS_RE.sub("", str(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{index}">{"".join(cells)}</row>'
+
+
+class AttendanceExporter:
+    """
+    Xuất bảng attendance với bộ nhớ không phụ thuộc số dòng.
+
+    Dữ liệu được đọc theo từng lô EXPORT_BATCH_ROWS dòng bằng keyset
+    (WHERE key > key cuối LIMIT n), chỉ select các cột cần xuất nên không
+    hydrate User (và face_encoding). Mỗi lô là 1 câu query đọc hết ngay, nên
+    SQLite không giữ read lock suốt thời gian stream -> check-in vẫn ghi được.
+    """
+
+    @staticmethod
+    def _select(start_date=None, end_date=None, user_id=None):
+        stmt = db.select(
+            Attendance.id,
+            Attendance.user_id,
+            User.name.label("user_name"),
+            User.email,
+            Attendance.shift_id,
+            Shift.name.label("shift_name"),
+            Attendance.checkin_time,
+            Attendance.checkout_time,
+            Attendance.status
+        ).outerjoin(User, User.id == Attendance.user_id
+        ).outerjoin(Shift, Shift.id == Attendance.shift_id)
+
+        if start_date:
+            stmt = stmt.where(Attendance.checkin_time >= start_date)
+        if end_date:
+            stmt = stmt.where(Attendance.checkin_time <= end_date)
+        if user_id:
+            stmt = stmt.where(Attendance.user_id == user_id)
+        return stmt
+
+    @staticmethod
+    def iter_rows(start_date=None, end_date=None, user_id=None, newest_first=False,
+                  batch_size=EXPORT_BATCH_ROWS, include_archive=True):
+        """
+        Generator các dòng (id, user_id, user_name, email, shift_id, shift_name,
+        checkin_time, checkout_time, status), gồm cả các tháng đã archive ra Parquet.
+
+        Mặc định sắp theo id tăng dần; newest_first=True sắp theo
+        checkin_time giảm dần (bỏ qua bản ghi không có checkin_time).
+        """
+        live = AttendanceExporter._iter_live(start_date, end_date, user_id, newest_first, batch_size)
+        if not include_archive or not attendance_archive.months_in_range(start_date, end_date):
+            return live
+
+        archived = attendance_archive.iter_rows(start_date, end_date, user_id, newest_first)
+        if newest_first:
+            return heapq.merge(live, archived, key=lambda r: (r.checkin_time, r.id), reverse=True)
+        return heapq.merge(live, archived, key=lambda r: r.id)
+
+    @staticmethod
+    def _iter_live(start_date, end_date, user_id, newest_first, batch_size):
+        """Đọc bảng attendance trong SQLite theo từng lô (keyset)."""
+        base = AttendanceExporter._select(start_date, end_date, user_id)
+        last = None
+
+        while True:
+            stmt = base
+            if newest_first:
+                stmt = stmt.where(Attendance.checkin_time.isnot(None))
+                if last is not None:
+                    # (checkin_time, id) < (t, id) nhưng vẫn seek được index checkin_time
+                    stmt = stmt.where(
+                        Attendance.checkin_time <= last.checkin_time,
+                        db.or_(Attendance.checkin_time < last.checkin_time, Attendance.id < last.id)
+                    )
+                stmt = stmt.order_by(Attendance.checkin_time.desc(), Attendance.id.desc())
+            else:
+                if last is not None:
+                    stmt = stmt.where(Attendance.id > last.id)
+                stmt = stmt.order_by(Attendance.id)
+
+            rows = db.session.execute(stmt.limit(batch_size)).all()
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            last = rows[-1]
+
+    @staticmethod
+    def log_row(row):
+        """Dòng của /api/export_excel (theo LOG_COLUMNS)"""
+        return [
+            row.user_id,
+            row.user_name or f"User #{row.user_id}",
+            row.email or "",
+            format_datetime(row.checkin_time),
+            format_datetime(row.checkout_time),
+            status_value(row.status)
+        ]
+
+    @staticmethod
+    def stream_csv(columns, rows, chunk_bytes=EXPORT_CHUNK_BYTES):
+        """Generator bytes CSV (UTF-8 có BOM để Excel đọc đúng tiếng Việt)."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        buffer.write("\ufeff")
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= chunk_bytes:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode("utf-8")
+
+    @staticmethod
+    def stream_xlsx(sheet_name, columns, rows, chunk_bytes=EXPORT_CHUNK_BYTES):
+        """
+        Generator bytes .xlsx gồm 1 sheet. Sheet XML được nén thẳng vào zip
+        (ZipFile ghi lên sink không seek được) và đẩy ra mỗi khi đủ chunk_bytes,
+        nên byte đầu tiên được gửi trước khi đọc hết dữ liệu.
+        """
+        sink = _ChunkSink()
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES)
+            zf.writestr("_rels/.rels", _XLSX_ROOT_RELS)
+            zf.writestr("xl/workbook.xml", _XLSX_WORKBOOK.format(name=quoteattr(sheet_name[:31])))
+            zf.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS)
+            with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as fh:
+                fh.write(_XLSX_SHEET_HEAD.encode("utf-8"))
+                for index, row in enumerate(chain([columns], rows), 1):
+                    fh.write(_xlsx_row(index, row).encode("utf-8"))
+                    if sink.size >= chunk_bytes:
+                        yield sink.drain()
+                fh.write(_XLSX_SHEET_TAIL.encode("utf-8"))
+        yield sink.drain()
+
+    @staticmethod
+    def stream_arrow(rows, batch_size=EXPORT_BATCH_ROWS):
+        """
+        Generator bytes Arrow IPC stream (đọc bằng pyarrow.ipc.open_stream / pandas / polars).
+        Mỗi lô `batch_size` dòng là 1 record batch; status / ca / tên NV dictionary-encoded.
+        """
+        schema = export_schema()
+        sink = _ChunkSink()
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for chunk in iter_batches(rows, batch_size):
+                writer.write_batch(rows_to_batch(chunk, schema))
+                data = sink.drain()
+                if data:
+                    yield data
+        yield sink.drain()
+
+    @staticmethod
+    def stream(fmt, sheet_name, columns, rows):
+        """Generator bytes theo định dạng 'xlsx' hoặc 'csv'."""
+        if fmt == "csv":
+            return AttendanceExporter.stream_csv(columns, rows)
+        return AttendanceExporter.stream_xlsx(sheet_name, columns, rows)
+
+
+class _ChunkSink:
+    """File-like tối thiểu để pyarrow / zipfile ghi vào, generator lấy bytes ra theo từng lô."""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
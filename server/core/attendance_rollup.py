@@ -0,0 +1,211 @@
+from datetime import datetime
+from sqlalchemy import func, case, extract, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models.db_models import db, Attendance, AttendanceStatus, AttendanceRollup, DailyAttendanceSummary
+from core.attendance_archive import attendance_archive
+
+# Trạng thái -> cột đếm trong attendance_rollup (các trạng thái khác không ảnh hưởng lương)
+STATUS_COLUMNS = {
+    AttendanceStatus.ON_TIME: "on_time_count",
+    AttendanceStatus.ON_LEAVE: "on_leave_count",
+    AttendanceStatus.LATE: "late_count",
+}
+YEAR_TOTAL = 0  # month = 0 -> dòng tổng cả năm
+NO_SHIFT = 0    # shift_id trong attendance_daily_summary khi Attendance không gắn ca
+
+
+class AttendanceRollupManager:
+    """
+    Giữ các bảng tổng hợp khớp với Attendance:
+    - attendance_rollup: số công theo user / tháng / năm (tính lương)
+    - attendance_daily_summary: số bản ghi theo ngày / ca / trạng thái (Dashboard)
+
+    Mọi chỗ tạo / đổi trạng thái Attendance gọi record_change() trước khi commit,
+    nên 2 bảng được ghi cùng transaction. rebuild() dựng lại toàn bộ từ Attendance
+    và các tháng đã archive ra Parquet (archive không làm đổi số liệu tổng hợp).
+    """
+
+    @staticmethod
+    def record_change(user_id, checkin_time, old_status=None, new_status=None, shift_id=None):
+        """
+        Cập nhật tổng hợp khi 1 bản ghi Attendance được tạo (old_status=None),
+        đổi trạng thái, hoặc bị xoá (new_status=None). Không commit.
+        """
+        AttendanceRollupManager.record_changes([(user_id, checkin_time, shift_id, old_status, new_status)])
+
+    @staticmethod
+    def record_changes(changes):
+        """
+        Như record_change cho nhiều bản ghi: gộp delta theo từng dòng tổng hợp
+        rồi upsert mỗi dòng 1 lần.
+
+        Args:
+            changes: iterable of (user_id, checkin_time, shift_id, old_status, new_status)
+        """
+        periods = {}    # (user_id, year, month) -> {column: delta}
+        days = {}       # (day, shift_id, status) -> delta
+        for user_id, checkin_time, shift_id, old_status, new_status in changes:
+            if checkin_time is None or old_status == new_status:
+                continue
+            for status, delta in ((old_status, -1), (new_status, 1)):
+                if status is None:
+                    continue
+                key = (checkin_time.date(), shift_id or NO_SHIFT, status)
+                days[key] = days.get(key, 0) + delta
+
+                column = STATUS_COLUMNS.get(status)
+                if not column:
+                    continue
+                for month in (checkin_time.month, YEAR_TOTAL):
+                    deltas = periods.setdefault((user_id, checkin_time.year, month), {})
+                    deltas[column] = deltas.get(column, 0) + delta
+
+        table = AttendanceRollup.__table__
+        for (user_id, year, month), deltas in periods.items():
+            deltas = {column: delta for column, delta in deltas.items() if delta}
+            if not deltas:
+                continue
+            values = dict(dict.fromkeys(STATUS_COLUMNS.values(), 0), **deltas)
+            stmt = sqlite_insert(table).values(user_id=user_id, year=year, month=month, **values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["user_id", "year", "month"],
+                set_={column: table.c[column] + delta for column, delta in deltas.items()}
+            )
+            db.session.execute(stmt)
+
+        table = DailyAttendanceSummary.__table__
+        for (day, shift_id, status), delta in days.items():
+            if not delta:
+                continue
+            stmt = sqlite_insert(table).values(day=day, shift_id=shift_id, status=status, count=delta)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["day", "shift_id", "status"],
+                set_={"count": table.c.count + delta}
+            )
+            db.session.execute(stmt)
+
+    @staticmethod
+    def remove_user(user_id):
+        """
+        Trừ Attendance của user (cả các tháng đã archive) khỏi các bảng tổng hợp
+        (gọi trước khi xoá Attendance của nhân viên). Không commit; file Parquet
+        chỉ được ghi lại sau commit bằng attendance_archive.purge_user().
+        """
+        rows = db.session.query(Attendance.checkin_time, Attendance.shift_id, Attendance.status).filter(
+            Attendance.user_id == user_id
+        ).all()
+        rows += attendance_archive.user_facts(user_id)
+        AttendanceRollupManager.record_changes(
+            (user_id, checkin_time, shift_id, status, None) for checkin_time, shift_id, status in rows
+        )
+        db.session.execute(delete(AttendanceRollup).where(AttendanceRollup.user_id == user_id))
+
+    @staticmethod
+    def delete_user(user_id):
+        """
+        Xoá Attendance của nhân viên cùng phần tương ứng trong các bảng tổng hợp
+        (trừ tổng hợp trước, vì remove_user đọc chính các bản ghi sắp xoá). Không commit.
+        """
+        AttendanceRollupManager.remove_user(user_id)
+        Attendance.query.filter_by(user_id=user_id).delete()
+
+    @staticmethod
+    def get_counts(year, month, user_ids=None):
+        """
+        Returns: dict user_id -> {"month": AttendanceRollup | None, "year": AttendanceRollup | None}
+        (đọc tối đa 2 dòng / user thay vì quét Attendance)
+        """
+        query = AttendanceRollup.query.filter(
+            AttendanceRollup.year == year,
+            AttendanceRollup.month.in_([month, YEAR_TOTAL])
+        )
+        if user_ids is not None:
+            query = query.filter(AttendanceRollup.user_id.in_(user_ids))
+
+        counts = {}
+        for row in query:
+            key = "year" if row.month == YEAR_TOTAL else "month"
+            counts.setdefault(row.user_id, {"month": None, "year": None})[key] = row
+        return counts
+
+    @staticmethod
+    def get_daily_counts(start_day, end_day, shift_id=None):
+        """
+        Số bản ghi Attendance theo ngày và trạng thái trong [start_day, end_day] (date).
+
+        Returns: dict date -> {AttendanceStatus: count}
+        """
+        query = db.session.query(
+            DailyAttendanceSummary.day, DailyAttendanceSummary.status, func.sum(DailyAttendanceSummary.count)
+        ).filter(
+            DailyAttendanceSummary.day >= start_day,
+            DailyAttendanceSummary.day <= end_day
+        )
+        if shift_id is not None:
+            query = query.filter(DailyAttendanceSummary.shift_id == shift_id)
+
+        counts = {}
+        for day, status, count in query.group_by(DailyAttendanceSummary.day, DailyAttendanceSummary.status):
+            counts.setdefault(day, {})[status] = int(count or 0)
+        return counts
+
+    @staticmethod
+    def rebuild():
+        """Dựng lại toàn bộ các bảng tổng hợp từ Attendance (backfill / sửa lệch). Có commit."""
+        year = extract("year", Attendance.checkin_time)
+        month = extract("month", Attendance.checkin_time)
+        sums = [
+            func.sum(case((Attendance.status == status, 1), else_=0)).label(column)
+            for status, column in STATUS_COLUMNS.items()
+        ]
+        base = db.session.query(Attendance.user_id, year.label("year"), month.label("month"), *sums).filter(
+            Attendance.checkin_time.isnot(None),
+            Attendance.status.in_(list(STATUS_COLUMNS))
+        ).group_by(Attendance.user_id, year, month)
+
+        monthly = {}    # (user_id, year, month) -> {column: count}
+        for r in base:
+            monthly[(r.user_id, int(r.year), int(r.month))] = {
+                column: int(getattr(r, column) or 0) for column in STATUS_COLUMNS.values()
+            }
+
+        day = func.date(Attendance.checkin_time)
+        shift = func.coalesce(Attendance.shift_id, NO_SHIFT)
+        daily = {
+            (datetime.strptime(d, "%Y-%m-%d").date(), shift_id, status): count
+            for d, shift_id, status, count in db.session.query(day, shift, Attendance.status, func.count(Attendance.id)).filter(
+                Attendance.checkin_time.isnot(None),
+                Attendance.status.isnot(None)
+            ).group_by(day, shift, Attendance.status)
+        }
+
+        # Các tháng đã archive
+        for user_id, checkin_time, shift_id, status in attendance_archive.iter_facts():
+            if checkin_time is None:
+                continue
+            key = (checkin_time.date(), shift_id or NO_SHIFT, status)
+            daily[key] = daily.get(key, 0) + 1
+            column = STATUS_COLUMNS.get(status)
+            if column:
+                counts = monthly.setdefault((user_id, checkin_time.year, checkin_time.month),
+                                            dict.fromkeys(STATUS_COLUMNS.values(), 0))
+                counts[column] += 1
+
+        rows = []
+        yearly = {}
+        for (user_id, year, month), counts in monthly.items():
+            rows.append(dict(user_id=user_id, year=year, month=month, **counts))
+            total = yearly.setdefault((user_id, year), dict.fromkeys(STATUS_COLUMNS.values(), 0))
+            for column, value in counts.items():
+                total[column] += value
+        rows += [dict(user_id=uid, year=y, month=YEAR_TOTAL, **counts) for (uid, y), counts in yearly.items()]
+        daily = [dict(day=d, shift_id=shift_id, status=status, count=count) for (d, shift_id, status), count in daily.items()]
+
+        db.session.execute(delete(AttendanceRollup))
+        db.session.execute(delete(DailyAttendanceSummary))
+        if rows:
+            db.session.execute(AttendanceRollup.__table__.insert(), rows)
+        if daily:
+            db.session.execute(DailyAttendanceSummary.__table__.insert(), daily)
+        db.session.commit()
+        return len(rows) + len(daily)
@@ -0,0 +1,138 @@
+import threading
+from datetime import datetime, timedelta
+from models.db_models import db, User, Attendance, AttendanceStatus
+from core.ai_engine import AIEngine
+from core.ai_worker_pool import ai_pool
+from core.face_gallery import face_gallery
+from core.face_template_manager import FaceTemplateManager
+from core.shift_manager import ShiftManager
+from core.attendance_rollup import AttendanceRollupManager
+
+# Khoá theo user_id: kiểm tra bản ghi hôm nay + insert phải tuần tự cho cùng 1 người
+# (kênh stream xử lý nhiều frame của cùng 1 khuôn mặt song song)
+_user_locks = {}
+_user_locks_guard = threading.Lock()
+
+
+def _user_lock(user_id):
+    with _user_locks_guard:
+        lock = _user_locks.get(user_id)
+        if lock is None:
+            lock = _user_locks[user_id] = threading.Lock()
+        return lock
+
+
+class CheckinManager:
+    @staticmethod
+    def process_checkin(img):
+        """
+        Nhận diện khuôn mặt và ghi Check-in / Check-out.
+        Dùng chung cho /api/checkin (sync) và kênh stream.
+
+        Returns:
+            (payload: dict, http_status: int) - payload giữ nguyên JSON contract của /api/checkin
+        """
+        user, error = CheckinManager.identify(img)
+        if user is None:
+            return error
+        return CheckinManager.record(user)
+
+    @staticmethod
+    def identify(img):
+        """
+        Nhận diện khuôn mặt trên ảnh (chưa ghi gì vào DB).
+
+        Returns:
+            (user, None) nếu khớp, (None, (payload, http_status)) nếu không
+        """
+        FaceTemplateManager.ensure_gallery()
+        if len(face_gallery) == 0:
+            return None, ({"success": False, "message": "Chưa có dữ liệu khuôn mặt nào trong hệ thống!"}, 400)
+
+        # Extract & Match (Anti-Spoofing handled inside AIEngine)
+        input_embedding, msg = ai_pool.get_embedding(img)
+        if input_embedding is None:
+            return None, ({"success": False, "message": f"Không nhận diện được khuôn mặt: {msg}"}, 400)
+
+        matched_id, distance = AIEngine.identify(input_embedding)
+        matched_user = User.query.get(matched_id) if matched_id is not None else None
+        if matched_user is None:
+            return None, ({"success": False, "message": "Không nhận diện được khuôn mặt!"}, 400)
+        return matched_user, None
+
+    @staticmethod
+    def record(user):
+        """Ghi Check-in / Check-out cho user đã nhận diện (tuần tự theo user)."""
+        with _user_lock(user.id):
+            return CheckinManager._record(user)
+
+    @staticmethod
+    def _record(user):
+        """Ghi Check-in / Check-out cho user đã nhận diện (gọi khi đang giữ _user_lock(user.id))."""
+        now = datetime.now()
+
+        # 1. Tìm ca làm việc tự động
+        matched_shift = ShiftManager.get_matching_shift(now)
+
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        # Check existing attendance
+        attendance = Attendance.query.filter(
+            Attendance.user_id == user.id,
+            Attendance.checkin_time >= today_start
+        ).first()
+
+        if attendance:
+            # SPAM PREVENTION
+            last_action_time = attendance.checkout_time if attendance.checkout_time else attendance.checkin_time
+            if (now - last_action_time) < timedelta(seconds=60):
+                status_str = "Check-out" if attendance.checkout_time else "Check-in"
+                return {
+                    "success": True,
+                    "name": user.name,
+                    "status": status_str,
+                    "message": "Bạn vừa thao tác rồi (Chờ 60s)!"
+                }, 200
+
+            # Handle Check-out
+            attendance.checkout_time = now
+            db.session.commit()
+
+            return {
+                "success": True,
+                "type": "CHECK_OUT",
+                "name": user.name,
+                "status": "Đã về",
+                "message": "Check-out thành công!"
+            }, 200
+        else:
+            # Handle Check-in
+            status = AttendanceStatus.ON_TIME
+            shift_id = None
+
+            if matched_shift:
+                shift_id = matched_shift.id
+                status = ShiftManager.calculate_status(now, matched_shift)
+            else:
+                status = AttendanceStatus.OVERTIME
+
+            new_attendance = Attendance(
+                user_id=user.id,
+                shift_id=shift_id,
+                checkin_time=now,
+                status=status
+            )
+            db.session.add(new_attendance)
+            AttendanceRollupManager.record_change(user.id, now, None, status, shift_id=shift_id)
+            db.session.commit()
+
+            status_vn = "Đúng giờ" if status == AttendanceStatus.ON_TIME else ("Đi muộn" if status == AttendanceStatus.LATE else "Ngoài giờ")
+            shift_name = matched_shift.name if matched_shift else "Tăng ca"
+
+            return {
+                "success": True,
+                "type": "CHECK_IN",
+                "name": user.name,
+                "status": status_vn,
+                "message": f"Check-in thành công ({status_vn}) - {shift_name}"
+            }, 200
@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core.ai_engine import AIEngine
+from core.checkin_manager import CheckinManager
+
+logger = logging.getLogger(__name__)
+
+# config
+STREAM_WORKERS = int(os.environ.get("CHECKIN_STREAM_WORKERS", "4"))  # thread xử lý frame (dùng chung mọi session)
+STREAM_MAX_SESSIONS = 64
+STREAM_MAX_PENDING = 4          # frame đang chờ / session, vượt quá -> 429 (kiosk bỏ frame)
+STREAM_IDLE_TTL_S = 120         # session không có hoạt động sẽ bị dọn
+STREAM_HEARTBEAT_S = 15         # comment ": ping" giữ kết nối SSE qua proxy
+# Camera nhận lại cùng 1 người trong cửa sổ này (tính từ lần thấy gần nhất) -> trả lại
+# kết quả cũ thay vì ghi tiếp (tránh check-out khi nhân viên đứng / đi ngang camera)
+STREAM_REPEAT_WINDOW_S = int(os.environ.get("CHECKIN_STREAM_REPEAT_WINDOW_S", "300"))
+
+
+class CheckinStreamSession:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.events = queue.Queue()
+        self.pending = 0
+        self.next_frame_id = 1
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self.lock = threading.Lock()
+        self.recent = {}                        # user_id -> (lần thấy gần nhất, payload, status)
+        self.record_lock = threading.Lock()     # tra recent + ghi DB tuần tự trong session
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+
+class CheckinStreamHub:
+    """
+    Kênh check-in dạng stream cho kiosk (camera liên tục).
+
+    Kiosk mở 1 session, nghe kết quả qua Server-Sent Events và POST frame
+    liên tục mà không phải chờ kết quả của frame trước. Frame được xử lý
+    trên thread pool nền (cùng luật check-in / check-out như /api/checkin),
+    kết quả được đẩy về ngay khi xong, kèm frame_id để kiosk ghép cặp.
+
+    Cùng 1 người được nhận lại liên tục trong repeat_window giây chỉ ghi 1 lần,
+    các frame sau nhận lại kết quả đã ghi (kèm "repeat": true).
+    """
+
+    def __init__(self, workers=STREAM_WORKERS, max_sessions=STREAM_MAX_SESSIONS,
+                 max_pending=STREAM_MAX_PENDING, idle_ttl=STREAM_IDLE_TTL_S,
+                 repeat_window=STREAM_REPEAT_WINDOW_S):
+        self.workers = workers
+        self.max_sessions = max_sessions
+        self.max_pending = max_pending
+        self.idle_ttl = idle_ttl
+        self.repeat_window = repeat_window
+        self._app = None
+        self._executor = None
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._stats = {"frames": 0, "rejected": 0, "errors": 0, "repeats": 0}
+
+    def init_app(self, app):
+        self._app = app
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="checkin-stream")
+            return self._executor
+
+    # ------------------------------------------------------------------
+    # Sessions
+    # ------------------------------------------------------------------
+    def _sweep(self):
+        """Dọn session idle quá idle_ttl (gọi khi đang giữ self._lock)."""
+        now = time.monotonic()
+        for sid in [sid for sid, s in self._sessions.items() if now - s.last_seen > self.idle_ttl]:
+            self._sessions.pop(sid).closed = True
+
+    def open(self):
+        """Returns: session mới, hoặc None nếu đã đủ max_sessions"""
+        with self._lock:
+            self._sweep()
+            if len(self._sessions) >= self.max_sessions:
+                return None
+            session = CheckinStreamSession()
+            self._sessions[session.id] = session
+            return session
+
+    def get(self, sid):
+        with self._lock:
+            session = self._sessions.get(sid)
+        if session is not None:
+            session.touch()
+        return session
+
+    def close(self, sid):
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+        if session is None:
+            return False
+        session.closed = True
+        session.events.put(None)  # đánh thức generator SSE
+        return True
+
+    # ------------------------------------------------------------------
+    # Frames
+    # ------------------------------------------------------------------
+    def submit(self, session, source):
+        """
+        Đưa 1 frame (bytes / base64 chưa decode) vào hàng đợi xử lý.
+
+        Returns: frame_id, hoặc None nếu session đang có quá nhiều frame chờ
+        """
+        with session.lock:
+            rejected = session.pending >= self.max_pending
+            if not rejected:
+                session.pending += 1
+                frame_id = session.next_frame_id
+                session.next_frame_id += 1
+        self._count("rejected" if rejected else "frames")
+        if rejected:
+            return None
+        self._get_executor().submit(self._process, session, frame_id, source)
+        return frame_id
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _process(self, session, frame_id, source):
+        try:
+            with self._app.app_context():
+                img = AIEngine.load_image(source)
+                if img is None:
+                    payload, status_code = {"success": False, "message": "Lỗi ảnh đầu vào!"}, 400
+                else:
+                    user, error = CheckinManager.identify(img)
+                    payload, status_code = error if user is None else self._record(session, user)
+        except Exception as e:
+            logger.error(f"[CheckinStream] frame {frame_id}: {e}")
+            self._count("errors")
+            payload, status_code = {"success": False, "message": f"Lỗi nội bộ: {str(e)}"}, 500
+        finally:
+            with session.lock:
+                session.pending -= 1
+
+        if not session.closed:
+            session.events.put(dict(payload, frame_id=frame_id, status_code=status_code))
+
+    def _record(self, session, user):
+        """Ghi check-in / check-out, hoặc trả lại kết quả cũ nếu vừa thấy user trong session."""
+        with session.record_lock:
+            now = time.monotonic()
+            session.recent = {uid: entry for uid, entry in session.recent.items()
+                              if now - entry[0] <= self.repeat_window}
+            cached = session.recent.get(user.id)
+            if cached is not None:
+                _, payload, status_code = cached
+                session.recent[user.id] = (now, payload, status_code)
+                repeat = True
+            else:
+                payload, status_code = CheckinManager.record(user)
+                session.recent[user.id] = (now, payload, status_code)
+                repeat = False
+        if repeat:
+            self._count("repeats")
+            return dict(payload, repeat=True), status_code
+        return payload, status_code
+
+    def events(self, session, heartbeat=STREAM_HEARTBEAT_S):
+        """Generator text/event-stream: 1 event `result` cho mỗi frame đã xử lý."""
+        yield f"event: ready\ndata: {json.dumps({'session_id': session.id})}\n\n"
+        while not session.closed:
+            try:
+                result = session.events.get(timeout=heartbeat)
+            except queue.Empty:
+                session.touch()
+                yield ": ping\n\n"
+                continue
+            if result is None:
+                break
+            session.touch()
+            data = json.dumps(result, ensure_ascii=False)
+            yield f"id: {result['frame_id']}\nevent: result\ndata: {data}\n\n"
+        yield "event: close\ndata: {}\n\n"
+
+    def stats(self):
+        with self._lock:
+            sessions = len(self._sessions)
+            stats = dict(self._stats)
+        return dict(stats, sessions=sessions, workers=self.workers, max_pending=self.max_pending,
+                    repeat_window=self.repeat_window)
+
+
+checkin_stream_hub = CheckinStreamHub()
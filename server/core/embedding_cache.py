@@ -0,0 +1,92 @@
+import time
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+
+# config
+EMBEDDING_CACHE_MB = 32       # dung lượng tối đa (MB)
+EMBEDDING_CACHE_TTL_S = 300   # thời gian sống của 1 entry (giây)
+
+# Ước lượng overhead cho mỗi entry (key, tuple, OrderedDict node...)
+_ENTRY_OVERHEAD = 256
+
+
+class EmbeddingCache:
+    """
+    LRU + TTL cache cho kết quả get_embedding, key là hash nội dung ảnh đã decode.
+    Lưu cả embedding lẫn lý do từ chối (không có mặt, giả mạo...).
+    Giới hạn theo MB thay vì số entry.
+    """
+
+    def __init__(self, max_mb=EMBEDDING_CACHE_MB, ttl=EMBEDDING_CACHE_TTL_S):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at, embedding | None, msg, size)
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    @staticmethod
+    def key_for(img):
+        """Hash nhanh (blake2b) trên buffer ảnh, không copy dữ liệu."""
+        img = np.ascontiguousarray(img)
+        h = hashlib.blake2b(digest_size=16)
+        h.update(str((img.shape, img.dtype.str)).encode())
+        h.update(memoryview(img).cast("B"))
+        return h.digest()
+
+    def get(self, key):
+        """Trả về (embedding, msg) hoặc None nếu miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            expires_at, embedding, msg, size = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+        return (embedding.tolist() if embedding is not None else None), msg
+
+    def put(self, key, embedding, msg):
+        stored = None if embedding is None else np.asarray(embedding, dtype=np.float32)
+        size = _ENTRY_OVERHEAD + len(key) + len(msg.encode()) + (stored.nbytes if stored is not None else 0)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, stored, msg, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[3]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                size_mb=round(self._bytes / (1024 * 1024), 3),
+                max_mb=round(self.max_bytes / (1024 * 1024), 3),
+                hit_ratio=round(self._stats["hits"] / lookups, 4) if lookups else 0.0
+            )
+
+
+embedding_cache = EmbeddingCache()
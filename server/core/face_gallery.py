@@ -0,0 +1,318 @@
+import logging
+import threading
+from collections import Counter
+import numpy as np
+from core.ann_index import IVFQuantizer
+
+logger = logging.getLogger(__name__)
+
+# config
+ANN_BACKEND = "exact"       # "exact" (brute-force) | "ivf" (approximate)
+ANN_MIN_SIZE = 20000        # dưới ngưỡng này brute-force vẫn nhanh hơn IVF
+IVF_NPROBE = 16             # số cụm quét mỗi lần search: tăng -> recall cao hơn, chậm hơn
+IVF_RERANK_K = 10           # số ứng viên top-k giữ lại để re-rank chính xác
+IVF_EXHAUSTIVE_FALLBACK = False  # quét toàn bộ nếu top-k không có ai dưới ngưỡng
+
+# multi-template: nhiều vector / user (các góc mặt, các lần đăng ký)
+TEMPLATE_AGGREGATION = "max"    # "max" | "topk_mean"
+TEMPLATE_TOP_K = 2              # số template dùng cho "topk_mean"
+MAX_TEMPLATES_PER_USER = 6      # giới hạn template / user (giữ bộ nhớ gallery ổn định)
+
+
+class FaceGallery:
+    """
+    Resident index of enrolled face embeddings.
+
+    Rows are L2-normalized float32 vectors stored in a pre-allocated matrix,
+    so matching a probe is a single matrix-vector product + argmin instead of
+    a Python loop over User objects.
+
+    A user may own several rows (one per enrolled template); scores are
+    aggregated per user with TEMPLATE_AGGREGATION.
+
+    With backend="ivf" (and at least ANN_MIN_SIZE rows) an IVF coarse
+    quantizer narrows the scan to the `nprobe` closest clusters; the top-k
+    candidates are then re-ranked exactly.
+    """
+
+    INITIAL_CAPACITY = 256
+
+    def __init__(self, backend=None, nprobe=None, rerank_k=None, min_ann_size=None):
+        self.backend = backend or ANN_BACKEND
+        self.nprobe = IVF_NPROBE if nprobe is None else nprobe
+        self.rerank_k = IVF_RERANK_K if rerank_k is None else rerank_k
+        if self.nprobe < 1 or self.rerank_k < 1:
+            raise ValueError(f"nprobe / rerank_k phải >= 1 (nprobe={self.nprobe}, rerank_k={self.rerank_k})")
+        self.min_ann_size = ANN_MIN_SIZE if min_ann_size is None else min_ann_size
+
+        self._lock = threading.RLock()
+        self._matrix = None          # (capacity, dim) float32, normalized
+        self._ids = None             # (capacity,) int64 user id sở hữu từng row
+        self._labels = None          # (capacity,) int32 cụm IVF của từng row
+        self._rows = {}              # key -> row index
+        self._row_keys = []          # row index -> key
+        self._owner_keys = {}        # user_id -> set(key)
+        self._size = 0
+        self._quantizer = None
+        self._lists_dirty = False
+        self.loaded = False
+
+    def __len__(self):
+        return self._size
+
+    @staticmethod
+    def _normalize(embedding):
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        # Vector 0 -> giữ nguyên 0, khoảng cách sẽ luôn là 1.0
+        return vec if norm == 0 else vec / norm
+
+    def _check_dim(self, dim, size=None):
+        """Gallery đang có vector khác số chiều -> từ chối (không xoá index của mọi user)."""
+        size = self._size if size is None else size
+        if size and self._matrix is not None and self._matrix.shape[1] != dim:
+            raise ValueError(f"Embedding có {dim} chiều, gallery đang dùng {self._matrix.shape[1]} chiều")
+
+    def _ensure_capacity(self, dim, needed):
+        self._check_dim(dim)
+        if self._matrix is None or self._matrix.shape[1] != dim:
+            capacity = max(self.INITIAL_CAPACITY, needed)
+            self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+            self._ids = np.zeros(capacity, dtype=np.int64)
+            self._labels = np.zeros(capacity, dtype=np.int32)
+            self._rows = {}
+            self._row_keys = []
+            self._owner_keys = {}
+            self._size = 0
+            self._quantizer = None
+            return
+
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, dim), dtype=np.float32)
+        ids = np.zeros(capacity, dtype=np.int64)
+        labels = np.zeros(capacity, dtype=np.int32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+        labels[:self._size] = self._labels[:self._size]
+        self._matrix, self._ids, self._labels = matrix, ids, labels
+
+    # ------------------------------------------------------------------
+    # IVF maintenance
+    # ------------------------------------------------------------------
+    def _use_ann(self):
+        return self.backend == "ivf" and self._size >= self.min_ann_size
+
+    def _train_quantizer(self):
+        vectors = self._matrix[:self._size]
+        quantizer = IVFQuantizer(nlist=int(np.sqrt(self._size)))
+        quantizer.train(vectors)
+        self._labels[:self._size] = quantizer.assign(vectors)
+        self._quantizer = quantizer
+        self._lists_dirty = True
+
+    def _refresh_ann(self):
+        """Train lại khi gallery tăng gấp đôi, dựng lại lists khi có thay đổi."""
+        if self._quantizer is None or self._size > 2 * self._quantizer.trained_size:
+            self._train_quantizer()
+        if self._lists_dirty:
+            self._quantizer.build_lists(self._labels[:self._size])
+            self._lists_dirty = False
+
+    # ------------------------------------------------------------------
+    # Mutations
+    # ------------------------------------------------------------------
+    def _reset(self):
+        self._matrix = None
+        self._ids = None
+        self._labels = None
+        self._rows = {}
+        self._row_keys = []
+        self._owner_keys = {}
+        self._size = 0
+        self._quantizer = None
+
+    def rebuild(self, items):
+        """
+        Replace the whole index.
+
+        Args:
+            items: iterable of (key, embedding) or (key, embedding, user_id).
+                Without user_id the key itself is the user id (1 vector / user).
+        """
+        items = [(it[0], self._normalize(it[1]), it[2] if len(it) > 2 else it[0]) for it in items if it[1] is not None]
+        dims = Counter(vec.shape[0] for _, vec, _ in items)
+        if len(dims) > 1:
+            # Giữ số chiều phổ biến nhất, bỏ (và log) các vector lệch thay vì lỗi cả index
+            dim = dims.most_common(1)[0][0]
+            skipped = [key for key, vec, _ in items if vec.shape[0] != dim]
+            logger.warning(f"[FaceGallery] bỏ {len(skipped)} vector khác {dim} chiều: {skipped[:10]}")
+            items = [item for item in items if item[1].shape[0] == dim]
+        with self._lock:
+            self._reset()
+            if items:
+                vectors = np.stack([vec for _, vec, _ in items])
+                self._ensure_capacity(vectors.shape[1], len(items))
+                self._matrix[:len(items)] = vectors
+                for row, (key, _, owner) in enumerate(items):
+                    self._ids[row] = owner
+                    self._rows[key] = row
+                    self._row_keys.append(key)
+                    self._owner_keys.setdefault(owner, set()).add(key)
+                self._size = len(items)
+            self.loaded = True
+
+    def upsert(self, key, embedding, user_id=None):
+        """Insert or replace one vector (a user, or one template of `user_id`)."""
+        if embedding is None:
+            self.remove(key)
+            return
+        owner = key if user_id is None else user_id
+        vec = self._normalize(embedding)
+        with self._lock:
+            self._check_dim(vec.shape[0])
+            row = self._rows.get(key)
+            if row is None:
+                self._ensure_capacity(vec.shape[0], self._size + 1)
+                row = self._size
+                self._rows[key] = row
+                self._row_keys.append(key)
+                self._size += 1
+            else:
+                self._owner_keys.get(int(self._ids[row]), set()).discard(key)
+            self._ids[row] = owner
+            self._owner_keys.setdefault(owner, set()).add(key)
+            self._matrix[row] = vec
+            if self._quantizer is not None:
+                self._labels[row] = self._quantizer.assign(vec)[0]
+                self._lists_dirty = True
+
+    def remove(self, key):
+        """Drop one vector from the index (swap-with-last, O(dim))."""
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is None:
+                return
+            owner = int(self._ids[row])
+            keys = self._owner_keys.get(owner)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._owner_keys[owner]
+
+            last = self._size - 1
+            if row != last:
+                moved_key = self._row_keys[last]
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = self._ids[last]
+                self._labels[row] = self._labels[last]
+                self._row_keys[row] = moved_key
+                self._rows[moved_key] = row
+            self._row_keys.pop()
+            self._size = last
+            self._lists_dirty = True
+
+    def remove_user(self, user_id):
+        """Drop every vector (all templates) of one user."""
+        with self._lock:
+            for key in list(self._owner_keys.get(user_id, ())):
+                self.remove(key)
+
+    def replace_user(self, user_id, items):
+        """
+        Atomically replace all vectors of one user.
+        Raises ValueError (gallery không đổi) nếu số chiều khác các user còn lại.
+
+        Args:
+            items: iterable of (key, embedding)
+        """
+        items = [(key, emb) for key, emb in items]
+        with self._lock:
+            others = self._size - len(self._owner_keys.get(user_id, ()))
+            for _, embedding in items:
+                if embedding is not None:
+                    self._check_dim(self._normalize(embedding).shape[0], size=others)
+            self.remove_user(user_id)
+            for key, embedding in items:
+                self.upsert(key, embedding, user_id=user_id)
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+    def search_topk(self, embedding, k=1, threshold=None):
+        """
+        Top-k closest users by cosine distance (templates aggregated per user).
+
+        Returns: list of (user_id, distance), closest first
+        """
+        with self._lock:
+            if self._size == 0:
+                return []
+            probe = self._normalize(embedding)
+            if probe.shape[0] != self._matrix.shape[1]:
+                return []
+
+            if self._use_ann():
+                self._refresh_ann()
+                rows = self._quantizer.candidates(probe, self.nprobe)
+                results = self._rerank(probe, rows, max(k, self.rerank_k))
+                found = results and (threshold is None or results[0][1] < threshold)
+                if found or not IVF_EXHAUSTIVE_FALLBACK:
+                    return results[:k]
+
+            return self._rerank(probe, None, k)
+
+    def _user_score(self, user_id, probe):
+        """Điểm của 1 user trên toàn bộ template của user đó."""
+        rows = [self._rows[key] for key in self._owner_keys[user_id]]
+        scores = self._matrix[rows] @ probe
+        if TEMPLATE_AGGREGATION == "topk_mean" and scores.size > 1:
+            top = min(TEMPLATE_TOP_K, scores.size)
+            return float(np.mean(np.partition(scores, scores.size - top)[-top:]))
+        return float(scores.max())
+
+    def _rerank(self, probe, rows, k):
+        """
+        Exact cosine scoring of candidate rows (None = all rows), returns top-k users.
+
+        Mỗi user có tối đa MAX_TEMPLATES_PER_USER row, nên top k * MAX_TEMPLATES_PER_USER
+        row chắc chắn chứa template tốt nhất của top-k user; các user này được
+        chấm lại chính xác trên toàn bộ template của họ.
+        """
+        if rows is None:
+            scores = self._matrix[:self._size] @ probe
+            owners = self._ids[:self._size]
+        else:
+            scores = self._matrix[rows] @ probe
+            owners = self._ids[rows]
+        if scores.size == 0:
+            return []
+
+        # Trường hợp phổ biến: 1 vector / user, k = 1
+        if k == 1 and len(self._owner_keys) == self._size:
+            best = int(np.argmax(scores))
+            return [(int(owners[best]), float(1.0 - scores[best]))]
+
+        shortlist = min(scores.size, k * MAX_TEMPLATES_PER_USER)
+        top = np.argpartition(-scores, shortlist - 1)[:shortlist]
+        candidates = {int(owners[i]) for i in top}
+        ranked = sorted(((self._user_score(uid, probe), uid) for uid in candidates), reverse=True)
+        return [(uid, 1.0 - score) for score, uid in ranked[:k]]
+
+    def search(self, embedding, threshold=None):
+        """
+        Find the closest enrolled user by cosine distance.
+
+        Returns: (user_id, distance) or (None, 1.0) if the index is empty
+        """
+        results = self.search_topk(embedding, k=1, threshold=threshold)
+        if not results:
+            return None, 1.0
+        return results[0]
+
+
+# Index dùng chung cho toàn bộ process Flask
+face_gallery = FaceGallery()
@@ -0,0 +1,86 @@
+import logging
+from models.db_models import db, User, FaceTemplate
+from core.face_gallery import face_gallery, MAX_TEMPLATES_PER_USER
+
+logger = logging.getLogger(__name__)
+
+
+class FaceTemplateManager:
+    """
+    Quản lý các template khuôn mặt (nhiều vector / user) và đồng bộ với gallery trong RAM
+    """
+
+    @staticmethod
+    def add_templates(user_id, embeddings, poses=None, replace=False):
+        """
+        Lưu các embedding của 1 lần đăng ký thành template riêng.
+        Giữ tối đa MAX_TEMPLATES_PER_USER template mới nhất / user.
+
+        Args:
+            user_id: ID nhân viên
+            embeddings: list các vector
+            poses: list góc mặt tương ứng, cùng độ dài với embeddings (optional)
+            replace: True -> xóa toàn bộ template cũ trước khi thêm
+        """
+        poses = poses or [None] * len(embeddings)
+        if len(poses) != len(embeddings):
+            raise ValueError(f"{len(poses)} poses cho {len(embeddings)} embeddings")
+
+        if replace:
+            FaceTemplate.query.filter_by(user_id=user_id).delete()
+
+        for emb, pose in zip(embeddings, poses):
+            db.session.add(FaceTemplate(user_id=user_id, pose=pose, embedding=emb))
+        db.session.flush()
+
+        # Prune: bỏ các template cũ nhất vượt giới hạn
+        stale_ids = [
+            t.id for t in FaceTemplate.query.with_entities(FaceTemplate.id)
+            .filter_by(user_id=user_id)
+            .order_by(FaceTemplate.created_at.desc(), FaceTemplate.id.desc())
+            .offset(MAX_TEMPLATES_PER_USER)
+            .all()
+        ]
+        if stale_ids:
+            FaceTemplate.query.filter(FaceTemplate.id.in_(stale_ids)).delete(synchronize_session=False)
+
+    @staticmethod
+    def gallery_items(user_id=None):
+        """
+        (key, embedding, user_id) cho gallery. User chưa có template (dữ liệu cũ)
+        dùng User.face_encoding làm template duy nhất.
+        """
+        query = db.session.query(FaceTemplate.id, FaceTemplate.embedding, FaceTemplate.user_id)
+        if user_id is not None:
+            query = query.filter(FaceTemplate.user_id == user_id)
+        items = [(("tpl", tid), emb, uid) for tid, emb, uid in query.all()]
+
+        legacy = db.session.query(User.id, User.face_encoding).filter(
+            User.face_encoding.isnot(None),
+            ~User.id.in_(db.session.query(FaceTemplate.user_id))
+        )
+        if user_id is not None:
+            legacy = legacy.filter(User.id == user_id)
+        items += [(("user", uid), emb, uid) for uid, emb in legacy.all()]
+        return items
+
+    @staticmethod
+    def load_gallery():
+        """Nạp toàn bộ template vào gallery (khởi động / lần check-in đầu tiên)"""
+        face_gallery.rebuild(FaceTemplateManager.gallery_items())
+
+    @staticmethod
+    def ensure_gallery():
+        """Nạp gallery nếu chưa nạp (chỉ 1 lần mỗi process)"""
+        if not face_gallery.loaded:
+            FaceTemplateManager.load_gallery()
+
+    @staticmethod
+    def refresh_gallery(user_id):
+        """Đồng bộ gallery cho 1 user sau khi commit thay đổi khuôn mặt"""
+        items = FaceTemplateManager.gallery_items(user_id)
+        try:
+            face_gallery.replace_user(user_id, [(key, emb) for key, emb, _ in items])
+        except ValueError as e:
+            # vector lệch số chiều (model khác) -> giữ nguyên gallery của mọi user
+            logger.error(f"[FaceTemplate] không cập nhật gallery cho user {user_id}: {e}")
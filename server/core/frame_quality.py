@@ -0,0 +1,121 @@
+import threading
+import cv2
+import numpy as np
+from collections import Counter
+
+# config
+QUALITY_GATE_ENABLED = True
+GATE_MAX_SIDE = 640                 # downscale trước khi phân tích exposure / blur
+DETECT_MAX_SIDE = 320               # downscale thêm cho Haar detector
+BLUR_MIN_LAPLACIAN_VAR = 40.0       # phương sai Laplacian tối thiểu (vùng mặt)
+EXPOSURE_MIN_MEAN = 30              # độ sáng trung bình tối thiểu (0-255)
+EXPOSURE_MAX_MEAN = 235             # độ sáng trung bình tối đa
+EXPOSURE_MAX_CLIPPED_RATIO = 0.5    # tỉ lệ pixel cháy/đen tối đa
+MIN_FACE_SIZE_PX = 80               # cạnh nhỏ nhất của khung mặt (theo ảnh gốc)
+
+# reject reasons
+REASON_DARK = "too_dark"
+REASON_BRIGHT = "too_bright"
+REASON_NO_FACE = "no_face"
+REASON_FACE_SMALL = "face_too_small"
+REASON_BLURRY = "too_blurry"
+
+REASON_MESSAGES = {
+    REASON_DARK: "Ảnh quá tối, vui lòng đứng nơi đủ sáng.",
+    REASON_BRIGHT: "Ảnh quá sáng / bị chói, vui lòng điều chỉnh ánh sáng.",
+    REASON_NO_FACE: "Không tìm thấy khuôn mặt nào!",
+    REASON_FACE_SMALL: "Khuôn mặt quá nhỏ, vui lòng đến gần camera hơn.",
+    REASON_BLURRY: "Ảnh bị mờ, vui lòng giữ yên và thử lại.",
+}
+
+
+class FrameQualityGate:
+    """
+    Bộ lọc rẻ (vài ms) chạy trước DeepFace: loại ảnh quá tối/sáng,
+    không có mặt, mặt quá nhỏ hoặc bị mờ.
+    Face detector là Haar cascade - cùng loại với backend "opencv" của DeepFace.
+    """
+
+    def __init__(self):
+        self._detector = None
+        self._detector_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._counters = Counter()
+
+    def _get_detector(self):
+        # CascadeClassifier không thread-safe -> mỗi thread 1 instance
+        local = self._detector
+        if local is None:
+            with self._detector_lock:
+                if self._detector is None:
+                    self._detector = threading.local()
+                local = self._detector
+        if not hasattr(local, "cascade"):
+            local.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+        return local.cascade
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._counters[key] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._counters)
+
+    def check(self, img):
+        """
+        Returns: (ok, reason, metrics)
+            reason: None nếu đạt, ngược lại là 1 trong các REASON_*
+        """
+        h, w = img.shape[:2]
+        scale = min(1.0, GATE_MAX_SIDE / max(h, w))
+        small = img
+        if scale < 1.0:
+            small = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+        metrics = {}
+
+        # 1. Exposure
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+        total = hist.sum()
+        mean = float(np.dot(hist, np.arange(256)) / total)
+        clipped_dark = float(hist[:6].sum() / total)
+        clipped_bright = float(hist[250:].sum() / total)
+        metrics.update(brightness=round(mean, 1), clipped_dark=round(clipped_dark, 3), clipped_bright=round(clipped_bright, 3))
+
+        if mean < EXPOSURE_MIN_MEAN or clipped_dark > EXPOSURE_MAX_CLIPPED_RATIO:
+            return self._reject(REASON_DARK, metrics)
+        if mean > EXPOSURE_MAX_MEAN or clipped_bright > EXPOSURE_MAX_CLIPPED_RATIO:
+            return self._reject(REASON_BRIGHT, metrics)
+
+        # 2. Face box (Haar) trên ảnh nhỏ hơn nữa
+        det_scale = min(1.0, DETECT_MAX_SIDE / max(gray.shape[:2]))
+        det = gray if det_scale == 1.0 else cv2.resize(
+            gray, (int(gray.shape[1] * det_scale), int(gray.shape[0] * det_scale)), interpolation=cv2.INTER_AREA)
+        min_side = max(24, int(MIN_FACE_SIZE_PX * scale * det_scale) // 2)
+        faces = self._get_detector().detectMultiScale(det, scaleFactor=1.15, minNeighbors=5, minSize=(min_side, min_side))
+        if len(faces) == 0:
+            return self._reject(REASON_NO_FACE, metrics)
+
+        # Đổi toạ độ về ảnh `gray`
+        x, y, fw, fh = (int(v / det_scale) for v in max(faces, key=lambda f: f[2] * f[3]))
+        metrics["face_size_px"] = int(min(fw, fh) / scale)
+        if metrics["face_size_px"] < MIN_FACE_SIZE_PX:
+            return self._reject(REASON_FACE_SMALL, metrics)
+
+        # 3. Blur trên vùng mặt (nền mờ không ảnh hưởng)
+        blur = float(cv2.Laplacian(gray[y:y + fh, x:x + fw], cv2.CV_64F).var())
+        metrics["blur_score"] = round(blur, 1)
+        if blur < BLUR_MIN_LAPLACIAN_VAR:
+            return self._reject(REASON_BLURRY, metrics)
+
+        self._count("passed")
+        return True, None, metrics
+
+    def _reject(self, reason, metrics):
+        self._count(reason)
+        return False, reason, metrics
+
+
+frame_quality_gate = FrameQualityGate()
@@ -1,54 +1,140 @@
 from datetime import timedelta
-from models.db_models import db, LeaveRequest, LeaveStatus, Attendance, AttendanceStatus
+from sqlalchemy import insert
+from models.db_models import db, User, LeaveRequest, LeaveStatus, Attendance, AttendanceStatus
+from core.attendance_rollup import AttendanceRollupManager
+from utils.pagination import keyset_before
 
 class LeaveManager:
     @staticmethod
-    def approve_leave_request(leave_request_id, admin_id=None):
+    def _leave_days(leave_request):
+        """Các mốc 0h của từng ngày trong đơn nghỉ (start_date -> end_date, bước 1 ngày)"""
+        days = []
+        current_date = leave_request.start_date
+        while current_date <= leave_request.end_date:
+            days.append(current_date.replace(hour=0, minute=0, second=0, microsecond=0))
+            current_date += timedelta(days=1)
+        return days
+
+    @staticmethod
+    def _apply_leave(leave_request):
         """
-        Approves a leave request and updates Attendance records for the duration.
+        Đánh dấu ON_LEAVE cho mọi ngày trong đơn: 1 query lấy Attendance của cả khoảng,
+        cập nhật ngày đã có, bulk insert ngày còn thiếu. Không commit.
         """
-        leave_request = LeaveRequest.query.get(leave_request_id)
-        
-        if not leave_request:
-            return False, "Yêu cầu nghỉ phép không tồn tại"
-        
-        if leave_request.status != LeaveStatus.PENDING:
-            return False, "Yêu cầu này đã được xử lý trước đó"
-            
-        # Update Status
-        leave_request.status = LeaveStatus.APPROVED
-        current_date = leave_request.start_date
-        end_date = leave_request.end_date
-        
-        while current_date <= end_date:
-            day_start = current_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            day_end = current_date.replace(hour=23, minute=59, second=59, microsecond=999999)
-            
-            attendance = Attendance.query.filter(
-                Attendance.user_id == leave_request.user_id,
-                Attendance.checkin_time >= day_start,
-                Attendance.checkin_time <= day_end
-            ).first()
-            
+        days = LeaveManager._leave_days(leave_request)
+        if not days:
+            return
+        user_id = leave_request.user_id
+
+        existing = Attendance.query.filter(
+            Attendance.user_id == user_id,
+            Attendance.checkin_time >= days[0],
+            Attendance.checkin_time < days[-1] + timedelta(days=1)
+        ).order_by(Attendance.id).all()
+
+        # Mỗi ngày chỉ cập nhật bản ghi đầu tiên (giống .first() theo từng ngày)
+        by_day = {}
+        for attendance in existing:
+            by_day.setdefault(attendance.checkin_time.date(), attendance)
+
+        changes = []
+        new_rows = []
+        for day_start in days:
+            attendance = by_day.get(day_start.date())
             if attendance:
                 # Update existing
+                changes.append((user_id, attendance.checkin_time, attendance.shift_id, attendance.status, AttendanceStatus.ON_LEAVE))
                 attendance.status = AttendanceStatus.ON_LEAVE
-                attendance.checkout_time = None 
+                attendance.checkout_time = None
             else:
                 # Create new
-                new_attendance = Attendance(
-                    user_id=leave_request.user_id,
-                    checkin_time=day_start,
-                    status=AttendanceStatus.ON_LEAVE,
-                    shift_id=None
-                )
-                db.session.add(new_attendance)
-            
-            current_date += timedelta(days=1)
-            
+                new_rows.append({
+                    "user_id": user_id,
+                    "checkin_time": day_start,
+                    "status": AttendanceStatus.ON_LEAVE,
+                    "shift_id": None
+                })
+                changes.append((user_id, day_start, None, None, AttendanceStatus.ON_LEAVE))
+
+        if new_rows:
+            db.session.execute(insert(Attendance), new_rows)
+        AttendanceRollupManager.record_changes(changes)
+
+    @staticmethod
+    def approve_leave_requests(leave_request_ids, admin_id=None):
+        """
+        Duyệt nhiều đơn nghỉ phép trong 1 transaction.
+
+        Returns:
+            (approved_count: int, results: List[dict]) với results theo thứ tự input:
+            {"id", "success", "message"}
+        """
+        leave_requests = {
+            lr.id: lr for lr in LeaveRequest.query.filter(LeaveRequest.id.in_(set(leave_request_ids)))
+        } if leave_request_ids else {}
+
+        results = []
+        approved = []
+        for leave_request_id in leave_request_ids:
+            leave_request = leave_requests.get(leave_request_id)
+            if not leave_request:
+                results.append({"id": leave_request_id, "success": False, "message": "Yêu cầu nghỉ phép không tồn tại"})
+                continue
+            if leave_request.status != LeaveStatus.PENDING:
+                results.append({"id": leave_request_id, "success": False, "message": "Yêu cầu này đã được xử lý trước đó"})
+                continue
+
+            # Update Status
+            leave_request.status = LeaveStatus.APPROVED
+            LeaveManager._apply_leave(leave_request)
+            approved.append(len(results))
+            results.append({"id": leave_request_id, "success": True, "message": "Đã duyệt đơn nghỉ phép"})
+
         try:
             db.session.commit()
-            return True, "Đã duyệt đơn nghỉ phép"
         except Exception as e:
             db.session.rollback()
-            return False, str(e)
+            for i in approved:
+                results[i].update(success=False, message=str(e))
+            return 0, results
+        return len(approved), results
+
+    @staticmethod
+    def approve_leave_request(leave_request_id, admin_id=None):
+        """
+        Approves a leave request and updates Attendance records for the duration.
+        """
+        _, results = LeaveManager.approve_leave_requests([leave_request_id], admin_id)
+        return results[0]["success"], results[0]["message"]
+
+    @staticmethod
+    def list_leave_requests(limit, cursor=None, user_id=None):
+        """
+        1 trang đơn nghỉ mới nhất trước, kèm tên NV trong cùng 1 query
+        (chỉ select các cột cần, không load User / face_encoding).
+
+        Args:
+            limit: số đơn / trang
+            cursor: (created_at, id) của đơn cuối trang trước (None = trang đầu)
+            user_id: chỉ lấy đơn của 1 nhân viên (None = tất cả)
+
+        Returns:
+            List row - tối đa limit + 1 dòng (dư 1 dòng nghĩa là còn trang sau)
+        """
+        query = db.session.query(
+            LeaveRequest.id,
+            LeaveRequest.user_id,
+            User.name.label("user_name"),
+            LeaveRequest.leave_type,
+            LeaveRequest.start_date,
+            LeaveRequest.end_date,
+            LeaveRequest.reason,
+            LeaveRequest.status,
+            LeaveRequest.created_at
+        ).outerjoin(User, User.id == LeaveRequest.user_id)
+
+        if user_id is not None:
+            query = query.filter(LeaveRequest.user_id == user_id)
+        if cursor:
+            query = query.filter(*keyset_before(LeaveRequest.created_at, LeaveRequest.id, cursor))
+        return query.order_by(LeaveRequest.created_at.desc(), LeaveRequest.id.desc()).limit(limit + 1).all()
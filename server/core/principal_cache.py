@@ -0,0 +1,86 @@
+import time
+import threading
+from collections import OrderedDict
+
+# config
+PRINCIPAL_CACHE_TTL_S = 30          # thời gian sống của 1 entry (giây)
+PRINCIPAL_CACHE_MAX_ENTRIES = 4096
+
+
+class PrincipalCache:
+    """
+    LRU + TTL cache cho principal (id, role, is_active) của token_required,
+    key là (user_id, token). Tránh query bảng User ở mỗi request được bảo vệ.
+    Các API sửa tài khoản phải gọi invalidate(user_id) sau khi commit.
+    """
+
+    def __init__(self, ttl=PRINCIPAL_CACHE_TTL_S, max_entries=PRINCIPAL_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (user_id, token) -> (expires_at, principal)
+        self._user_keys = {}            # user_id -> set(key)
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, user_id, token):
+        """Trả về principal (id, role, is_active) hoặc None nếu miss."""
+        key = (user_id, token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            expires_at, principal = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return principal
+
+    def put(self, user_id, token, principal):
+        key = (user_id, token)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, principal)
+            self._user_keys.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, user_id):
+        """Xoá mọi token đã cache của 1 user (khoá / xoá / đổi mật khẩu...)."""
+        with self._lock:
+            keys = self._user_keys.pop(user_id, ())
+            for key in keys:
+                self._entries.pop(key, None)
+            self._stats["invalidations"] += 1
+
+    def _drop(self, key):
+        self._entries.pop(key)
+        keys = self._user_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[key[0]]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                ttl=self.ttl,
+                hit_ratio=round(self._stats["hits"] / lookups, 4) if lookups else 0.0
+            )
+
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import uuid
+import socket
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from models.db_models import db, ReportJob, ReportJobStatus
+from core.report_manager import ReportManager
+from core.attendance_export import XLSX_MIMETYPE
+
+logger = logging.getLogger(__name__)
+
+# config
+REPORT_JOB_WORKERS = int(os.environ.get("REPORT_JOB_WORKERS", "2"))
+REPORT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR")                   # mặc định: <instance>/report_cache
+REPORT_CACHE_MAX_AGE_S = int(os.environ.get("REPORT_CACHE_MAX_AGE_S", str(7 * 24 * 3600)))
+REPORT_CACHE_MAX_BYTES = int(os.environ.get("REPORT_CACHE_MAX_MB", "512")) * 1024 * 1024
+REPORT_JOB_HEARTBEAT_S = int(os.environ.get("REPORT_JOB_HEARTBEAT_S", "30"))
+REPORT_JOB_STALE_AFTER = 3      # job chưa xong mất heartbeat quá 3 chu kỳ -> process chủ đã chết
+
+
+def _parse_day(value):
+    return datetime.strptime(value, "%Y-%m-%d") if value else None
+
+
+def _attendance_args(params):
+    """params JSON -> (start_date, end_date, user_id), end_date lấy trọn ngày"""
+    start, end = _parse_day(params.get("start_date")), _parse_day(params.get("end_date"))
+    if end:
+        end = end.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return start, end, params.get("user_id")
+
+
+def _attendance_filename(params, prefix="BaoCaoChamCong", ext="xlsx"):
+    parts = [params.get("start_date") or "dau", params.get("end_date") or "nay"]
+    if params.get("user_id"):
+        parts.append(f"NV{params['user_id']}")
+    return f"{prefix}_{'_'.join(parts)}.{ext}"
+
+
+# Loại báo cáo -> phiên bản dữ liệu / hàm ghi file / tên file tải về / định dạng
+REPORT_TYPES = {
+    "attendance": {
+        "version": lambda p: ReportManager.attendance_data_version(*_attendance_args(p)),
+        "write": lambda fh, p: ReportManager.write_attendance_report(fh, *_attendance_args(p)),
+        "filename": _attendance_filename,
+        "ext": "xlsx",
+        "mimetype": XLSX_MIMETYPE
+    },
+    # Parquet theo tháng (zip các partition month=YYYY-MM) cho BI
+    "attendance_parquet": {
+        "version": lambda p: ReportManager.attendance_data_version(*_attendance_args(p)),
+        "write": lambda fh, p: ReportManager.write_attendance_parquet(fh, *_attendance_args(p)),
+        "filename": lambda p: _attendance_filename(p, "ChamCongParquet", "zip"),
+        "ext": "zip",
+        "mimetype": "application/zip",
+        "requires_arrow": True
+    },
+    "payroll": {
+        "version": lambda p: ReportManager.payroll_data_version(p["month"], p["year"]),
+        "write": lambda fh, p: ReportManager.write_payroll_report(fh, p["month"], p["year"]),
+        "filename": lambda p: f"BangLuong_{p['year']}_{p['month']:02d}.xlsx",
+        "ext": "xlsx",
+        "mimetype": XLSX_MIMETYPE
+    }
+}
+
+
+class ReportJobQueue:
+    """
+    Hàng đợi xuất báo cáo chạy nền, trạng thái lưu ở bảng report_job.
+
+    Client gửi yêu cầu -> nhận job id -> poll trạng thái -> tải file khi DONE.
+    Job DONE đồng thời là cache: yêu cầu có cùng cache_key (loại báo cáo,
+    tham số, phiên bản dữ liệu) dùng lại file đã có thay vì dựng lại. Dữ liệu
+    thay đổi -> phiên bản đổi -> job mới. File bị xoá khi quá
+    REPORT_CACHE_MAX_AGE_S hoặc khi tổng dung lượng vượt REPORT_CACHE_MAX_BYTES
+    (xoá file lâu không được tải nhất trước).
+
+    Mỗi process ghi worker_id của mình vào job nó nhận và cập nhật heartbeat_at
+    định kỳ cho các job chưa xong; chỉ job mất heartbeat (process chủ đã chết)
+    mới bị coi là bỏ dở, nên nhiều process app dùng chung DB không xoá job của nhau.
+    """
+
+    def __init__(self, workers=REPORT_JOB_WORKERS, cache_dir=REPORT_CACHE_DIR,
+                 max_age=REPORT_CACHE_MAX_AGE_S, max_bytes=REPORT_CACHE_MAX_BYTES,
+                 heartbeat=REPORT_JOB_HEARTBEAT_S):
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.heartbeat = heartbeat
+        self.worker_id = None   # gán khi process bắt đầu chạy job (sau fork của gunicorn)
+        self._app = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "cache_hits": 0, "completed": 0, "failed": 0, "evicted": 0}
+
+    def init_app(self, app):
+        self._app = app
+        if self.cache_dir is None:
+            self.cache_dir = os.path.join(app.instance_path, "report_cache")
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="report-job")
+                threading.Thread(target=self._heartbeat_loop, name="report-job-heartbeat", daemon=True).start()
+            return self._executor
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _stale_before(self):
+        return datetime.utcnow() - timedelta(seconds=self.heartbeat * REPORT_JOB_STALE_AFTER)
+
+    def _beat(self):
+        """Gia hạn heartbeat cho các job chưa xong của process này. Có commit."""
+        ReportJob.query.filter(
+            ReportJob.worker_id == self.worker_id,
+            ReportJob.status.in_([ReportJobStatus.PENDING, ReportJobStatus.RUNNING])
+        ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.heartbeat)
+            try:
+                with self._app.app_context():
+                    self._beat()
+            except Exception:
+                logger.exception("Report job heartbeat failed")
+
+    @staticmethod
+    def cache_key(report_type, params, version):
+        raw = json.dumps([report_type, params, version], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _find_reusable(self, cache_key):
+        """Job cùng cache_key đang chạy hoặc đã xong (file còn trên đĩa)."""
+        jobs = ReportJob.query.filter(
+            ReportJob.cache_key == cache_key,
+            ReportJob.status != ReportJobStatus.FAILED
+        ).order_by(ReportJob.created_at.desc()).all()
+        for job in jobs:
+            if job.status == ReportJobStatus.DONE:
+                if job.file_path and os.path.exists(job.file_path):
+                    return job
+            elif job.heartbeat_at and job.heartbeat_at >= self._stale_before():
+                return job
+        return None
+
+    def submit(self, report_type, params, created_by=None):
+        """
+        Tạo job xuất báo cáo (gọi trong request / app context).
+
+        Returns:
+            ReportJob - job mới (PENDING) hoặc job đã có cùng cache_key
+        """
+        spec = REPORT_TYPES[report_type]
+        cache_key = self.cache_key(report_type, params, spec["version"](params))
+        executor = self._get_executor()
+
+        with self._lock:
+            job = self._find_reusable(cache_key)
+            if job is not None:
+                job.last_accessed_at = datetime.utcnow()
+                db.session.commit()
+                self._stats["cache_hits"] += 1
+                return job
+
+            job = ReportJob(
+                id=uuid.uuid4().hex,
+                report_type=report_type,
+                params=json.dumps(params, sort_keys=True),
+                cache_key=cache_key,
+                status=ReportJobStatus.PENDING,
+                download_name=spec["filename"](params),
+                created_by=created_by,
+                worker_id=self.worker_id,
+                heartbeat_at=datetime.utcnow()
+            )
+            db.session.add(job)
+            db.session.commit()
+            self._stats["submitted"] += 1
+
+        executor.submit(self._run, job.id)
+        return job
+
+    def get(self, job_id):
+        return db.session.get(ReportJob, job_id)
+
+    def open_file(self, job):
+        """Đường dẫn file của job DONE (đánh dấu vừa được tải), hoặc None."""
+        if job.status != ReportJobStatus.DONE or not job.file_path or not os.path.exists(job.file_path):
+            return None
+        job.last_accessed_at = datetime.utcnow()
+        db.session.commit()
+        return job.file_path
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+    def _run(self, job_id):
+        with self._app.app_context():
+            job = db.session.get(ReportJob, job_id)
+            if job is None:
+                return
+            job.status = ReportJobStatus.RUNNING
+            job.worker_id = self.worker_id
+            job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            spec = REPORT_TYPES[job.report_type]
+            path = os.path.join(self.cache_dir, f"{job.id}.{spec['ext']}")
+            tmp_path = path + ".tmp"
+            try:
+                with open(tmp_path, "wb") as fh:
+                    spec["write"](fh, json.loads(job.params))
+                os.replace(tmp_path, path)
+
+                job.file_path = path
+                job.file_size = os.path.getsize(path)
+                job.status = ReportJobStatus.DONE
+                outcome = "completed"
+            except Exception as e:
+                logger.exception("Report job %s failed", job_id)
+                db.session.rollback()
+                job.status = ReportJobStatus.FAILED
+                job.error = str(e)[:255]
+                outcome = "failed"
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            job.finished_at = datetime.utcnow()
+            try:
+                db.session.commit()
+            except Exception:
+                # vd. job đã bị process khác xoá -> không để lại file mồ côi
+                logger.exception("Report job %s could not be saved", job_id)
+                db.session.rollback()
+                if os.path.exists(path):
+                    os.remove(path)
+                outcome = "failed"
+            self._count(outcome)
+
+            try:
+                self.evict()
+            except Exception:
+                logger.exception("Report cache eviction failed")
+                db.session.rollback()
+
+    # ------------------------------------------------------------------
+    # Eviction
+    # ------------------------------------------------------------------
+    def _drop(self, job):
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        db.session.delete(job)
+        self._count("evicted")
+
+    def evict(self):
+        """
+        Xoá job / file quá hạn và job bỏ dở (mất heartbeat), rồi xoá file lâu
+        không được tải nhất cho tới khi dưới quota.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self.max_age)
+        stale = self._stale_before()
+        finished = [ReportJobStatus.DONE, ReportJobStatus.FAILED]
+        expired = ReportJob.query.filter(db.or_(
+            db.and_(ReportJob.status.in_(finished), ReportJob.finished_at < cutoff),
+            db.and_(ReportJob.status.notin_(finished), db.func.coalesce(ReportJob.heartbeat_at, ReportJob.created_at) < stale)
+        )).all()
+        for job in expired:
+            self._drop(job)
+
+        done = ReportJob.query.filter(
+            ReportJob.status == ReportJobStatus.DONE
+        ).order_by(ReportJob.last_accessed_at.desc()).all()
+        used = 0
+        for job in done:
+            used += job.file_size or 0
+            if used > self.max_bytes:
+                self._drop(job)
+        db.session.commit()
+
+    def stats(self):
+        total = db.session.query(db.func.coalesce(db.func.sum(ReportJob.file_size), 0)).filter(
+            ReportJob.status == ReportJobStatus.DONE
+        ).scalar()
+        with self._lock:
+            return dict(
+                self._stats,
+                workers=self.workers,
+                cache_bytes=int(total),
+                max_bytes=self.max_bytes,
+                max_age_s=self.max_age
+            )
+
+
+report_job_queue = ReportJobQueue()
@@ -1,9 +1,40 @@
 from datetime import datetime, timedelta
-from models.db_models import db, User, Attendance, AttendanceStatus, Shift, LeaveRequest, LeaveStatus
+from models.db_models import db, User, Attendance, AttendanceStatus, AttendanceRollup, Shift, LeaveRequest, LeaveStatus
 from sqlalchemy import func
-import pandas as pd
+from core.attendance_rollup import AttendanceRollupManager
+from core.attendance_export import AttendanceExporter, format_datetime, status_value
+from core.attendance_archive import attendance_archive, export_schema, rows_to_batch, iter_batches, partition_name, pq, PARQUET_COMPRESSION
+from core.salary_manager import SalaryManager
+from utils.pagination import keyset_before
+from openpyxl import Workbook
+from itertools import groupby
+import os
+import hashlib
+import tempfile
+import zipfile
 import io
 
+REPORT_DETAIL_COLUMNS = [
+    "STT", "Mã NV", "Họ Tên", "Ca Làm Việc", "Ngày",
+    "Check-in", "Check-out", "Tổng Giờ", "Trạng Thái", "Ghi Chú"
+]
+REPORT_USER_COLUMNS = ["Mã NV", "Họ Tên", "Tổng Lần Chấm Công", "Số Lần Muộn", "Tỷ Lệ Muộn (%)", "Tổng Giờ Làm"]
+PAYROLL_COLUMNS = [
+    ("user_id", "Mã NV"), ("user_name", "Họ Tên"), ("username", "Tài Khoản"),
+    ("base_salary", "Lương Cơ Bản"), ("total_workdays", "Số Công"), ("late_count", "Số Lần Muộn"),
+    ("total_penalty", "Tiền Phạt"), ("bonus", "Thưởng"), ("gross_salary", "Lương Gộp"), ("net_salary", "Thực Lãnh")
+]
+
+
+def _fingerprint(*results):
+    """Hash ngắn của các tập kết quả query (dùng làm phiên bản dữ liệu)."""
+    digest = hashlib.sha1()
+    for rows in results:
+        for row in rows:
+            digest.update(repr(tuple(row)).encode("utf-8"))
+        digest.update(b"|")
+    return digest.hexdigest()[:16]
+
 class ReportManager:
     """
     Quản lý báo cáo và thống kê hệ thống
@@ -39,15 +70,12 @@ class ReportManager:
         total_shifts = Shift.query.count()
         pending_leaves = LeaveRequest.query.filter_by(status=LeaveStatus.PENDING).count()
         
-        # Attendance hôm nay
-        logs_today = Attendance.query.filter(
-            Attendance.checkin_time >= today_start,
-            Attendance.checkin_time <= today_end
-        ).all()
+        # Attendance hôm nay (bảng tổng hợp theo ngày; có mặt = số user khác nhau)
+        today_counts = AttendanceRollupManager.get_daily_counts(today_start.date(), today_end.date()).get(today_start.date(), {})
         
-        present_today = len(set([l.user_id for l in logs_today]))
-        late_today = len([l for l in logs_today if l.status == AttendanceStatus.LATE])
-        on_leave_today = len([l for l in logs_today if l.status == AttendanceStatus.ON_LEAVE])
+        present_today = ReportManager.count_present_users(today_start.date())
+        late_today = today_counts.get(AttendanceStatus.LATE, 0)
+        on_leave_today = today_counts.get(AttendanceStatus.ON_LEAVE, 0)
         absent_today = total_employees - present_today
         
         # Tính tỷ lệ đi muộn hôm nay
@@ -72,16 +100,17 @@ class ReportManager:
         
         # Nếu có filter theo period
         if start_date and end_date:
-            period_logs = Attendance.query.filter(
-                Attendance.checkin_time >= start_date,
-                Attendance.checkin_time <= end_date
-            ).all()
+            # Cộng dồn theo ngày (tính trọn ngày của start_date / end_date)
+            period_counts = {}
+            for day_counts in AttendanceRollupManager.get_daily_counts(start_date.date(), end_date.date()).values():
+                for status, count in day_counts.items():
+                    period_counts[status] = period_counts.get(status, 0) + count
             
-            total_attendance = len(period_logs)
-            on_time_count = len([l for l in period_logs if l.status == AttendanceStatus.ON_TIME])
-            late_count = len([l for l in period_logs if l.status == AttendanceStatus.LATE])
-            overtime_count = len([l for l in period_logs if l.status == AttendanceStatus.OVERTIME])
-            on_leave_count = len([l for l in period_logs if l.status == AttendanceStatus.ON_LEAVE])
+            total_attendance = sum(period_counts.values())
+            on_time_count = period_counts.get(AttendanceStatus.ON_TIME, 0)
+            late_count = period_counts.get(AttendanceStatus.LATE, 0)
+            overtime_count = period_counts.get(AttendanceStatus.OVERTIME, 0)
+            on_leave_count = period_counts.get(AttendanceStatus.ON_LEAVE, 0)
             
             # Tỷ lệ đi muộn trong period
             late_rate_period = round((late_count / total_attendance * 100), 2) if total_attendance > 0 else 0.0
@@ -101,6 +130,134 @@ class ReportManager:
         
         return result
     
+    @staticmethod
+    def count_present_users(day):
+        """
+        Số nhân viên có mặt trong ngày `day` (date): COUNT(DISTINCT user_id) trên
+        các bản ghi của ngày đó (seek index theo checkin_time, chỉ đọc 1 ngày).
+        """
+        day_start = datetime.combine(day, datetime.min.time())
+        return db.session.query(func.count(func.distinct(Attendance.user_id))).filter(
+            Attendance.checkin_time >= day_start,
+            Attendance.checkin_time < day_start + timedelta(days=1)
+        ).scalar() or 0
+    
+    @staticmethod
+    def list_attendance_logs(limit, cursor=None):
+        """
+        1 trang log chấm công mới nhất trước, kèm tên NV trong cùng 1 query.
+        
+        Args:
+            limit: số dòng / trang
+            cursor: (checkin_time, id) của dòng cuối trang trước (None = trang đầu)
+        
+        Returns:
+            List row (id, checkin_time, checkout_time, status, name) - tối đa limit + 1 dòng
+        """
+        query = db.session.query(
+            Attendance.id,
+            Attendance.checkin_time,
+            Attendance.checkout_time,
+            Attendance.status,
+            User.name
+        ).outerjoin(User, User.id == Attendance.user_id).filter(Attendance.checkin_time.isnot(None))
+        
+        if cursor:
+            query = query.filter(*keyset_before(Attendance.checkin_time, Attendance.id, cursor))
+        return query.order_by(Attendance.checkin_time.desc(), Attendance.id.desc()).limit(limit + 1).all()
+    
+    @staticmethod
+    def write_attendance_report(fh, start_date=None, end_date=None, user_id=None):
+        """
+        Ghi báo cáo attendance (.xlsx) vào file object `fh`.
+        
+        Cả 3 sheet được dựng trong 1 lần duyệt dữ liệu: dòng chi tiết được ghi
+        thẳng ra sheet write-only, đồng thời cộng dồn số liệu tổng quan và theo
+        từng nhân viên (dict theo user_id), giờ làm chỉ tính 1 lần mỗi dòng.
+        
+        Args:
+            fh: file object (BytesIO / file tạm) để ghi workbook
+            start_date: datetime (optional)
+            end_date: datetime (optional)
+            user_id: int (optional) - Filter theo user
+        
+        Returns:
+            Tổng số bản ghi đã xuất
+        """
+        wb = Workbook(write_only=True)
+        ws_summary = wb.create_sheet('Tổng Quan')
+        ws_detail = wb.create_sheet('Chi Tiết Chấm Công')
+        ws_detail.append(REPORT_DETAIL_COLUMNS)
+        
+        status_counts = {status: 0 for status in AttendanceStatus}
+        total_work_hours = 0.0
+        user_stats = {}  # user_id -> [họ tên, tổng lần chấm công, số lần muộn, tổng giờ làm]
+        total_records = 0
+        
+        rows = AttendanceExporter.iter_rows(start_date, end_date, user_id, newest_first=True)
+        for total_records, row in enumerate(rows, start=1):
+            work_hours = ReportManager.calculate_work_hours(row.checkin_time, row.checkout_time)
+            user_name = row.user_name or f"User #{row.user_id}"
+            
+            ws_detail.append([
+                total_records,
+                row.user_id,
+                user_name,
+                row.shift_name or "Không xác định",
+                format_datetime(row.checkin_time, "%Y-%m-%d"),
+                format_datetime(row.checkin_time, "%H:%M:%S"),
+                format_datetime(row.checkout_time, "%H:%M:%S", "-"),
+                work_hours,
+                status_value(row.status),
+                ""
+            ])
+            
+            if row.status in status_counts:
+                status_counts[row.status] += 1
+            total_work_hours += work_hours
+            
+            stats = user_stats.get(row.user_id)
+            if stats is None:
+                stats = user_stats[row.user_id] = [user_name, 0, 0, 0.0]
+            stats[1] += 1
+            stats[2] += row.status == AttendanceStatus.LATE
+            stats[3] += work_hours
+        
+        # Sheet 1: Summary
+        late_count = status_counts[AttendanceStatus.LATE]
+        late_rate = round((late_count / total_records * 100), 2) if total_records > 0 else 0.0
+        
+        ws_summary.append(["Chỉ Số", "Giá Trị"])
+        for row in [
+            ["Tổng Số Bản Ghi", total_records],
+            ["Đúng Giờ", status_counts[AttendanceStatus.ON_TIME]],
+            ["Đi Muộn", late_count],
+            ["Tăng Ca", status_counts[AttendanceStatus.OVERTIME]],
+            ["Nghỉ Phép", status_counts[AttendanceStatus.ON_LEAVE]],
+            ["Tỷ Lệ Đi Muộn (%)", late_rate],
+            ["Tổng Giờ Làm Việc", round(total_work_hours, 2)],
+            ["Ngày Xuất Báo Cáo", datetime.now().strftime("%Y-%m-%d %H:%M:%S")]
+        ]:
+            ws_summary.append(row)
+        
+        # Sheet 3: By User Summary (if not filtered by user_id)
+        if not user_id and user_stats:
+            ws_users = wb.create_sheet('Thống Kê Theo NV')
+            ws_users.append(REPORT_USER_COLUMNS)
+            for uid in sorted(user_stats):
+                user_name, user_total, user_late, user_work_hours = user_stats[uid]
+                ws_users.append([
+                    uid,
+                    user_name,
+                    user_total,
+                    user_late,
+                    round((user_late / user_total * 100), 2) if user_total > 0 else 0.0,
+                    round(user_work_hours, 2)
+                ])
+        
+        wb.save(fh)
+        return total_records
+    
     @staticmethod
     def export_attendance_to_excel(start_date=None, end_date=None, user_id=None):
         """
@@ -114,14 +271,88 @@ class ReportManager:
         Returns:
             BytesIO object chứa Excel file
         """
-        from sqlalchemy.orm import joinedload
+        output = io.BytesIO()
+        ReportManager.write_attendance_report(output, start_date, end_date, user_id)
+        output.seek(0)
+        return output
+    
+    @staticmethod
+    def write_payroll_report(fh, month, year):
+        """
+        Ghi bảng lương dự tính tháng month/year (.xlsx) vào file object `fh`.
         
-        # Build query with eager loading
-        query = Attendance.query.options(
-            joinedload(Attendance.user),
-            joinedload(Attendance.shift)
-        )
+        Returns:
+            Số nhân viên trong bảng lương
+        """
+        salaries = SalaryManager.calculate_salary_bulk(month, year)
+        
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(f'Lương {month:02d}-{year}')
+        ws.append([title for _, title in PAYROLL_COLUMNS])
+        for salary in salaries:
+            ws.append([salary[key] for key, _ in PAYROLL_COLUMNS])
+        
+        wb.save(fh)
+        return len(salaries)
+    
+    @staticmethod
+    def write_attendance_parquet(fh, start_date=None, end_date=None, user_id=None):
+        """
+        Ghi attendance dạng Parquet (cho BI) vào file zip `fh`, mỗi tháng 1 partition
+        month=YYYY-MM/part-0.parquet; status / ca / tên NV dictionary-encoded.
+        Dữ liệu đọc theo lô và ghi dần từng record batch, mỗi lúc chỉ mở 1 file tháng.
+        
+        Returns:
+            Tổng số bản ghi đã xuất
+        """
+        schema = export_schema()
+        rows = AttendanceExporter.iter_rows(start_date, end_date, user_id, newest_first=True)
+        total = 0
         
+        with zipfile.ZipFile(fh, "w", zipfile.ZIP_STORED, allowZip64=True) as zf, \
+                tempfile.TemporaryDirectory() as tmp_dir:
+            current, writer, path = None, None, None
+            
+            def close_partition():
+                writer.close()
+                zf.write(path, f"{partition_name(*current)}/part-0.parquet")
+                os.remove(path)
+            
+            for chunk in iter_batches(rows):
+                # Dòng sắp theo checkin_time giảm dần -> các tháng nối tiếp nhau
+                for month, group in groupby(chunk, key=lambda r: (r.checkin_time.year, r.checkin_time.month)):
+                    if month != current:
+                        if writer is not None:
+                            close_partition()
+                        current = month
+                        path = os.path.join(tmp_dir, "part.parquet")
+                        writer = pq.ParquetWriter(path, schema, compression=PARQUET_COMPRESSION)
+                    group = list(group)
+                    writer.write_batch(rows_to_batch(group, schema))
+                    total += len(group)
+            if writer is not None:
+                close_partition()
+        return total
+    
+    @staticmethod
+    def attendance_data_version(start_date=None, end_date=None, user_id=None):
+        """
+        Phiên bản dữ liệu của báo cáo attendance: đổi khi có bản ghi mới / bị xoá,
+        đổi trạng thái, nhân viên, ca, giờ check-in hoặc check-out trong phạm vi lọc,
+        đổi tên NV / ca, hoặc các tháng trong phạm vi được archive.
+        Chỉ là vài dòng aggregate (group theo status) nên rẻ hơn nhiều so với dựng báo cáo.
+        """
+        # Tổng epoch giây dạng số nguyên (chính xác, không mất phần lẻ như tổng julianday kiểu float)
+        epoch_total = lambda column: func.sum(db.cast(func.strftime('%s', column), db.Integer))
+        query = db.session.query(
+            Attendance.status,
+            func.count(Attendance.id),
+            func.max(Attendance.id),
+            func.total(Attendance.user_id),
+            func.total(Attendance.shift_id),
+            epoch_total(Attendance.checkin_time),
+            epoch_total(Attendance.checkout_time)
+        )
         if start_date:
             query = query.filter(Attendance.checkin_time >= start_date)
         if end_date:
@@ -129,96 +360,23 @@ class ReportManager:
         if user_id:
             query = query.filter(Attendance.user_id == user_id)
         
-        logs = query.order_by(Attendance.checkin_time.desc()).all()
-        
-        # Prepare detail data
-        detail_data = []
-        for idx, log in enumerate(logs, start=1):
-            work_hours = ReportManager.calculate_work_hours(log.checkin_time, log.checkout_time)
-            
-            # Safe access to relationships
-            user_id = log.user_id
-            user_name = log.user.name if log.user else f"User #{user_id}"
-            shift_name = log.shift.name if log.shift else "Không xác định"
-            
-            detail_data.append({
-                "STT": idx,
-                "Mã NV": user_id,
-                "Họ Tên": user_name,
-                "Ca Làm Việc": shift_name,
-                "Ngày": log.checkin_time.strftime("%Y-%m-%d") if log.checkin_time else "",
-                "Check-in": log.checkin_time.strftime("%H:%M:%S") if log.checkin_time else "",
-                "Check-out": log.checkout_time.strftime("%H:%M:%S") if log.checkout_time else "-",
-                "Tổng Giờ": work_hours,
-                "Trạng Thái": log.status.value if hasattr(log.status, 'value') else str(log.status),
-                "Ghi Chú": ""
-            })
-        
-        # Prepare summary data
-        total_records = len(logs)
-        on_time_count = len([l for l in logs if l.status == AttendanceStatus.ON_TIME])
-        late_count = len([l for l in logs if l.status == AttendanceStatus.LATE])
-        overtime_count = len([l for l in logs if l.status == AttendanceStatus.OVERTIME])
-        on_leave_count = len([l for l in logs if l.status == AttendanceStatus.ON_LEAVE])
-        total_work_hours = sum([ReportManager.calculate_work_hours(l.checkin_time, l.checkout_time) for l in logs])
-        
-        late_rate = round((late_count / total_records * 100), 2) if total_records > 0 else 0.0
-        
-        summary_data = [
-            {"Chỉ Số": "Tổng Số Bản Ghi", "Giá Trị": total_records},
-            {"Chỉ Số": "Đúng Giờ", "Giá Trị": on_time_count},
-            {"Chỉ Số": "Đi Muộn", "Giá Trị": late_count},
-            {"Chỉ Số": "Tăng Ca", "Giá Trị": overtime_count},
-            {"Chỉ Số": "Nghỉ Phép", "Giá Trị": on_leave_count},
-            {"Chỉ Số": "Tỷ Lệ Đi Muộn (%)", "Giá Trị": late_rate},
-            {"Chỉ Số": "Tổng Giờ Làm Việc", "Giá Trị": round(total_work_hours, 2)},
-            {"Chỉ Số": "Ngày Xuất Báo Cáo", "Giá Trị": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-        ]
-        
-        # Create Excel
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Sheet 1: Summary
-            df_summary = pd.DataFrame(summary_data)
-            df_summary.to_excel(writer, index=False, sheet_name='Tổng Quan')
-            
-            # Sheet 2: Detail (handle empty data)
-            if detail_data:
-                df_detail = pd.DataFrame(detail_data)
-            else:
-                # Create empty DataFrame with column headers
-                df_detail = pd.DataFrame(columns=[
-                    "STT", "Mã NV", "Họ Tên", "Ca Làm Việc", "Ngày", 
-                    "Check-in", "Check-out", "Tổng Giờ", "Trạng Thái", "Ghi Chú"
-                ])
-            df_detail.to_excel(writer, index=False, sheet_name='Chi Tiết Chấm Công')
-            
-            # Sheet 3: By User Summary (if not filtered by user_id)
-            if not user_id and logs:
-                user_stats = []
-                unique_users = set([l.user_id for l in logs])
-                for uid in unique_users:
-                    user_logs = [l for l in logs if l.user_id == uid]
-                    # Get user from the log's relationship (already loaded)
-                    user_name = user_logs[0].user.name if user_logs and user_logs[0].user else f"User #{uid}"
-                    
-                    user_late = len([l for l in user_logs if l.status == AttendanceStatus.LATE])
-                    user_total = len(user_logs)
-                    user_work_hours = sum([ReportManager.calculate_work_hours(l.checkin_time, l.checkout_time) for l in user_logs])
-                    
-                    user_stats.append({
-                        "Mã NV": uid,
-                        "Họ Tên": user_name,
-                        "Tổng Lần Chấm Công": user_total,
-                        "Số Lần Muộn": user_late,
-                        "Tỷ Lệ Muộn (%)": round((user_late / user_total * 100), 2) if user_total > 0 else 0.0,
-                        "Tổng Giờ Làm": round(user_work_hours, 2)
-                    })
-                
-                if user_stats:
-                    df_user_stats = pd.DataFrame(user_stats)
-                    df_user_stats.to_excel(writer, index=False, sheet_name='Thống Kê Theo NV')
-                df_user_stats.to_excel(writer, index=False, sheet_name='Thống Kê Theo NV')
-        
-        output.seek(0)
-        return output
+        return _fingerprint(
+            query.group_by(Attendance.status).order_by(Attendance.status).all(),
+            db.session.query(User.id, User.name).order_by(User.id).all(),
+            db.session.query(Shift.id, Shift.name).order_by(Shift.id).all(),
+            attendance_archive.version(start_date, end_date)
+        )
+    
+    @staticmethod
+    def payroll_data_version(month, year):
+        """Phiên bản dữ liệu của bảng lương: thông tin NV + attendance_rollup của tháng / năm."""
+        return _fingerprint(
+            db.session.query(User.id, User.name, User.username, User.base_salary).order_by(User.id).all(),
+            db.session.query(
+                AttendanceRollup.user_id, AttendanceRollup.month, AttendanceRollup.on_time_count,
+                AttendanceRollup.on_leave_count, AttendanceRollup.late_count
+            ).filter(
+                AttendanceRollup.year == year,
+                AttendanceRollup.month.in_([month, 0])
+            ).order_by(AttendanceRollup.user_id, AttendanceRollup.month).all()
+        )
@@ -1,5 +1,8 @@
+import math
 from datetime import datetime
-from models.db_models import db, User, Attendance, AttendanceStatus, Payroll
+from sqlalchemy import insert
+from models.db_models import db, User, Payroll
+from core.attendance_rollup import AttendanceRollupManager
 
 class SalaryManager:
     """
@@ -11,73 +14,54 @@ class SalaryManager:
     WORKDAYS_PER_MONTH = 26  # Công chuẩn/tháng
     BONUS_THRESHOLD_DAYS = 300  # Ngưỡng thưởng: > 300 ngày/năm
     BONUS_AMOUNT = 5000000  # 5 triệu
+
+    # Confirm hàng loạt
+    PAYROLL_BATCH_MODE = "partial"  # "partial" | "atomic" (1 dòng lỗi -> không lưu gì)
+    PAYROLL_BATCH_CHUNK = 500       # số dòng / lệnh INSERT
+    _PAYROLL_NUMBER_FIELDS = {      # cột số có thể override từ FE -> kiểu
+        "base_salary": float,
+        "total_workdays": int,
+        "late_count": int,
+        "penalty_per_late": float,
+        "bonus": float,
+    }
     
     @staticmethod
-    def calculate_salary_for_user(user_id, month, year):
+    def attendance_summary(month, year, user_ids=None):
         """
-        Tính lương cho 1 nhân viên trong tháng (chưa lưu vào DB)
-        
-        Args:
-            user_id: ID nhân viên
-            month: Tháng (1-12)
-            year: Năm (VD: 2026)
-        
+        Công tháng, số lần muộn và số công cả năm cho nhiều user,
+        đọc từ bảng attendance_rollup (tối đa 2 dòng / user) thay vì quét Attendance.
+
         Returns:
-            dict với các thông tin lương, hoặc None nếu user không tồn tại
+            dict user_id -> (total_workdays, late_count, year_workdays)
         """
-        user = User.query.get(user_id)
-        if not user:
-            return None
-        
-        # Xác định khoảng thời gian của tháng
-        start_date = datetime(year, month, 1)
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1)
-        else:
-            end_date = datetime(year, month + 1, 1)
-        
-        # Query attendance trong tháng
-        attendances = Attendance.query.filter(
-            Attendance.user_id == user_id,
-            Attendance.checkin_time >= start_date,
-            Attendance.checkin_time < end_date
-        ).all()
-        
-        # Đếm số công (ON_TIME + ON_LEAVE)
-        total_workdays = len([
-            a for a in attendances 
-            if a.status in [AttendanceStatus.ON_TIME, AttendanceStatus.ON_LEAVE]
-        ])
-        
-        # Đếm số lần đi muộn
-        late_count = len([
-            a for a in attendances 
-            if a.status == AttendanceStatus.LATE
-        ])
-        
-        # Tính số ngày làm việc trong năm để check bonus
-        year_start = datetime(year, 1, 1)
-        year_end = datetime(year, 12, 31, 23, 59, 59)
-        year_attendances = Attendance.query.filter(
-            Attendance.user_id == user_id,
-            Attendance.checkin_time >= year_start,
-            Attendance.checkin_time <= year_end,
-            Attendance.status.in_([AttendanceStatus.ON_TIME, AttendanceStatus.ON_LEAVE])
-        ).count()
-        
+        summary = {}
+        for user_id, rows in AttendanceRollupManager.get_counts(year, month, user_ids).items():
+            month_row, year_row = rows["month"], rows["year"]
+            summary[user_id] = (
+                month_row.workdays if month_row else 0,
+                month_row.late_count if month_row else 0,
+                year_row.workdays if year_row else 0
+            )
+        return summary
+
+    @staticmethod
+    def _build_salary(user_id, name, username, base_salary, month, year, counts):
+        total_workdays, late_count, year_attendances = counts
+
         # Tính bonus tự động
         auto_bonus = SalaryManager.BONUS_AMOUNT if year_attendances > SalaryManager.BONUS_THRESHOLD_DAYS else 0.0
         
         # Tính lương
-        base_salary = user.base_salary or 0.0
+        base_salary = base_salary or 0.0
         gross_salary = (base_salary / SalaryManager.WORKDAYS_PER_MONTH) * total_workdays
         total_penalty = late_count * SalaryManager.DEFAULT_PENALTY_PER_LATE
         net_salary = gross_salary - total_penalty + auto_bonus
         
         return {
-            "user_id": user.id,
-            "user_name": user.name,
-            "username": user.username,
+            "user_id": user_id,
+            "user_name": name,
+            "username": username,
             "month": month,
             "year": year,
             
@@ -94,6 +78,46 @@ class SalaryManager:
             "total_penalty": total_penalty,
             "net_salary": round(net_salary, 2)
         }
+
+    @staticmethod
+    def calculate_salary_bulk(month, year, user_ids=None):
+        """
+        Tính lương cho nhiều nhân viên với 2 query (User + attendance_rollup).
+
+        Args:
+            user_ids: danh sách ID (None = tất cả nhân viên)
+
+        Returns:
+            List[dict] - cùng định dạng với calculate_salary_for_user, theo thứ tự user id
+        """
+        query = db.session.query(User.id, User.name, User.username, User.base_salary)
+        if user_ids is not None:
+            query = query.filter(User.id.in_(user_ids))
+        users = query.order_by(User.id).all()
+        if not users:
+            return []
+
+        counts = SalaryManager.attendance_summary(month, year, user_ids)
+        return [
+            SalaryManager._build_salary(uid, name, username, base_salary, month, year, counts.get(uid, (0, 0, 0)))
+            for uid, name, username, base_salary in users
+        ]
+
+    @staticmethod
+    def calculate_salary_for_user(user_id, month, year):
+        """
+        Tính lương cho 1 nhân viên trong tháng (chưa lưu vào DB)
+        
+        Args:
+            user_id: ID nhân viên
+            month: Tháng (1-12)
+            year: Năm (VD: 2026)
+        
+        Returns:
+            dict với các thông tin lương, hoặc None nếu user không tồn tại
+        """
+        results = SalaryManager.calculate_salary_bulk(month, year, user_ids=[user_id])
+        return results[0] if results else None
     
     @staticmethod
     def calculate_salary_for_all(month, year):
@@ -103,16 +127,65 @@ class SalaryManager:
         Returns:
             List[dict] - Danh sách lương của tất cả nhân viên
         """
-        users = User.query.all()
-        results = []
-        
-        for user in users:
-            salary_data = SalaryManager.calculate_salary_for_user(user.id, month, year)
-            if salary_data:
-                results.append(salary_data)
-        
-        return results
+        return SalaryManager.calculate_salary_bulk(month, year)
     
+    @staticmethod
+    def _as_int(value):
+        """int hoặc chuỗi số nguyên -> int, kiểu khác (list, dict, bool, "abc"...) -> None"""
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, int):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str):
+            try:
+                return int(value.strip())
+            except ValueError:
+                return None
+        return None
+
+    @staticmethod
+    def _as_float(value):
+        """số hoặc chuỗi số -> float, kiểu khác / NaN / inf -> None"""
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            return None
+        try:
+            number = float(value.strip() if isinstance(value, str) else value)
+        except ValueError:
+            return None
+        return number if math.isfinite(number) else None
+
+    @staticmethod
+    def _payroll_values(payroll_data, confirmed_by_user_id):
+        """Các cột của bản ghi Payroll, tính lại kết quả từ input (có thể đã override từ FE)"""
+        base_salary = payroll_data.get('base_salary', 0.0)
+        total_workdays = payroll_data.get('total_workdays', 0)
+        late_count = payroll_data.get('late_count', 0)
+        penalty_per_late = payroll_data.get('penalty_per_late', SalaryManager.DEFAULT_PENALTY_PER_LATE)
+        bonus = payroll_data.get('bonus', 0.0)
+        
+        # Tính lại kết quả (để đảm bảo consistency)
+        gross_salary = (base_salary / SalaryManager.WORKDAYS_PER_MONTH) * total_workdays
+        total_penalty = late_count * penalty_per_late
+        net_salary = gross_salary - total_penalty + bonus
+
+        return dict(
+            user_id=payroll_data.get('user_id'),
+            month=payroll_data.get('month'),
+            year=payroll_data.get('year'),
+            base_salary=base_salary,
+            total_workdays=total_workdays,
+            late_count=late_count,
+            penalty_per_late=penalty_per_late,
+            bonus=bonus,
+            gross_salary=round(gross_salary, 2),
+            total_penalty=total_penalty,
+            net_salary=round(net_salary, 2),
+            confirmed_by=confirmed_by_user_id,
+            notes=payroll_data.get('notes', '')
+        )
+
     @staticmethod
     def confirm_payroll(payroll_data, confirmed_by_user_id):
         """
@@ -147,34 +220,8 @@ class SalaryManager:
         if existing:
             return False, f"Lương tháng {month}/{year} của nhân viên này đã được confirm", None
         
-        # Lấy các giá trị từ payroll_data (đã có thể được override từ FE)
-        base_salary = payroll_data.get('base_salary', 0.0)
-        total_workdays = payroll_data.get('total_workdays', 0)
-        late_count = payroll_data.get('late_count', 0)
-        penalty_per_late = payroll_data.get('penalty_per_late', SalaryManager.DEFAULT_PENALTY_PER_LATE)
-        bonus = payroll_data.get('bonus', 0.0)
-        
-        # Tính lại kết quả (để đảm bảo consistency)
-        gross_salary = (base_salary / SalaryManager.WORKDAYS_PER_MONTH) * total_workdays
-        total_penalty = late_count * penalty_per_late
-        net_salary = gross_salary - total_penalty + bonus
-        
         # Tạo Payroll record
-        new_payroll = Payroll(
-            user_id=user_id,
-            month=month,
-            year=year,
-            base_salary=base_salary,
-            total_workdays=total_workdays,
-            late_count=late_count,
-            penalty_per_late=penalty_per_late,
-            bonus=bonus,
-            gross_salary=round(gross_salary, 2),
-            total_penalty=total_penalty,
-            net_salary=round(net_salary, 2),
-            confirmed_by=confirmed_by_user_id,
-            notes=payroll_data.get('notes', '')
-        )
+        new_payroll = Payroll(**SalaryManager._payroll_values(payroll_data, confirmed_by_user_id))
         
         try:
             db.session.add(new_payroll)
@@ -183,6 +230,127 @@ class SalaryManager:
         except Exception as e:
             db.session.rollback()
             return False, f"Lỗi lưu database: {str(e)}", None
+
+    @staticmethod
+    def confirm_payroll_batch(payroll_list, confirmed_by_user_id, mode=None):
+        """
+        Confirm cả bảng lương trong 1 transaction.
+
+        Kiểm tra nhân viên / bản ghi đã confirm bằng 2 query tập hợp (thay vì 2 query / dòng),
+        insert theo từng chunk PAYROLL_BATCH_CHUNK dòng rồi commit 1 lần.
+
+        Args:
+            payroll_list: List[dict] cùng định dạng với confirm_payroll
+            confirmed_by_user_id: ID của admin confirm
+            mode: "partial" - lưu các dòng hợp lệ, báo lỗi từng dòng còn lại
+                  "atomic"  - có 1 dòng lỗi thì không lưu dòng nào
+                  (None = SalaryManager.PAYROLL_BATCH_MODE)
+
+        Returns:
+            (saved_count: int, results: List[dict]) - results theo đúng thứ tự input:
+            {"index", "user_id", "month", "year", "success", "message", "payroll_id"}
+        """
+        mode = mode or SalaryManager.PAYROLL_BATCH_MODE
+        if mode not in ("partial", "atomic"):
+            raise ValueError(f"Unknown payroll batch mode: {mode}")
+
+        results = [{
+            "index": i,
+            "user_id": item.get('user_id'),
+            "month": item.get('month'),
+            "year": item.get('year'),
+            "success": False,
+            "message": None,
+            "payroll_id": None
+        } for i, item in enumerate(payroll_list)]
+
+        # Ép kiểu id trước khi dùng làm key (list/dict không hash được, "12" phải khớp 12)
+        invalid = {}
+        for result in results:
+            for field in ("user_id", "month", "year"):
+                value = result[field]
+                if value in (None, ""):
+                    continue
+                number = SalaryManager._as_int(value)
+                if number is None:
+                    invalid.setdefault(result["index"], field)
+                else:
+                    result[field] = number
+
+        # Các cột số của dòng lương (override từ FE) -> ép kiểu trước khi tính toán
+        numbers = [{} for _ in payroll_list]
+        for result, item, parsed in zip(results, payroll_list, numbers):
+            for field, kind in SalaryManager._PAYROLL_NUMBER_FIELDS.items():
+                value = item.get(field)
+                if value is None or value == "":
+                    continue
+                number = SalaryManager._as_int(value) if kind is int else SalaryManager._as_float(value)
+                if number is None:
+                    invalid.setdefault(result["index"], field)
+                else:
+                    parsed[field] = number
+
+        keys = [(None, None, None) if r["index"] in invalid else (r["user_id"], r["month"], r["year"]) for r in results]
+        user_ids = {k[0] for k in keys if k[0]}
+        existing_users = {uid for (uid,) in db.session.query(User.id).filter(User.id.in_(user_ids))} if user_ids else set()
+
+        periods = {(m, y) for _, m, y in keys if m and y}
+        confirmed = set()
+        for month, year in periods:
+            confirmed.update(
+                (uid, month, year) for (uid,) in db.session.query(Payroll.user_id).filter(
+                    Payroll.month == month, Payroll.year == year, Payroll.user_id.in_(user_ids))
+            )
+
+        # Validate từng dòng
+        seen = set()
+        to_insert = []
+        for result, key, item, parsed in zip(results, keys, payroll_list, numbers):
+            user_id, month, year = key
+            if result["index"] in invalid:
+                result["message"] = f"{invalid[result['index']]} không hợp lệ"
+            elif not user_id or not month or not year:
+                result["message"] = "Thiếu thông tin bắt buộc (user_id, month, year)"
+            elif user_id not in existing_users:
+                result["message"] = "Nhân viên không tồn tại"
+            elif key in confirmed:
+                result["message"] = f"Lương tháng {month}/{year} của nhân viên này đã được confirm"
+            elif key in seen:
+                result["message"] = f"Trùng lương tháng {month}/{year} của nhân viên này trong danh sách"
+            else:
+                seen.add(key)
+                values = {k: v for k, v in item.items() if k not in SalaryManager._PAYROLL_NUMBER_FIELDS}
+                values.update(parsed, user_id=user_id, month=month, year=year)
+                to_insert.append((result, SalaryManager._payroll_values(values, confirmed_by_user_id)))
+
+        if mode == "atomic" and len(to_insert) < len(results):
+            for result, _ in to_insert:
+                result["message"] = "Không lưu do có dòng lỗi trong danh sách (atomic)"
+            return 0, results
+
+        try:
+            chunk = SalaryManager.PAYROLL_BATCH_CHUNK
+            for start in range(0, len(to_insert), chunk):
+                db.session.execute(insert(Payroll), [values for _, values in to_insert[start:start + chunk]])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for result, _ in to_insert:
+                result["message"] = f"Lỗi lưu database: {str(e)}"
+            return 0, results
+
+        # Lấy id vừa tạo (unique theo user_id, month, year)
+        ids = {}
+        for month, year in {(v["month"], v["year"]) for _, v in to_insert}:
+            for payroll_id, uid in db.session.query(Payroll.id, Payroll.user_id).filter(
+                    Payroll.month == month, Payroll.year == year, Payroll.user_id.in_(user_ids)):
+                ids[(uid, month, year)] = payroll_id
+
+        for result, values in to_insert:
+            result["success"] = True
+            result["message"] = "Đã confirm và lưu lương thành công"
+            result["payroll_id"] = ids.get((values["user_id"], values["month"], values["year"]))
+        return len(to_insert), results
     
     @staticmethod
     def get_payroll_history(user_id=None, month=None, year=None):
@@ -3,7 +3,8 @@ import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 from flask import request, jsonify, current_app
-from models.db_models import User
+from models.db_models import db, User
+from core.principal_cache import principal_cache
 
 # Cấu hình Secret Key (Nên để trong .env, nhưng demo để đây tạm)
 SECRET_KEY = "SGU_CAPSTONE_SECRET_KEY_2024" 
@@ -23,6 +24,41 @@ def generate_token(user_id, role):
     }
     return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
 
+class CurrentUser:
+    """
+    User đang đăng nhập, truyền vào handler của token_required.
+    id / role / is_active lấy từ principal cache; các thuộc tính khác
+    (name, password_hash, to_dict()...) load User từ DB khi được dùng lần đầu.
+    """
+
+    def __init__(self, id, role, is_active):
+        self.__dict__.update(id=id, role=role, is_active=is_active, _user=None)
+
+    @property
+    def user(self):
+        if self._user is None:
+            self.__dict__["_user"] = db.session.get(User, self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+        if name in ("role", "is_active"):
+            self.__dict__[name] = value
+
+def load_principal(user_id, token):
+    """(id, role, is_active) của user, hoặc None nếu user không tồn tại."""
+    principal = principal_cache.get(user_id, token)
+    if principal is None:
+        user = db.session.get(User, user_id)
+        if not user:
+            return None
+        principal = (user.id, user.role, user.is_active)
+        principal_cache.put(user_id, token, principal)
+    return principal
+
 def token_required(roles=None):
     """
     Decorator để bảo vệ API.
@@ -45,11 +81,16 @@ def token_required(roles=None):
             try:
                 # 2. Giải mã Token
                 data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-                current_user = User.query.get(int(data["sub"]))
+                principal = load_principal(int(data["sub"]), token)
                 user_role = data["role"]
                 
-                if not current_user:
+                if not principal:
                     return jsonify({"message": "User not found!"}), 401
+
+                # Tài khoản bị khóa -> chặn ngay cả khi token còn hạn
+                if not principal[2]:
+                    return jsonify({"message": "Tài khoản của bạn đang bị khóa. Vui lòng liên hệ Admin."}), 403
+                current_user = CurrentUser(*principal)
                 
                 # 3. Check quyền (Authorization)
                 # roles is passed to the outer decorator.
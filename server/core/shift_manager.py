@@ -1,70 +1,145 @@
-from datetime import datetime, timedelta
-from models.db_models import Shift, AttendanceStatus
+import threading
+from bisect import bisect_right
+from models.db_models import db, Shift, AttendanceStatus
+
+# config
+CHECKIN_BUFFER_MINUTES = 30     # được check-in sớm tối đa 30p trước giờ vào ca
+
+SECONDS_PER_DAY = 24 * 3600
+
+
+def parse_time_seconds(value):
+    """"HH:MM:SS" -> số giây tính từ 0h. Raise ValueError nếu sai định dạng."""
+    parts = value.split(":")
+    if len(parts) != 3:
+        raise ValueError(f"Invalid time: {value!r}")
+    h, m, s = (int(p) for p in parts)
+    if not (0 <= h < 24 and 0 <= m < 60 and 0 <= s < 60):
+        raise ValueError(f"Invalid time: {value!r}")
+    return h * 3600 + m * 60 + s
+
+
+def seconds_of_day(dt):
+    return dt.hour * 3600 + dt.minute * 60 + dt.second
+
+
+class ShiftSchedule:
+    """
+    Lịch ca đã biên dịch sẵn (giây tính từ 0h), dựng 1 lần từ bảng Shift.
+
+    Mỗi ca chiếm cửa sổ [start - buffer, end] trên vòng 24h; ca qua đêm
+    (end < start) và cửa sổ vượt 0h được tách làm 2 đoạn. Trục 24h được chia
+    thành các khoảng cơ sở, mỗi khoảng lưu sẵn danh sách ca phủ nó (sắp theo
+    shift id), nên 1 lần tra cứu chỉ là 1 binary search.
+    """
+
+    def __init__(self, shifts, buffer_minutes=CHECKIN_BUFFER_MINUTES):
+        self.buffer = buffer_minutes * 60
+        self.start_seconds = {}     # shift id -> giờ vào ca (giây)
+
+        segments = []               # (from, to) đóng 2 đầu, shift id
+        for shift in shifts:
+            try:
+                start = parse_time_seconds(shift.start_time)
+                end = parse_time_seconds(shift.end_time)
+            except (ValueError, AttributeError):
+                # Bỏ qua ca có định dạng giờ sai trong DB
+                continue
+            if end < start:
+                end += SECONDS_PER_DAY  # ca qua đêm
+            self.start_seconds[shift.id] = start
+            for lo, hi in self._wrap(start - self.buffer, end):
+                segments.append((lo, hi, shift.id))
+
+        bounds = {0}
+        for lo, hi, _ in segments:
+            bounds.add(lo)
+            if hi + 1 < SECONDS_PER_DAY:
+                bounds.add(hi + 1)
+        self._bounds = sorted(bounds)
+        self._slots = [
+            tuple(sorted({sid for lo, hi, sid in segments if lo <= b <= hi}))
+            for b in self._bounds
+        ]
+
+    @staticmethod
+    def _wrap(lo, hi):
+        """Chiếu đoạn [lo, hi] (có thể âm / vượt 24h) lên vòng 24h."""
+        span = hi - lo
+        if span >= SECONDS_PER_DAY - 1:
+            return [(0, SECONDS_PER_DAY - 1)]
+        lo %= SECONDS_PER_DAY
+        hi = lo + span
+        if hi < SECONDS_PER_DAY:
+            return [(lo, hi)]
+        return [(lo, SECONDS_PER_DAY - 1), (0, hi - SECONDS_PER_DAY)]
+
+    def candidates(self, seconds):
+        """Các shift id có cửa sổ chứa thời điểm `seconds` (sắp theo id)."""
+        idx = bisect_right(self._bounds, int(seconds) % SECONDS_PER_DAY) - 1
+        return self._slots[idx]
+
+    def __len__(self):
+        return len(self.start_seconds)
+
+
+_schedule = None
+_schedule_lock = threading.Lock()
+
 
 class ShiftManager:
+    @staticmethod
+    def get_schedule():
+        """Lịch ca đã biên dịch (dựng lại sau khi invalidate_schedule)."""
+        global _schedule
+        schedule = _schedule
+        if schedule is None:
+            with _schedule_lock:
+                if _schedule is None:
+                    _schedule = ShiftSchedule(Shift.query.order_by(Shift.id).all())
+                schedule = _schedule
+        return schedule
+
+    @staticmethod
+    def invalidate_schedule():
+        """Gọi sau khi tạo / sửa ca làm việc."""
+        global _schedule
+        with _schedule_lock:
+            _schedule = None
+
+    @staticmethod
+    def get_matching_shifts(current_time_obj):
+        """Tất cả ca có [Start - 30p, End] chứa giờ hiện tại, sắp theo shift id."""
+        shift_ids = ShiftManager.get_schedule().candidates(seconds_of_day(current_time_obj))
+        shifts = [db.session.get(Shift, sid) for sid in shift_ids]
+        return [s for s in shifts if s is not None]
+
     @staticmethod
     def get_matching_shift(current_time_obj):
         """
         Tìm ca làm việc phù hợp với giờ hiện tại.
         Logic: Giờ hiện tại nằm trong khoảng [Start - 30p, End]
         """
-        # current_time_str = current_time_obj.strftime("%H:%M:%S")
-        all_shifts = Shift.query.all()
-        
-        # Get just the time component for comparison
-        now = current_time_obj.time()
-        
-        for shift in all_shifts:
-            # Chuyển string DB thành object time để so sánh
-            # DB format expected: "HH:MM:SS"
-            try:
-                shift_start = datetime.strptime(shift.start_time, "%H:%M:%S").time()
-                shift_end = datetime.strptime(shift.end_time, "%H:%M:%S").time()
-                
-                # Check buffer period (30 mins before)
-                # Need to do date math, so use a dummy date
-                dummy_date = datetime(2000, 1, 1) # Arbitrary date
-                start_dt = dummy_date.replace(hour=shift_start.hour, minute=shift_start.minute, second=shift_start.second)
-                end_dt = dummy_date.replace(hour=shift_end.hour, minute=shift_end.minute, second=shift_end.second)
-                
-                start_buffer_dt = start_dt - timedelta(minutes=30)
-                
-                # Convert current time to dummy date for comparison
-                now_dt = dummy_date.replace(hour=now.hour, minute=now.minute, second=now.second)
-
-                # Logic: Is now within [Start - 30, End]?
-                if start_buffer_dt <= now_dt <= end_dt:
-                    return shift
-            except ValueError:
-                # Handle cases where time format in DB might be wrong
-                continue
-                 
-        return None # Không thuộc ca nào -> OT
+        shifts = ShiftManager.get_matching_shifts(current_time_obj)
+        return shifts[0] if shifts else None  # Không thuộc ca nào -> OT
 
     @staticmethod
     def calculate_status(checkin_time, shift):
         """Xác định Đúng giờ hay Đi muộn"""
         if not shift:
             return AttendanceStatus.OVERTIME
-            
+
         try:
-            shift_start = datetime.strptime(shift.start_time, "%H:%M:%S")
-            # Ghép ngày hiện tại vào giờ của Shift để so sánh
-            shift_start_dt = checkin_time.replace(hour=shift_start.hour, minute=shift_start.minute, second=start.second if hasattr(shift_start, 'second') else 0)
-            
-            # Use strict HH:MM:SS parsing from above, so shift_start has all components.
-            # But just to be safe with replace logic:
-            shift_start_dt = checkin_time.replace(
-                hour=shift_start.hour, 
-                minute=shift_start.minute, 
-                second=shift_start.second, 
-                microsecond=0
-            )
-            
+            start = parse_time_seconds(shift.start_time)
+
+            # Số giây tính từ giờ vào ca, trong khoảng [-buffer, 24h - buffer):
+            # check-in sau 0h của ca qua đêm vẫn so với giờ vào ca hôm trước
+            buffer = CHECKIN_BUFFER_MINUTES * 60
+            now = seconds_of_day(checkin_time) + checkin_time.microsecond / 1e6
+            offset = (now - start + buffer) % SECONDS_PER_DAY - buffer
+
             # Thêm thời gian ân hạn (Grace Period)
-            allowed_late_time = shift_start_dt + timedelta(minutes=shift.grace_period_minutes)
-            
-            if checkin_time > allowed_late_time:
+            if offset > shift.grace_period_minutes * 60:
                 return AttendanceStatus.LATE
             else:
                 return AttendanceStatus.ON_TIME
@@ -0,0 +1,35 @@
+"""
+Migration: thêm composite index cho bảng attendance (xem Attendance.__table_args__).
+
+Chạy từ thư mục server:
+    python -m migrations.add_attendance_indexes
+
+db.create_all() không thêm index vào bảng đã tồn tại nên DB cũ cần chạy script này.
+Index đã có được bỏ qua (checkfirst) nên có thể chạy lại nhiều lần.
+"""
+from sqlalchemy import inspect, text
+
+
+def add_attendance_indexes(engine):
+    from models.db_models import Attendance
+
+    existing = {ix["name"] for ix in inspect(engine).get_indexes(Attendance.__tablename__)}
+    created = []
+    for index in sorted(Attendance.__table__.indexes, key=lambda ix: ix.name):
+        if index.name in existing:
+            continue
+        index.create(bind=engine, checkfirst=True)
+        created.append(index.name)
+
+    # Cập nhật thống kê cho query planner của SQLite
+    with engine.begin() as conn:
+        conn.execute(text(f"ANALYZE {Attendance.__tablename__}"))
+    return created
+
+
+if __name__ == "__main__":
+    from app import app, db
+
+    with app.app_context():
+        created = add_attendance_indexes(db.engine)
+        print(f">>> Đã tạo {len(created)} index: {', '.join(created) or '(không có)'}")
@@ -0,0 +1,34 @@
+"""
+Migration: thêm cột user.base_salary và bảng payroll cho SalaryManager.
+
+Chạy từ thư mục server:
+    python -m migrations.add_payroll_schema
+
+db.create_all() tạo bảng mới nhưng không thêm cột vào bảng user đã có.
+Có thể chạy lại nhiều lần.
+"""
+from sqlalchemy import inspect, text
+
+
+def add_payroll_schema(engine):
+    from models.db_models import Payroll
+
+    added = []
+    columns = {c["name"] for c in inspect(engine).get_columns("user")}
+    if "base_salary" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE "user" ADD COLUMN base_salary FLOAT DEFAULT 0.0'))
+        added.append("user.base_salary")
+
+    if not inspect(engine).has_table(Payroll.__tablename__):
+        Payroll.__table__.create(bind=engine)
+        added.append(Payroll.__tablename__)
+    return added
+
+
+if __name__ == "__main__":
+    from app import app, db
+
+    with app.app_context():
+        added = add_payroll_schema(db.engine)
+        print(f">>> Đã thêm: {', '.join(added) or '(không có)'}")
@@ -0,0 +1,38 @@
+"""
+Migration: thêm cột report_job.worker_id / heartbeat_at (ReportJobQueue chỉ dọn
+job chưa xong khi process chủ đã mất heartbeat).
+
+Chạy từ thư mục server:
+    python -m migrations.add_report_job_heartbeat
+
+db.create_all() không thêm cột vào bảng report_job đã có. Có thể chạy lại nhiều lần.
+"""
+from sqlalchemy import inspect, text
+
+
+def add_report_job_heartbeat(engine):
+    from models.db_models import ReportJob
+
+    table = ReportJob.__tablename__
+    if not inspect(engine).has_table(table):
+        ReportJob.__table__.create(bind=engine)
+        return [table]
+
+    added = []
+    columns = {c["name"] for c in inspect(engine).get_columns(table)}
+    with engine.begin() as conn:
+        if "worker_id" not in columns:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN worker_id VARCHAR(64)"))
+            added.append(f"{table}.worker_id")
+        if "heartbeat_at" not in columns:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN heartbeat_at DATETIME"))
+            added.append(f"{table}.heartbeat_at")
+    return added
+
+
+if __name__ == "__main__":
+    from app import app, db
+
+    with app.app_context():
+        added = add_report_job_heartbeat(db.engine)
+        print(f">>> Đã thêm: {', '.join(added) or '(không có)'}")
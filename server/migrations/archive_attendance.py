@@ -0,0 +1,39 @@
+"""
+Migration / bảo trì: chuyển Attendance các tháng cũ từ SQLite sang Parquet
+(instance/attendance_archive/month=YYYY-MM/part-0.parquet), giữ bảng attendance nhỏ.
+
+Chạy từ thư mục server (mặc định giữ lại ATTENDANCE_ARCHIVE_KEEP_MONTHS tháng gần nhất):
+    python -m migrations.archive_attendance [số_tháng_giữ_lại]
+
+Số liệu tổng hợp (lương, Dashboard) không đổi; export / báo cáo vẫn đọc được
+các tháng đã archive. Cần pyarrow. Có thể chạy lại nhiều lần; mỗi lần chạy
+cũng xoá khỏi archive bản ghi của nhân viên đã bị xoá (nếu lần xoá trước lỗi giữa chừng).
+"""
+import sys
+from datetime import datetime
+
+
+def archive_attendance(keep_months, now=None):
+    from core.attendance_archive import attendance_archive
+
+    now = now or datetime.now()
+    # Tháng đầu tiên được giữ lại trong SQLite
+    index = now.year * 12 + (now.month - 1) - (keep_months - 1)
+    return attendance_archive.archive_before(index // 12, index % 12 + 1)
+
+
+if __name__ == "__main__":
+    from app import app, db
+    from core.attendance_archive import attendance_archive, ARCHIVE_KEEP_MONTHS
+
+    keep = int(sys.argv[1]) if len(sys.argv) > 1 else ARCHIVE_KEEP_MONTHS
+    with app.app_context():
+        db.create_all()
+        result = archive_attendance(keep)
+        for period, count in result.items():
+            print(f">>> {period}: {count} bản ghi")
+        print(f">>> Đã archive {sum(result.values())} bản ghi ({len(result)} tháng), giữ {keep} tháng gần nhất")
+
+        purged = attendance_archive.purge_deleted_users()
+        for user_id, count in purged.items():
+            print(f">>> Xoá {count} bản ghi archive của nhân viên đã xoá #{user_id}")
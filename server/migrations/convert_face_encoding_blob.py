@@ -0,0 +1,43 @@
+"""
+Migration: chuyển User.face_encoding từ PickleType (list float Python)
+sang BLOB float32 có header (models/embedding_type.py).
+
+Chạy từ thư mục server:
+    python -m migrations.convert_face_encoding_blob [--float16]
+
+Cột vẫn là BLOB trong SQLite nên chỉ cần ghi đè dữ liệu, không đổi schema.
+Các dòng đã ở định dạng mới được bỏ qua nên có thể chạy lại nhiều lần.
+"""
+import sys
+import pickle
+from sqlalchemy import text
+
+
+def convert_face_encodings(session, dtype="float32", batch_size=500):
+    from models.embedding_type import encode_embedding, decode_header
+
+    rows = session.execute(text("SELECT id, face_encoding FROM user WHERE face_encoding IS NOT NULL")).fetchall()
+    converted = 0
+    for user_id, blob in rows:
+        if decode_header(blob) is not None:
+            continue
+        legacy = pickle.loads(blob)
+        new_blob = None if legacy is None else encode_embedding(legacy, dtype=dtype)
+        session.execute(
+            text("UPDATE user SET face_encoding = :blob WHERE id = :id"),
+            {"blob": new_blob, "id": user_id}
+        )
+        converted += 1
+        if converted % batch_size == 0:
+            session.commit()
+    session.commit()
+    return converted, len(rows)
+
+
+if __name__ == "__main__":
+    from app import app, db
+
+    dtype = "float16" if "--float16" in sys.argv else "float32"
+    with app.app_context():
+        converted, total = convert_face_encodings(db.session, dtype=dtype)
+        print(f">>> Đã chuyển {converted}/{total} face_encoding sang BLOB {dtype}")
@@ -0,0 +1,19 @@
+"""
+Dựng lại các bảng tổng hợp từ Attendance:
+- attendance_rollup (số công theo user / tháng / năm)
+- attendance_daily_summary (số bản ghi theo ngày / ca / trạng thái)
+
+Chạy từ thư mục server:
+    python -m migrations.rebuild_attendance_rollup
+
+Dùng để backfill DB cũ hoặc sửa lệch sau khi sửa Attendance trực tiếp bằng SQL.
+Bảng được xoá và dựng lại trong 1 transaction nên có thể chạy lại nhiều lần.
+"""
+
+if __name__ == "__main__":
+    from app import app, db
+    from core.attendance_rollup import AttendanceRollupManager
+
+    with app.app_context():
+        db.create_all()
+        print(f">>> Đã dựng lại {AttendanceRollupManager.rebuild()} dòng tổng hợp")
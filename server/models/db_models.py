@@ -4,7 +4,9 @@ from datetime import datetime
 db = SQLAlchemy()
 
 import enum
+import json
 from sqlalchemy import Enum as SQLAlchemyEnum
+from models.embedding_type import EmbeddingType
 
 # Định nghĩa Role
 class UserRole(enum.Enum):
@@ -29,6 +31,12 @@ class LeaveType(enum.Enum):
     ANNUAL_LEAVE = "annual_leave"
     PERSONAL_LEAVE = "personal_leave"
 
+class ReportJobStatus(enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
 class Shift(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
@@ -54,12 +62,16 @@ class User(db.Model):
     email = db.Column(db.String(100), nullable=True)
     phone = db.Column(db.String(20), nullable=True)
     
-    face_encoding = db.Column(db.PickleType, nullable=True) 
+    # float32 BLOB có header (model, dim, norm) - xem models/embedding_type.py
+    face_encoding = db.Column(EmbeddingType(model_name="ArcFace"), nullable=True)
     
     # 4. Quản lý tài khoản
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     change_password_request = db.Column(db.Boolean, default=False, nullable=False)
     must_change_password = db.Column(db.Boolean, default=False, nullable=False)
+
+    # 5. Lương cơ bản / tháng (dùng cho SalaryManager)
+    base_salary = db.Column(db.Float, default=0.0, nullable=True)
     
     # Foreign Key & Relationship
     shift_id = db.Column(db.Integer, db.ForeignKey('shift.id'), nullable=True)
@@ -67,6 +79,7 @@ class User(db.Model):
     
     attendances = db.relationship('Attendance', backref='user', lazy=True)
     leaves = db.relationship('LeaveRequest', backref='user', lazy=True)
+    face_templates = db.relationship('FaceTemplate', backref='user', lazy=True, cascade="all, delete-orphan")
 
     def to_dict(self):
         return {
@@ -82,10 +95,26 @@ class User(db.Model):
             "face_image": True if self.face_encoding is not None else False,
             "is_active": self.is_active,
             "change_password_request": self.change_password_request,
-            "must_change_password": self.must_change_password
+            "must_change_password": self.must_change_password,
+            "base_salary": self.base_salary
         }
 
+class FaceTemplate(db.Model):
+    """Một vector khuôn mặt đã đăng ký (mỗi góc mặt / mỗi lần đăng ký là 1 template)"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    pose = db.Column(db.String(20), nullable=True)  # center, left, right
+    embedding = db.Column(EmbeddingType(model_name="ArcFace"), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Attendance(db.Model):
+    # Các truy vấn nóng đều lọc theo user_id / status + khoảng checkin_time
+    __table_args__ = (
+        db.Index('ix_attendance_user_checkin', 'user_id', 'checkin_time'),  # check-in dedup, nghỉ phép, lương
+        db.Index('ix_attendance_checkin_status', 'checkin_time', 'status'),  # /api/stats, chart, logs
+        db.Index('ix_attendance_status_checkin', 'status', 'checkin_time'),  # top đi muộn
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
@@ -102,6 +131,12 @@ class Attendance(db.Model):
     shift = db.relationship('Shift', backref='attendances')
 
 class LeaveRequest(db.Model):
+    # Danh sách đơn nghỉ phân trang theo (created_at, id) giảm dần
+    __table_args__ = (
+        db.Index('ix_leave_request_created', 'created_at', 'id'),            # scope=all (Admin)
+        db.Index('ix_leave_request_user_created', 'user_id', 'created_at', 'id'),  # scope=me
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     leave_type = db.Column(SQLAlchemyEnum(LeaveType), nullable=False)
@@ -110,4 +145,135 @@ class LeaveRequest(db.Model):
     reason = db.Column(db.String(255), nullable=True)
     status = db.Column(SQLAlchemyEnum(LeaveStatus), default=LeaveStatus.PENDING)
     admin_comment = db.Column(db.String(255), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class AttendanceRollup(db.Model):
+    """
+    Số công đã tổng hợp sẵn theo user / năm / tháng (month = 0 là cả năm).
+    Được cập nhật cùng transaction với Attendance (xem core/attendance_rollup.py).
+    """
+    __tablename__ = 'attendance_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'year', 'month', name='uq_rollup_user_period'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False, default=0)  # 0 = cả năm
+
+    on_time_count = db.Column(db.Integer, nullable=False, default=0)
+    on_leave_count = db.Column(db.Integer, nullable=False, default=0)
+    late_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def workdays(self):
+        """Số công tính lương (ON_TIME + ON_LEAVE)"""
+        return self.on_time_count + self.on_leave_count
+
+class DailyAttendanceSummary(db.Model):
+    """
+    Số bản ghi Attendance theo ngày / ca / trạng thái cho Dashboard.
+    shift_id = 0 là ngoài ca (OT / nghỉ phép không gắn ca).
+    """
+    __tablename__ = 'attendance_daily_summary'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'shift_id', 'status', name='uq_daily_summary_day_shift_status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    shift_id = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(SQLAlchemyEnum(AttendanceStatus), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class Payroll(db.Model):
+    """Bảng lương đã được Admin confirm (mỗi nhân viên 1 bản ghi / tháng)"""
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'month', 'year', name='uq_payroll_user_month'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+
+    # Thông số đầu vào (có thể đã được override từ FE)
+    base_salary = db.Column(db.Float, default=0.0)
+    total_workdays = db.Column(db.Integer, default=0)
+    late_count = db.Column(db.Integer, default=0)
+    penalty_per_late = db.Column(db.Float, default=0.0)
+    bonus = db.Column(db.Float, default=0.0)
+
+    # Kết quả
+    gross_salary = db.Column(db.Float, default=0.0)
+    total_penalty = db.Column(db.Float, default=0.0)
+    net_salary = db.Column(db.Float, default=0.0)
+
+    confirmed_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    confirmed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    notes = db.Column(db.String(255), nullable=True)
+
+    user = db.relationship('User', foreign_keys=[user_id],
+                           backref=db.backref('payrolls', lazy=True, cascade="all, delete-orphan"))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "user_name": self.user.name if self.user else "-",
+            "month": self.month,
+            "year": self.year,
+            "base_salary": self.base_salary,
+            "total_workdays": self.total_workdays,
+            "late_count": self.late_count,
+            "penalty_per_late": self.penalty_per_late,
+            "bonus": self.bonus,
+            "gross_salary": self.gross_salary,
+            "total_penalty": self.total_penalty,
+            "net_salary": self.net_salary,
+            "confirmed_by": self.confirmed_by,
+            "confirmed_at": self.confirmed_at.isoformat() if self.confirmed_at else None,
+            "notes": self.notes
+        }
+
+class ReportJob(db.Model):
+    """
+    Job xuất báo cáo chạy nền (xem core/report_jobs.py).
+    Job DONE chính là cache: file được dùng lại cho mọi request cùng cache_key
+    (loại báo cáo + tham số + phiên bản dữ liệu).
+    """
+    __tablename__ = 'report_job'
+
+    id = db.Column(db.String(32), primary_key=True)
+    report_type = db.Column(db.String(32), nullable=False)
+    params = db.Column(db.Text, nullable=False)  # JSON
+    cache_key = db.Column(db.String(64), nullable=False, index=True)
+    status = db.Column(SQLAlchemyEnum(ReportJobStatus), nullable=False, default=ReportJobStatus.PENDING)
+
+    file_path = db.Column(db.String(255), nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    download_name = db.Column(db.String(128), nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    last_accessed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Process đang chạy job (host:pid:token) + lần cuối nó báo còn sống
+    worker_id = db.Column(db.String(64), nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "report_type": self.report_type,
+            "params": json.loads(self.params),
+            "status": self.status.value,
+            "file_size": self.file_size,
+            "download_name": self.download_name,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
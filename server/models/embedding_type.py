@@ -0,0 +1,81 @@
+import pickle
+import struct
+import numpy as np
+from sqlalchemy.types import TypeDecorator, LargeBinary
+
+# Header (32 bytes): magic | version | dtype code | reserved | dim | norm | model name
+HEADER = struct.Struct("<4sBBHHf16s2x")
+MAGIC = b"FEMB"
+VERSION = 1
+
+DTYPE_CODES = {"float32": 1, "float16": 2}
+CODE_DTYPES = {1: np.float32, 2: np.float16}
+
+
+def encode_embedding(embedding, model_name="ArcFace", dtype="float32"):
+    """list/ndarray -> BLOB có header phiên bản"""
+    vec = np.asarray(embedding, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vec))
+    header = HEADER.pack(
+        MAGIC, VERSION, DTYPE_CODES[dtype], 0, vec.shape[0], norm,
+        model_name.encode("ascii")[:16]
+    )
+    return header + vec.astype(CODE_DTYPES[DTYPE_CODES[dtype]]).tobytes()
+
+
+def decode_header(blob):
+    """Trả về dict header, hoặc None nếu blob không phải định dạng FEMB (VD: pickle cũ)"""
+    if blob is None or len(blob) < HEADER.size or bytes(blob[:4]) != MAGIC:
+        return None
+    magic, version, dtype_code, _, dim, norm, model = HEADER.unpack_from(blob)
+    return {
+        "version": version,
+        "dtype": CODE_DTYPES[dtype_code],
+        "dim": dim,
+        "norm": norm,
+        "model": model.rstrip(b"\0").decode("ascii")
+    }
+
+
+def decode_embedding(blob):
+    """
+    BLOB -> np.ndarray float32.
+    float32 được đọc zero-copy bằng frombuffer (mảng read-only).
+    Dữ liệu pickle cũ (chưa migrate) vẫn đọc được.
+    """
+    if blob is None:
+        return None
+    header = decode_header(blob)
+    if header is None:
+        legacy = pickle.loads(blob)
+        return None if legacy is None else np.asarray(legacy, dtype=np.float32)
+    vec = np.frombuffer(blob, dtype=header["dtype"], count=header["dim"], offset=HEADER.size)
+    return vec if header["dtype"] == np.float32 else vec.astype(np.float32)
+
+
+class EmbeddingType(TypeDecorator):
+    """
+    Cột lưu face embedding dạng BLOB float32/float16 nhỏ gọn
+    (thay cho PickleType chứa list 512 float Python).
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, model_name="ArcFace", dtype="float32", *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.model_name = model_name
+        self.dtype = dtype
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return encode_embedding(value, self.model_name, self.dtype)
+
+    def process_result_value(self, value, dialect):
+        return decode_embedding(value)
+
+    def compare_values(self, x, y):
+        if x is None or y is None:
+            return x is y
+        return np.array_equal(np.asarray(x), np.asarray(y))
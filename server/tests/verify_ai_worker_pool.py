@@ -0,0 +1,100 @@
+import sys
+import os
+import time
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+# mock mediapipe, deepface de test ko can cai dat
+from unittest.mock import MagicMock
+sys.modules["mediapipe"] = MagicMock()
+sys.modules["deepface"] = MagicMock()
+
+from core.ai_worker_pool import AIWorkerPool, _read_frame, MSG_OVERLOADED, MSG_TIMEOUT
+from core.ai_engine import MSG_PROCESSING_ERROR
+
+gate = threading.Event()
+seen = []   # (shm_name, tong pixel) worker doc duoc
+
+
+def blocking_task(shm_name, shape, dtype):
+    # cho truoc khi doc frame: frame phai con song ca sau khi client da timeout
+    gate.wait()
+    frame = _read_frame(shm_name, shape, dtype)
+    seen.append((shm_name, int(frame.sum())))
+    return "emb", int(frame.sum())
+
+
+def failing_task(shm_name, shape, dtype):
+    raise RuntimeError("model loi")
+
+
+def make_pool(max_pending=2):
+    pool = AIWorkerPool(processes=1, max_pending=max_pending, timeout=0.2)
+    # thread thay cho process worker (khong load model)
+    pool._executor = ThreadPoolExecutor(max_workers=max_pending + 1)
+    return pool
+
+
+def wait_idle(pool, timeout=5):
+    deadline = time.time() + timeout
+    while pool.stats()["pending"] and time.time() < deadline:
+        time.sleep(0.01)
+    return pool.stats()["pending"] == 0
+
+
+def test_timeout_keeps_slot_until_worker_done():
+    print("test timeout / qua tai: slot chi tra khi worker xong...")
+    pool = make_pool(max_pending=2)
+    fail = lambda msg: (None, msg)
+    img = np.ones((4, 4, 3), dtype=np.uint8)
+
+    gate.clear()
+    assert pool._run(blocking_task, img, fail) == (None, MSG_TIMEOUT)
+    assert pool._run(blocking_task, img, fail) == (None, MSG_TIMEOUT)
+    stats = pool.stats()
+    assert stats["timeouts"] == 2 and stats["pending"] == 2
+
+    # 2 frame van dang chay tren worker -> frame thu 3 bi tu choi
+    assert pool._run(blocking_task, img, fail) == (None, MSG_OVERLOADED)
+    assert pool.stats()["rejected"] == 1
+
+    # worker xong -> doc duoc frame (shm chua bi unlink), slot + shm duoc tra
+    gate.set()
+    assert wait_idle(pool)
+    assert [total for _, total in seen] == [48, 48]
+    for name, _ in seen:
+        try:
+            shared_memory.SharedMemory(name=name)
+            raise AssertionError("shm chua duoc unlink")
+        except FileNotFoundError:
+            pass
+
+    assert pool._run(blocking_task, img * 2, fail) == ("emb", 96)
+    assert wait_idle(pool)
+    print("[ok] timeout khong tra slot som, qua tai bi tu choi")
+
+
+def test_worker_error_releases_slot():
+    print("test loi worker...")
+    pool = make_pool(max_pending=1)
+    fail = lambda msg: (None, msg)
+    img = np.zeros((2, 2), dtype=np.float32)
+    for _ in range(3):
+        assert pool._run(failing_task, img, fail) == (None, MSG_PROCESSING_ERROR)
+    assert wait_idle(pool)
+    assert pool.stats()["errors"] == 3 and pool.stats()["rejected"] == 0
+    print("[ok] loi worker tra slot")
+
+
+if __name__ == "__main__":
+    try:
+        test_timeout_keeps_slot_until_worker_done()
+        test_worker_error_releases_slot()
+    finally:
+        gate.set()  # khong de thread worker treo process khi test loi
+    print("\nALL TESTS PASSED!")
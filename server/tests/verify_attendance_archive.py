@@ -0,0 +1,154 @@
+import sys
+import os
+import io
+import random
+import zipfile
+import tempfile
+from datetime import datetime, timedelta
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from flask import Flask
+from models.db_models import db, User, Shift, Attendance, AttendanceStatus, AttendanceRollup, DailyAttendanceSummary
+from core.attendance_archive import attendance_archive
+from core.attendance_export import AttendanceExporter
+from core.attendance_rollup import AttendanceRollupManager
+from core.report_manager import ReportManager
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    return app
+
+
+def seed(n=3000):
+    db.create_all()
+    db.session.add_all([Shift(id=1, name="Ca Sang", start_time="08:00:00", end_time="17:00:00"),
+                        Shift(id=2, name="Ca Dem", start_time="22:00:00", end_time="06:00:00")])
+    db.session.add_all([User(id=i, name=f"NV {i}", username=f"nv{i}", email=f"nv{i}@hrm") for i in range(1, 21)])
+    rng = random.Random(7)
+    rows = []
+    for _ in range(n):
+        t = datetime(2024, 1, 1, 7) + timedelta(days=rng.randrange(540), minutes=rng.randrange(600))
+        rows.append(dict(
+            user_id=rng.randint(1, 20),
+            shift_id=rng.choice([1, 2, None]),
+            checkin_time=t,
+            checkout_time=t + timedelta(hours=8) if rng.random() < 0.8 else None,
+            status=rng.choice(list(AttendanceStatus))
+        ))
+    db.session.execute(db.insert(Attendance), rows)
+    db.session.commit()
+    AttendanceRollupManager.rebuild()
+
+
+def snapshot():
+    rollup = sorted(
+        (r.user_id, r.year, r.month, r.on_time_count, r.on_leave_count, r.late_count)
+        for r in AttendanceRollup.query.all() if r.on_time_count or r.on_leave_count or r.late_count
+    )
+    daily = sorted((r.day, r.shift_id, r.status.name, r.count) for r in DailyAttendanceSummary.query.all() if r.count)
+    return rollup, daily
+
+
+def export_rows(**kwargs):
+    return [tuple(r) for r in AttendanceExporter.iter_rows(**kwargs)]
+
+
+def test_archive_is_transparent():
+    print("test archive thang cu ra Parquet, doc lai trong suot...")
+    app = make_app()
+    with tempfile.TemporaryDirectory() as archive_dir, app.app_context():
+        attendance_archive.base_dir = archive_dir
+        seed()
+        total = Attendance.query.count()
+        start, end = datetime(2024, 3, 10), datetime(2025, 2, 20, 23, 59, 59)
+        before = {
+            "all": export_rows(newest_first=True),
+            "range": export_rows(start_date=start, end_date=end, user_id=5, newest_first=True),
+            "ids": export_rows(),
+        }
+        summary = snapshot()
+        version = ReportManager.attendance_data_version(start, end)
+
+        moved = attendance_archive.archive_before(2025, 1)
+        assert len(moved) == 12 and sum(moved.values()) == total - Attendance.query.count()
+        assert Attendance.query.filter(Attendance.checkin_time < datetime(2025, 1, 1)).count() == 0
+        assert attendance_archive.months()[0] == (2024, 1)
+
+        # chay lai khong ghi trung
+        assert sum(attendance_archive.archive_before(2025, 1).values()) == 0
+
+        assert export_rows(newest_first=True) == before["all"]
+        assert export_rows(start_date=start, end_date=end, user_id=5, newest_first=True) == before["range"]
+        # theo id: dung thu tu du id khong tang theo thang (seed chen ngay ngau nhien)
+        assert export_rows() == before["ids"]
+        assert [r[0] for r in before["ids"]] == sorted(r[0] for r in before["ids"])
+        assert export_rows(user_id=5) == [r for r in before["ids"] if r[1] == 5]
+
+        # tong hop khong doi, rebuild doc ca archive
+        assert snapshot() == summary
+        AttendanceRollupManager.rebuild()
+        assert snapshot() == summary
+        assert ReportManager.attendance_data_version(start, end) != version
+        print("[ok] export / rollup giong het truoc khi archive")
+
+
+def test_remove_user_and_columnar_export():
+    print("test xoa NV + export Arrow / Parquet...")
+    app = make_app()
+    with tempfile.TemporaryDirectory() as archive_dir, app.app_context():
+        attendance_archive.base_dir = archive_dir
+        seed(1500)
+        attendance_archive.archive_before(2025, 1)
+
+        # nhu delete_employee: loi commit -> file archive chua bi ghi lai
+        version = attendance_archive.version()
+        AttendanceRollupManager.delete_user(3)
+        db.session.rollback()
+        assert attendance_archive.version() == version
+        assert any(r.user_id == 3 for r in AttendanceExporter.iter_rows(end_date=datetime(2024, 12, 31)))
+
+        # commit roi moi xoa khoi archive
+        AttendanceRollupManager.delete_user(3)
+        db.session.delete(db.session.get(User, 3))
+        db.session.commit()
+        assert attendance_archive.version() == version
+        assert attendance_archive.purge_deleted_users()[3] > 0
+        assert attendance_archive.purge_user(3) == 0
+        assert all(r.user_id != 3 for r in AttendanceExporter.iter_rows())
+        incremental = snapshot()
+        AttendanceRollupManager.rebuild()
+        assert incremental == snapshot()
+
+        rows = export_rows(newest_first=True)
+        stream = b"".join(AttendanceExporter.stream_arrow(AttendanceExporter.iter_rows(newest_first=True), batch_size=100))
+        table = pa.ipc.open_stream(stream).read_all()
+        assert table.num_rows == len(rows)
+        assert pa.types.is_dictionary(table.schema.field("status").type)
+        assert pa.types.is_dictionary(table.schema.field("shift_name").type)
+        assert table.column("id").to_pylist() == [r[0] for r in rows]
+
+        output = io.BytesIO()
+        assert ReportManager.write_attendance_parquet(output) == len(rows)
+        with zipfile.ZipFile(output) as zf, tempfile.TemporaryDirectory() as out_dir:
+            names = zf.namelist()
+            assert len(names) == len(set(names)) == 18
+            assert "month=2024-01/part-0.parquet" in names
+            zf.extractall(out_dir)
+            dataset = pq.read_table(out_dir)
+            assert dataset.num_rows == len(rows)
+            jan = pq.read_table(os.path.join(out_dir, "month=2024-01", "part-0.parquet"))
+            assert all(t.year == 2024 and t.month == 1 for t in jan.column("checkin_time").to_pylist())
+        print("[ok] xoa NV khoi archive, Arrow / Parquet dung")
+
+
+if __name__ == "__main__":
+    test_archive_is_transparent()
+    test_remove_user_and_columnar_export()
+    print("\nALL TESTS PASSED!")
@@ -0,0 +1,144 @@
+import sys
+import os
+import io
+import csv
+from datetime import datetime, timedelta
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+from flask import Flask
+from openpyxl import load_workbook
+from models.db_models import db, User, Shift, Attendance, AttendanceStatus
+from core.attendance_export import AttendanceExporter, LOG_COLUMNS
+from core.report_manager import ReportManager
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    return app
+
+
+def seed(n=500):
+    db.create_all()
+    db.session.add(Shift(id=1, name="Ca Sang", start_time="08:00:00", end_time="17:00:00"))
+    db.session.add_all([User(id=i, name=f"NV {i}", username=f"nv{i}", email=f"nv{i}@hrm") for i in range(1, 11)])
+    base = datetime(2025, 3, 1, 8)
+    rows = []
+    for i in range(n):
+        # nhieu ban ghi trung checkin_time de kiem tra keyset
+        t = base + timedelta(minutes=i // 3)
+        rows.append(dict(
+            user_id=i % 10 + 1,
+            shift_id=1 if i % 2 else None,
+            checkin_time=t,
+            checkout_time=t + timedelta(hours=8) if i % 5 else None,
+            status=AttendanceStatus.LATE if i % 4 == 0 else AttendanceStatus.ON_TIME
+        ))
+    db.session.execute(db.insert(Attendance), rows)
+    db.session.add(Attendance(user_id=99, checkin_time=base))  # user da bi xoa
+    db.session.commit()
+
+
+def test_keyset_matches_full_query():
+    print("test doc theo lo (keyset) == query toan bo...")
+    app = make_app()
+    with app.app_context():
+        seed()
+        ids = [r.id for r in AttendanceExporter.iter_rows(batch_size=7)]
+        assert ids == [a.id for a in Attendance.query.order_by(Attendance.id)]
+
+        ids = [r.id for r in AttendanceExporter.iter_rows(newest_first=True, batch_size=7)]
+        expected = Attendance.query.order_by(Attendance.checkin_time.desc(), Attendance.id.desc())
+        assert ids == [a.id for a in expected]
+
+        start, end = datetime(2025, 3, 1, 9), datetime(2025, 3, 1, 10)
+        ids = [r.id for r in AttendanceExporter.iter_rows(start, end, user_id=3, newest_first=True, batch_size=4)]
+        expected = Attendance.query.filter(
+            Attendance.user_id == 3, Attendance.checkin_time >= start, Attendance.checkin_time <= end
+        ).order_by(Attendance.checkin_time.desc(), Attendance.id.desc())
+        assert ids and ids == [a.id for a in expected]
+        print("[ok] keyset dung thu tu, khong sot / trung dong")
+
+
+def test_stream_formats():
+    print("test stream xlsx / csv...")
+    app = make_app()
+    with app.app_context():
+        seed(200)
+        rows = [AttendanceExporter.log_row(r) for r in AttendanceExporter.iter_rows()]
+        assert rows[-1][:2] == [99, "User #99"]
+
+        chunks = list(AttendanceExporter.stream_csv(LOG_COLUMNS, iter(rows), chunk_bytes=1024))
+        assert len(chunks) > 1
+        parsed = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8-sig"))))
+        assert parsed[0] == LOG_COLUMNS and len(parsed) == 202
+        assert parsed[1] == [str(v) for v in rows[0]]
+
+        data = b"".join(AttendanceExporter.stream_xlsx("Log", LOG_COLUMNS, iter(rows), chunk_bytes=4096))
+        ws = load_workbook(io.BytesIO(data))["Log"]
+        values = list(ws.values)
+        assert list(values[0]) == LOG_COLUMNS and len(values) == 202
+        assert values[2][:4] == tuple(rows[1][:4])
+        assert values[-1][:2] == (99, "User #99")
+
+        # xlsx stream that: chunk dau ra truoc khi doc het du lieu
+        consumed = []
+        def source():
+            for i in range(20000):
+                consumed.append(i)
+                yield [i, f"NV <{i}> & co", "", "2025-03-01 08:00:00", "", "Đúng giờ"]
+        stream = AttendanceExporter.stream_xlsx("Log", LOG_COLUMNS, source(), chunk_bytes=4096)
+        first = next(stream)
+        assert first[:2] == b"PK" and len(consumed) < 20000
+        ws = load_workbook(io.BytesIO(first + b"".join(stream)), read_only=True)["Log"]
+        values = list(ws.values)
+        assert len(values) == 20001 and values[-1][:2] == (19999, "NV <19999> & co")
+        print("[ok] xlsx / csv dung noi dung")
+
+
+def test_report_single_pass():
+    print("test bao cao 3 sheet (1 lan duyet) == tinh truc tiep...")
+    app = make_app()
+    with app.app_context():
+        seed(300)
+        start, end = datetime(2025, 3, 1, 8, 30), datetime(2025, 3, 1, 9, 30)
+        wb = load_workbook(ReportManager.export_attendance_to_excel(start, end))
+        assert wb.sheetnames == ['Tổng Quan', 'Chi Tiết Chấm Công', 'Thống Kê Theo NV']
+
+        logs = Attendance.query.filter(
+            Attendance.checkin_time >= start, Attendance.checkin_time <= end
+        ).order_by(Attendance.checkin_time.desc(), Attendance.id.desc()).all()
+        hours = lambda l: ReportManager.calculate_work_hours(l.checkin_time, l.checkout_time)
+
+        detail = list(wb['Chi Tiết Chấm Công'].values)[1:]
+        assert [r[1] for r in detail] == [l.user_id for l in logs]
+        assert [r[7] for r in detail] == [hours(l) for l in logs]
+
+        summary = dict(list(wb['Tổng Quan'].values)[1:])
+        late = [l for l in logs if l.status == AttendanceStatus.LATE]
+        assert summary["Tổng Số Bản Ghi"] == len(logs)
+        assert summary["Đi Muộn"] == len(late)
+        assert summary["Tổng Giờ Làm Việc"] == round(sum(hours(l) for l in logs), 2)
+
+        by_user = {r[0]: r for r in list(wb['Thống Kê Theo NV'].values)[1:]}
+        for uid in {l.user_id for l in logs}:
+            user_logs = [l for l in logs if l.user_id == uid]
+            user_late = len([l for l in user_logs if l.status == AttendanceStatus.LATE])
+            assert by_user[uid][2:4] == (len(user_logs), user_late)
+            assert by_user[uid][5] == round(sum(hours(l) for l in user_logs), 2)
+
+        # loc theo 1 nhan vien -> khong co sheet theo NV
+        wb = load_workbook(ReportManager.export_attendance_to_excel(user_id=2))
+        assert wb.sheetnames == ['Tổng Quan', 'Chi Tiết Chấm Công']
+        assert dict(list(wb['Tổng Quan'].values)[1:])["Tổng Số Bản Ghi"] == 30
+        print("[ok] bao cao dung so lieu")
+
+
+if __name__ == "__main__":
+    test_keyset_matches_full_query()
+    test_stream_formats()
+    test_report_single_pass()
+    print("\nALL TESTS PASSED!")
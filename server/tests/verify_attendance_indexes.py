@@ -0,0 +1,96 @@
+import sys
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+from sqlalchemy import create_engine, select, func, text
+from models.db_models import db, Attendance, AttendanceStatus
+from migrations.add_attendance_indexes import add_attendance_indexes
+
+# So dong seed (mac dinh nho cho nhanh, do tren bang lon: ATTENDANCE_ROWS=2000000)
+ROWS = int(os.environ.get("ATTENDANCE_ROWS", "20000"))
+USERS = 2000
+START = datetime(2022, 1, 1)
+
+
+def seed(engine):
+    print(f"seed {ROWS} dong attendance...")
+    rng = random.Random(0)
+    statuses = [s.name for s in AttendanceStatus]
+    span = 3 * 365 * 24 * 3600
+
+    def rows():
+        for i in range(ROWS):
+            t = START + timedelta(seconds=rng.randrange(span))
+            yield (rng.randint(1, USERS), t.strftime("%Y-%m-%d %H:%M:%S.000000"), rng.choice(statuses))
+
+    raw = engine.raw_connection()
+    try:
+        raw.executemany("INSERT INTO attendance (user_id, checkin_time, status) VALUES (?, ?, ?)", rows())
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def plan(conn, stmt):
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql))]
+
+
+def hot_queries():
+    day = datetime(2024, 6, 3)
+    month, year = datetime(2024, 6, 1), datetime(2024, 1, 1)
+    return {
+        # check-in dedup / LeaveManager: 1 user, 1 ngay
+        "checkin_dedup": select(Attendance).where(Attendance.user_id == 42, Attendance.checkin_time >= day),
+        "leave_day": select(Attendance).where(
+            Attendance.user_id == 42, Attendance.checkin_time >= day, Attendance.checkin_time <= day + timedelta(days=1)),
+        # SalaryManager: thang / nam
+        "salary_month": select(Attendance).where(
+            Attendance.user_id == 42, Attendance.checkin_time >= month, Attendance.checkin_time < datetime(2024, 7, 1)),
+        "salary_year": select(Attendance).where(
+            Attendance.user_id == 42, Attendance.checkin_time >= year, Attendance.checkin_time <= datetime(2024, 12, 31),
+            Attendance.status.in_([AttendanceStatus.ON_TIME, AttendanceStatus.ON_LEAVE])),
+        # /api/stats, /api/stats/chart, /api/stats/top-late, /api/logs
+        "stats_today": select(Attendance).where(Attendance.checkin_time >= day),
+        "stats_chart": select(Attendance).where(Attendance.checkin_time >= day - timedelta(days=6), Attendance.checkin_time < day),
+        "top_late": select(Attendance.user_id, func.count(Attendance.id)).where(
+            Attendance.checkin_time >= month, Attendance.status == AttendanceStatus.LATE
+        ).group_by(Attendance.user_id).order_by(func.count(Attendance.id).desc()).limit(5),
+        "logs": select(Attendance).order_by(Attendance.checkin_time.desc()).limit(20),
+    }
+
+
+def test_query_plans():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'plan.db')}")
+        try:
+            # Tao bang nhu DB cu (chua co index) roi chay migration
+            Attendance.__table__.create(engine)
+            with engine.begin() as conn:
+                for index in Attendance.__table__.indexes:
+                    conn.execute(text(f"DROP INDEX {index.name}"))
+            seed(engine)
+
+            created = add_attendance_indexes(engine)
+            assert len(created) == 3, created
+            assert add_attendance_indexes(engine) == []   # chay lai -> khong tao them
+
+            with engine.connect() as conn:
+                for name, stmt in hot_queries().items():
+                    steps = plan(conn, stmt)
+                    uses_index = any("USING INDEX" in s or "USING COVERING INDEX" in s for s in steps)
+                    full_scan = any(s.startswith("SCAN attendance") and "USING" not in s for s in steps)
+                    assert uses_index and not full_scan, f"{name}: {steps}"
+                    print(f"[ok] {name}: {' | '.join(steps)}")
+        finally:
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    test_query_plans()
+    print("\nALL TESTS PASSED!")
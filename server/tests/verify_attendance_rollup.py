@@ -0,0 +1,132 @@
+import sys
+import os
+import random
+from datetime import datetime, timedelta
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+from flask import Flask
+from models.db_models import db, User, Attendance, AttendanceStatus, AttendanceRollup, DailyAttendanceSummary, LeaveRequest, LeaveType, UserRole
+from core.attendance_rollup import AttendanceRollupManager
+from core.leave_manager import LeaveManager
+from core.report_manager import ReportManager
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    return app
+
+
+def snapshot():
+    rollup = sorted(
+        (r.user_id, r.year, r.month, r.on_time_count, r.on_leave_count, r.late_count)
+        for r in AttendanceRollup.query.all() if r.on_time_count or r.on_leave_count or r.late_count
+    )
+    daily = sorted(
+        (r.day, r.shift_id, r.status.name, r.count) for r in DailyAttendanceSummary.query.all() if r.count
+    )
+    return rollup, daily
+
+
+def test_incremental_matches_rebuild():
+    print("test rollup cap nhat tung buoc == rebuild...")
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(id=i, name=f"NV {i}", username=f"nv{i}", role=UserRole.EMPLOYEE) for i in (1, 2, 3)])
+        rng = random.Random(3)
+
+        # check-in (giong CheckinManager)
+        for _ in range(300):
+            t = datetime(2025, 1, 1, 8) + timedelta(days=rng.randrange(500), minutes=rng.randrange(60))
+            status = rng.choice(list(AttendanceStatus))
+            uid = rng.randint(1, 3)
+            shift_id = rng.choice([None, 1, 2])
+            db.session.add(Attendance(user_id=uid, checkin_time=t, status=status, shift_id=shift_id))
+            AttendanceRollupManager.record_change(uid, t, None, status, shift_id=shift_id)
+        db.session.commit()
+
+        # duyet nghi phep qua 2 thang (cap nhat ngay da co + tao ngay moi)
+        leave = LeaveRequest(user_id=2, leave_type=LeaveType.ANNUAL_LEAVE,
+                             start_date=datetime(2025, 3, 25), end_date=datetime(2025, 4, 5))
+        db.session.add(leave)
+        db.session.commit()
+        ok, msg = LeaveManager.approve_leave_request(leave.id)
+        assert ok, msg
+
+        incremental = snapshot()
+        AttendanceRollupManager.rebuild()
+        assert incremental == snapshot()
+
+        counts = AttendanceRollupManager.get_counts(2025, 3, [2])[2]
+        assert counts["year"].workdays >= counts["month"].workdays >= 7
+
+        # so lieu Dashboard == dem truc tiep tren Attendance
+        start, end = datetime(2025, 3, 1), datetime(2025, 4, 30, 23, 59, 59)
+        daily = AttendanceRollupManager.get_daily_counts(start.date(), end.date())
+        for a in Attendance.query.filter(Attendance.checkin_time >= start, Attendance.checkin_time <= end):
+            daily[a.checkin_time.date()][a.status] -= 1
+        assert all(c == 0 for day in daily.values() for c in day.values())
+
+        # co mat = so user khac nhau, ke ca khi 1 user co 2 ban ghi trong ngay
+        day = datetime(2025, 3, 12)
+        for uid in (1, 1, 3):
+            db.session.add(Attendance(user_id=uid, checkin_time=day.replace(hour=9), status=AttendanceStatus.ON_TIME))
+        db.session.commit()
+        expected = {a.user_id for a in Attendance.query.filter(
+            Attendance.checkin_time >= day, Attendance.checkin_time < day + timedelta(days=1))}
+        assert ReportManager.count_present_users(day.date()) == len(expected)
+        AttendanceRollupManager.rebuild()
+
+        # xoa nhan vien (dung thu tu nhu delete_employee) -> tru khoi bang tong hop
+        AttendanceRollupManager.delete_user(2)
+        db.session.commit()
+        assert Attendance.query.filter_by(user_id=2).count() == 0
+        assert all(r.user_id != 2 for r in AttendanceRollup.query.all())
+        incremental = snapshot()
+        AttendanceRollupManager.rebuild()
+        assert incremental == snapshot()
+        print("[ok] rollup khop")
+
+
+def test_bulk_leave_approval():
+    print("test duyet nghi phep hang loat...")
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(id=i, name=f"NV {i}", username=f"nv{i}", role=UserRole.EMPLOYEE) for i in (1, 2)])
+        # ngay 3/6 da check-in muon, da check-out
+        db.session.add(Attendance(user_id=1, checkin_time=datetime(2025, 6, 3, 8, 40), checkout_time=datetime(2025, 6, 3, 17),
+                                  status=AttendanceStatus.LATE))
+        AttendanceRollupManager.record_change(1, datetime(2025, 6, 3, 8, 40), None, AttendanceStatus.LATE)
+        leaves = [
+            LeaveRequest(user_id=1, leave_type=LeaveType.SICK_LEAVE, start_date=datetime(2025, 6, 1), end_date=datetime(2025, 6, 30)),
+            LeaveRequest(user_id=2, leave_type=LeaveType.ANNUAL_LEAVE, start_date=datetime(2025, 6, 28), end_date=datetime(2025, 7, 2)),
+        ]
+        db.session.add_all(leaves)
+        db.session.commit()
+
+        ids = [leaves[0].id, leaves[1].id, 999, leaves[0].id]
+        approved, results = LeaveManager.approve_leave_requests(ids, admin_id=1)
+        assert approved == 2
+        assert [r["success"] for r in results] == [True, True, False, False]
+
+        june = Attendance.query.filter(Attendance.user_id == 1).all()
+        assert len(june) == 30 and all(a.status == AttendanceStatus.ON_LEAVE for a in june)
+        assert all(a.checkout_time is None for a in june)
+        assert Attendance.query.filter(Attendance.user_id == 2).count() == 5
+
+        incremental = snapshot()
+        AttendanceRollupManager.rebuild()
+        assert incremental == snapshot()
+        assert AttendanceRollupManager.get_counts(2025, 6, [1])[1]["month"].late_count == 0
+        print("[ok] duyet hang loat dung")
+
+
+if __name__ == "__main__":
+    test_incremental_matches_rebuild()
+    test_bulk_leave_approval()
+    print("\nALL TESTS PASSED!")
@@ -0,0 +1,53 @@
+import numpy as np
+import sys
+import os
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+from core.embedding_cache import EmbeddingCache
+
+
+def test_hit_miss():
+    print("test cache embedding (hit / miss / rejection)...")
+    cache = EmbeddingCache(max_mb=1, ttl=60)
+    img = np.zeros((480, 640, 3), dtype=np.uint8)
+    key = cache.key_for(img)
+
+    assert cache.get(key) is None
+    cache.put(key, [0.5] * 512, "OK")
+    emb, msg = cache.get(key)
+    assert msg == "OK" and len(emb) == 512
+
+    # anh khac 1 pixel -> key khac
+    img2 = img.copy()
+    img2[0, 0, 0] = 1
+    key2 = cache.key_for(img2)
+    assert key2 != key
+    cache.put(key2, None, "Spoofing detected")
+    assert cache.get(key2) == (None, "Spoofing detected")
+
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1
+    print("[ok] hit/miss dung")
+
+
+def test_eviction_by_size_and_ttl():
+    print("test gioi han MB va TTL...")
+    cache = EmbeddingCache(max_mb=0.01, ttl=60)   # ~10KB -> chi chua vai vector
+    for i in range(20):
+        cache.put(bytes([i]), [0.1] * 512, "OK")
+    stats = cache.stats()
+    assert stats["evictions"] > 0 and stats["size_mb"] <= 0.01
+    assert cache.get(bytes([19])) is not None   # moi nhat van con
+    assert cache.get(bytes([0])) is None        # cu nhat da bi day ra
+
+    expired = EmbeddingCache(max_mb=1, ttl=-1)
+    expired.put(b"k", [0.1] * 4, "OK")
+    assert expired.get(b"k") is None and expired.stats()["expired"] == 1
+    print("[ok] eviction dung")
+
+
+if __name__ == "__main__":
+    test_hit_miss()
+    test_eviction_by_size_and_ttl()
@@ -0,0 +1,41 @@
+import numpy as np
+import pickle
+import sys
+import os
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+from models.embedding_type import encode_embedding, decode_embedding, decode_header, HEADER
+
+
+def test_roundtrip():
+    print("test encode/decode BLOB float32...")
+    vec = np.random.default_rng(0).normal(size=512)
+    blob = encode_embedding(vec.tolist())
+    assert len(blob) == HEADER.size + 512 * 4
+
+    header = decode_header(blob)
+    assert header["model"] == "ArcFace" and header["dim"] == 512
+    assert abs(header["norm"] - np.linalg.norm(vec)) < 1e-3
+
+    out = decode_embedding(blob)
+    assert out.dtype == np.float32 and np.allclose(out, vec, atol=1e-6)
+    print("[ok] float32 roundtrip dung")
+
+
+def test_float16_and_legacy():
+    print("test float16 va du lieu pickle cu...")
+    vec = [0.25] * 512
+    blob16 = encode_embedding(vec, dtype="float16")
+    assert len(blob16) == HEADER.size + 512 * 2
+    assert np.allclose(decode_embedding(blob16), vec)
+
+    # dong chua migrate van doc duoc
+    assert np.allclose(decode_embedding(pickle.dumps(vec)), vec)
+    print("[ok] float16 + pickle cu doc dung")
+
+
+if __name__ == "__main__":
+    test_roundtrip()
+    test_float16_and_legacy()
@@ -0,0 +1,140 @@
+import numpy as np
+import sys
+import os
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+from core.face_gallery import FaceGallery
+
+
+def test_search_and_update():
+    print("test gallery index (search / upsert / remove)...")
+    rng = np.random.default_rng(0)
+    vectors = {uid: rng.normal(size=512).tolist() for uid in range(1, 6)}
+
+    gallery = FaceGallery()
+    gallery.rebuild(vectors.items())
+    assert len(gallery) == 5
+
+    # vector trung khop -> khoang cach ~0
+    uid, dist = gallery.search(vectors[3])
+    assert uid == 3 and dist < 1e-5, (uid, dist)
+
+    # cap nhat vector moi cho user 3
+    new_vec = rng.normal(size=512).tolist()
+    gallery.upsert(3, new_vec)
+    uid, dist = gallery.search(new_vec)
+    assert uid == 3 and dist < 1e-5
+
+    # xoa user 1 -> khong con trong ket qua
+    gallery.remove(1)
+    assert len(gallery) == 4
+    uid, _ = gallery.search(vectors[1])
+    assert uid != 1
+
+    # them user moi sau khi xoa (swap-with-last van dung)
+    gallery.upsert(99, vectors[1])
+    uid, dist = gallery.search(vectors[1])
+    assert uid == 99 and dist < 1e-5
+    print("[ok] gallery index dung")
+
+
+def test_empty_gallery():
+    print("test gallery rong...")
+    gallery = FaceGallery()
+    assert gallery.search([1.0, 0.0]) == (None, 1.0)
+    print("[ok] gallery rong tra ve (None, 1.0)")
+
+
+def test_ivf_backend():
+    print("test backend IVF (approximate) so voi exact...")
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(50, 128))
+    vectors = centers[rng.integers(0, 50, 3000)] + 0.3 * rng.normal(size=(3000, 128))
+
+    exact = FaceGallery(backend="exact")
+    exact.rebuild(enumerate(vectors))
+    ivf = FaceGallery(backend="ivf", nprobe=8, min_ann_size=1000)
+    ivf.rebuild(enumerate(vectors))
+
+    queries = vectors[:50] + 0.1 * rng.normal(size=(50, 128))
+    hits = sum(ivf.search(q)[0] == exact.search(q)[0] for q in queries)
+    assert hits >= 48, hits
+
+    # cap nhat tang dan van tim thay sau khi da train
+    ivf.remove(7)
+    ivf.upsert(10000, vectors[7])
+    uid, dist = ivf.search(vectors[7])
+    assert uid == 10000 and dist < 1e-5
+
+    # nprobe / rerank_k = 0 la loi cau hinh, khong am tham dung mac dinh
+    for kwargs in ({"nprobe": 0}, {"rerank_k": 0}, {"nprobe": -1}):
+        try:
+            FaceGallery(backend="ivf", **kwargs)
+            raise AssertionError(f"phai loi: {kwargs}")
+        except ValueError:
+            pass
+    assert FaceGallery(backend="ivf", nprobe=1).nprobe == 1
+    print(f"[ok] recall IVF {hits}/50")
+
+
+def test_multi_template():
+    print("test nhieu template / user...")
+    rng = np.random.default_rng(2)
+    left, right, other = (rng.normal(size=256) for _ in range(3))
+
+    gallery = FaceGallery()
+    gallery.rebuild([(("tpl", 1), left, 7), (("tpl", 2), right, 7), (("user", 8), other, 8)])
+
+    # khop voi bat ky template nao cua user 7
+    assert gallery.search(right)[0] == 7
+    assert gallery.search(left)[0] == 7
+    assert [uid for uid, _ in gallery.search_topk(left, k=2)] == [7, 8]
+
+    # thay toan bo template cua user 7
+    gallery.replace_user(7, [(("tpl", 3), other)])
+    assert len(gallery) == 2
+    assert gallery.search(left)[0] in (7, 8)
+    gallery.remove_user(7)
+    assert gallery.search(other)[0] == 8
+    print("[ok] multi-template dung")
+
+
+def test_dimension_mismatch():
+    print("test vector khac so chieu khong xoa gallery...")
+    rng = np.random.default_rng(3)
+    vectors = {uid: rng.normal(size=512) for uid in (1, 2, 3)}
+    gallery = FaceGallery()
+    gallery.rebuild(vectors.items())
+
+    for action in (lambda: gallery.upsert(4, rng.normal(size=128)),
+                   lambda: gallery.upsert(2, rng.normal(size=128)),
+                   lambda: gallery.replace_user(3, [(3, rng.normal(size=128))])):
+        try:
+            action()
+            raise AssertionError("phai loi")
+        except ValueError:
+            pass
+    assert len(gallery) == 3
+    for uid, vec in vectors.items():
+        assert gallery.search(vec)[0] == uid
+
+    # rebuild lan lon so chieu: giu so chieu pho bien, bo vector lech
+    gallery.rebuild(list(vectors.items()) + [(9, rng.normal(size=128))])
+    assert len(gallery) == 3 and gallery.search(vectors[1])[0] == 1
+
+    # gallery chi co 1 user -> thay toan bo bang model moi van duoc
+    single = FaceGallery()
+    single.upsert(1, vectors[1])
+    single.replace_user(1, [(1, np.ones(128))])
+    assert len(single) == 1 and single.search(np.ones(128))[0] == 1
+    print("[ok] lech so chieu bi tu choi, gallery giu nguyen")
+
+
+if __name__ == "__main__":
+    test_search_and_update()
+    test_empty_gallery()
+    test_ivf_backend()
+    test_multi_template()
+    test_dimension_mismatch()
@@ -0,0 +1,98 @@
+import sys
+import os
+import numpy as np
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+from core.frame_quality import (
+    FrameQualityGate, REASON_DARK, REASON_BRIGHT, REASON_NO_FACE, REASON_FACE_SMALL, REASON_BLURRY
+)
+
+
+class StubDetector:
+    """Thay Haar cascade: tra ve khung mat co dinh (toa do tren anh detector)."""
+
+    def __init__(self, faces):
+        self.faces = faces
+        self.shapes = []
+
+    def detectMultiScale(self, img, **kwargs):
+        self.shapes.append(img.shape)
+        return np.array(self.faces).reshape(-1, 4)
+
+
+def make_gate(faces):
+    gate = FrameQualityGate()
+    detector = StubDetector(faces)
+    gate._get_detector = lambda: detector
+    return gate, detector
+
+
+def textured(h, w, seed=0):
+    # nhieu -> phuong sai Laplacian lon, do sang trung binh ~125
+    return np.random.default_rng(seed).integers(30, 220, size=(h, w, 3), dtype=np.uint8)
+
+
+def test_exposure():
+    print("test anh qua toi / qua sang...")
+    gate, detector = make_gate([(50, 50, 100, 100)])
+    ok, reason, metrics = gate.check(np.full((480, 640, 3), 10, dtype=np.uint8))
+    assert not ok and reason == REASON_DARK and metrics["brightness"] == 10.0
+
+    ok, reason, _ = gate.check(np.full((480, 640, 3), 252, dtype=np.uint8))
+    assert not ok and reason == REASON_BRIGHT
+
+    # nua anh chay sang (> 50% pixel >= 250) du trung binh van on
+    img = textured(480, 640)
+    img[:, :400] = 255
+    ok, reason, _ = gate.check(img)
+    assert not ok and reason == REASON_BRIGHT
+    assert detector.shapes == []    # bi loai truoc khi chay detector
+    print("[ok] exposure dung")
+
+
+def test_face_checks():
+    print("test khong co mat / mat nho / mo / dat...")
+    img = textured(480, 640)
+
+    gate, _ = make_gate([])
+    assert gate.check(img)[1] == REASON_NO_FACE
+
+    # 640 -> anh detector 320: khung 30px = 60px tren anh goc < MIN_FACE_SIZE_PX
+    gate, detector = make_gate([(100, 100, 30, 30)])
+    ok, reason, metrics = gate.check(img)
+    assert not ok and reason == REASON_FACE_SMALL and metrics["face_size_px"] == 60
+    assert detector.shapes == [(240, 320)]
+
+    # vung mat phang (mo), nen co texture khong anh huong
+    blurry = img.copy()
+    blurry[100:300, 100:300] = 128
+    gate, _ = make_gate([(50, 50, 100, 100)])
+    ok, reason, metrics = gate.check(blurry)
+    assert not ok and reason == REASON_BLURRY and metrics["blur_score"] < 1
+
+    ok, reason, metrics = gate.check(img)
+    assert ok and reason is None and metrics["face_size_px"] == 200 and metrics["blur_score"] > 40
+
+    # anh lon: downscale truoc khi phan tich, kich thuoc mat tinh theo anh goc
+    gate, detector = make_gate([(60, 60, 50, 50)])
+    ok, reason, metrics = gate.check(textured(960, 1280, seed=1))
+    assert ok and metrics["face_size_px"] == 200 and detector.shapes == [(240, 320)]
+
+    assert gate.stats() == {"passed": 1}
+    print("[ok] cac ly do loai dung")
+
+
+def test_real_detector_no_face():
+    print("test Haar cascade that tren anh khong co mat...")
+    ok, reason, _ = FrameQualityGate().check(textured(480, 640, seed=2))
+    assert not ok and reason == REASON_NO_FACE
+    print("[ok] Haar cascade load duoc")
+
+
+if __name__ == "__main__":
+    test_exposure()
+    test_face_checks()
+    test_real_detector_no_face()
+    print("\nALL TESTS PASSED!")
@@ -0,0 +1,106 @@
+import sys
+import os
+import numpy as np
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+# mock mediapipe, deepface de test ko can cai dat
+from unittest.mock import MagicMock
+sys.modules["mediapipe"] = MagicMock()
+sys.modules["deepface"] = MagicMock()
+
+from core import ai_engine
+from core.ai_engine import InferenceBatcher
+
+
+class StubModel:
+    """Model gia: moi dong output chi phu thuoc anh cua dong do."""
+    input_shape = (112, 112)
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+        self.model = self
+
+    def predict_on_batch(self, batch):
+        self.calls.append(len(batch))
+        if self.fail:
+            raise RuntimeError("GPU het bo nho")
+        assert batch.dtype == np.float32 and batch.shape[1:] == (112, 112, 3)
+        return np.stack([batch.mean(axis=(1, 2)), batch.max(axis=(1, 2)), batch[:, 56, :, :].sum(axis=1)], axis=1).reshape(len(batch), -1)
+
+
+def use_model(model):
+    ai_engine.DeepFace.build_model = lambda model_name: model
+
+
+def random_faces(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, size=(rng.integers(60, 200), rng.integers(60, 200), 3), dtype=np.uint8) for _ in range(n)]
+
+
+def test_preprocess():
+    print("test _preprocess (BGR->RGB, resize giu ti le + pad, scale [0, 1])...")
+    # anh 100x50 toan mau xanh duong (BGR)
+    face = np.zeros((100, 50, 3), dtype=np.uint8)
+    face[:, :, 0] = 255
+    out = InferenceBatcher._preprocess(face, (112, 112))
+    assert out.shape == (112, 112, 3) and out.dtype == np.float32
+    assert out.min() >= 0.0 and out.max() <= 1.0
+
+    # RGB: kenh xanh duong nam o cuoi
+    assert out[56, 56, 2] == 1.0 and out[56, 56, 0] == 0.0
+    # 50 * 1.12 = 56 cot noi dung o giua, pad 28 cot moi ben
+    content = np.where(out[56, :, 2] > 0)[0]
+    assert content[0] == 28 and content[-1] == 83
+    assert out[:, :28].max() == 0.0 and out[:, 84:].max() == 0.0
+
+    # anh vuong -> khong pad
+    square = np.full((224, 224, 3), 128, dtype=np.uint8)
+    assert np.allclose(InferenceBatcher._preprocess(square, (112, 112)), 128 / 255.0)
+    print("[ok] _preprocess dung")
+
+
+def test_batch_equals_single():
+    print("test batch == tung anh, ket qua tra dung nguoi goi...")
+    model = StubModel()
+    use_model(model)
+    faces = random_faces(8)
+    single = [InferenceBatcher._forward([face])[0] for face in faces]
+
+    batcher = InferenceBatcher(max_batch_size=8, max_wait_ms=500)
+    futures = [batcher.submit(face) for face in faces]
+    results = [f.result(timeout=5) for f in futures]
+
+    assert max(model.calls[len(faces):]) > 1   # da gom batch that
+    for got, expected in zip(results, single):
+        assert np.allclose(got, expected, atol=1e-5)
+    assert batcher.stats()["batches"] == len(model.calls) - len(faces)
+    print("[ok] batch khop tung anh")
+
+
+def test_error_reaches_every_waiter():
+    print("test loi model -> moi nguoi cho deu nhan loi...")
+    model = StubModel(fail=True)
+    use_model(model)
+    batcher = InferenceBatcher(max_batch_size=4, max_wait_ms=500)
+    futures = [batcher.submit(face) for face in random_faces(4, seed=1)]
+    for f in futures:
+        try:
+            f.result(timeout=5)
+            raise AssertionError("phai loi")
+        except RuntimeError as e:
+            assert "GPU" in str(e)
+
+    # batcher van chay tiep sau loi
+    model.fail = False
+    assert len(batcher.embed(random_faces(1, seed=2)[0], timeout=5)) == 9
+    print("[ok] loi duoc tra ve cho tat ca")
+
+
+if __name__ == "__main__":
+    test_preprocess()
+    test_batch_equals_single()
+    test_error_reaches_every_waiter()
+    print("\nALL TESTS PASSED!")
@@ -0,0 +1,107 @@
+import sys
+import os
+import time
+import random
+from datetime import datetime, timedelta
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+from flask import Flask
+from sqlalchemy import text
+from models.db_models import db, User, Attendance, AttendanceStatus, LeaveRequest, LeaveType, LeaveStatus
+from core.leave_manager import LeaveManager
+from core.report_manager import ReportManager
+from utils.pagination import encode_cursor, decode_cursor, keyset_before
+
+# So don nghi seed (mac dinh 100k)
+LEAVE_ROWS = int(os.environ.get("LEAVE_ROWS", "100000"))
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    return app
+
+
+def paginate(fetch, limit, sort_attr):
+    """Duyet het cac trang nhu client (qua cursor dang chuoi)."""
+    seen, cursor = [], None
+    while True:
+        rows = fetch(limit, decode_cursor(cursor) if cursor else None)
+        seen += rows[:limit]
+        if len(rows) <= limit:
+            return seen
+        last = rows[limit - 1]
+        cursor = encode_cursor(getattr(last, sort_attr), last.id)
+
+
+def test_leave_pagination():
+    print(f"test phan trang {LEAVE_ROWS} don nghi...")
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(id=i, name=f"NV {i}", username=f"nv{i}") for i in range(1, 501)])
+        rng = random.Random(1)
+        base = datetime(2024, 1, 1)
+        rows = []
+        for i in range(LEAVE_ROWS):
+            # created_at trung nhau theo tung phut de kiem tra tie-break theo id
+            created = base + timedelta(minutes=rng.randrange(LEAVE_ROWS // 3))
+            rows.append(dict(user_id=rng.randint(1, 510), leave_type=LeaveType.ANNUAL_LEAVE,
+                             start_date=created, end_date=created, status=LeaveStatus.PENDING, created_at=created))
+        db.session.execute(db.insert(LeaveRequest), rows)
+        db.session.commit()
+
+        # Trang dau + trang giua: 1 query dung index, khong sort ca bang
+        cursor = (base + timedelta(minutes=LEAVE_ROWS // 6), LEAVE_ROWS // 2)
+        t = time.time()
+        page = LeaveManager.list_leave_requests(50, cursor)
+        elapsed = time.time() - t
+        assert len(page) == 51 and elapsed < 0.1, elapsed
+        stmt = db.session.query(LeaveRequest.id).filter(
+            *keyset_before(LeaveRequest.created_at, LeaveRequest.id, cursor)).order_by(
+            LeaveRequest.created_at.desc(), LeaveRequest.id.desc()).limit(51).statement
+        sql = str(stmt.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
+        plan = " ".join(r[-1] for r in db.session.execute(text("EXPLAIN QUERY PLAN " + sql)))
+        assert "ix_leave_request_created" in plan and "TEMP B-TREE FOR ORDER BY" not in plan, plan
+
+        # Duyet het: dung thu tu, khong sot / trung
+        expected = [r.id for r in LeaveRequest.query.order_by(LeaveRequest.created_at.desc(), LeaveRequest.id.desc())]
+        got = paginate(lambda limit, c: LeaveManager.list_leave_requests(limit, c), 200, "created_at")
+        assert [r.id for r in got] == expected
+
+        mine = paginate(lambda limit, c: LeaveManager.list_leave_requests(limit, c, user_id=7), 13, "created_at")
+        expected_mine = LeaveRequest.query.filter_by(user_id=7).order_by(
+            LeaveRequest.created_at.desc(), LeaveRequest.id.desc())
+        assert [r.id for r in mine] == [r.id for r in expected_mine]
+        assert mine and all(r.user_name == "NV 7" for r in mine)
+        assert any(r.user_name is None for r in got[:2000])  # user da bi xoa -> van tra ve
+        print(f"[ok] phan trang don nghi dung ({elapsed * 1000:.1f} ms / trang)")
+
+
+def test_log_pagination():
+    print("test phan trang log cham cong...")
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(id=i, name=f"NV {i}", username=f"nv{i}") for i in range(1, 6)])
+        base = datetime(2025, 1, 1, 8)
+        db.session.execute(db.insert(Attendance), [
+            dict(user_id=i % 6 + 1, checkin_time=base + timedelta(minutes=i // 4), status=AttendanceStatus.ON_TIME)
+            for i in range(1000)
+        ])
+        db.session.commit()
+
+        got = paginate(ReportManager.list_attendance_logs, 20, "checkin_time")
+        expected = Attendance.query.order_by(Attendance.checkin_time.desc(), Attendance.id.desc()).all()
+        assert [r.id for r in got] == [a.id for a in expected]
+        assert [r.name for r in got[:6]] == [a.user.name if a.user else None for a in expected[:6]]
+        print("[ok] phan trang log dung")
+
+
+if __name__ == "__main__":
+    test_leave_pagination()
+    test_log_pagination()
+    print("\nALL TESTS PASSED!")
@@ -0,0 +1,45 @@
+import sys
+import os
+import time
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+from core.principal_cache import PrincipalCache
+
+
+def test_hit_miss_and_invalidate():
+    print("test principal cache (hit / miss / invalidate)...")
+    cache = PrincipalCache(ttl=60)
+    assert cache.get(1, "tok-a") is None
+    cache.put(1, "tok-a", (1, "admin", True))
+    cache.put(1, "tok-b", (1, "admin", True))
+    cache.put(2, "tok-c", (2, "employee", True))
+    assert cache.get(1, "tok-a") == (1, "admin", True)
+
+    # khoa tai khoan -> moi token cua user 1 phai miss
+    cache.invalidate(1)
+    assert cache.get(1, "tok-a") is None and cache.get(1, "tok-b") is None
+    assert cache.get(2, "tok-c") is not None
+
+    stats = cache.stats()
+    assert stats["invalidations"] == 1 and stats["hits"] == 2 and stats["entries"] == 1
+    print("[ok] invalidate dung")
+
+
+def test_ttl_and_size():
+    print("test TTL va gioi han entry...")
+    cache = PrincipalCache(ttl=0.05, max_entries=3)
+    for uid in range(5):
+        cache.put(uid, "t", (uid, "employee", True))
+    assert cache.stats()["entries"] == 3 and cache.get(0, "t") is None
+    time.sleep(0.1)
+    assert cache.get(4, "t") is None
+    assert cache.stats()["expired"] == 1
+    print("[ok] TTL / LRU dung")
+
+
+if __name__ == "__main__":
+    test_hit_miss_and_invalidate()
+    test_ttl_and_size()
+    print("\nALL TESTS PASSED!")
@@ -0,0 +1,130 @@
+import sys
+import os
+import time
+import tempfile
+from datetime import datetime, timedelta
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+from flask import Flask
+from openpyxl import load_workbook
+from models.db_models import db, User, Attendance, AttendanceStatus, ReportJob, ReportJobStatus
+from core.report_jobs import ReportJobQueue
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    return app
+
+
+def wait_done(queue, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        db.session.expire_all()
+        job = queue.get(job_id)
+        if job.status in (ReportJobStatus.DONE, ReportJobStatus.FAILED):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("job chua xong")
+
+
+def seed():
+    db.create_all()
+    db.session.add_all([User(id=i, name=f"NV {i}", username=f"nv{i}", base_salary=1e7) for i in (1, 2, 3)])
+    db.session.add_all([
+        Attendance(user_id=i % 3 + 1, checkin_time=datetime(2025, 3, 1 + i % 28, 8), status=AttendanceStatus.ON_TIME)
+        for i in range(60)
+    ])
+    db.session.commit()
+
+
+def test_cache_reuse_and_version():
+    print("test job xuat bao cao + cache theo phien ban du lieu...")
+    app = make_app()
+    with tempfile.TemporaryDirectory() as cache_dir, app.app_context():
+        queue = ReportJobQueue(workers=1, cache_dir=cache_dir)
+        queue.init_app(app)
+        seed()
+        params = {"start_date": "2025-03-01", "end_date": "2025-03-31", "user_id": None}
+
+        job = queue.submit("attendance", params)
+        job = wait_done(queue, job.id)
+        assert job.status == ReportJobStatus.DONE, job.error
+        wb = load_workbook(queue.open_file(job))
+        assert dict(list(wb['Tổng Quan'].values)[1:])["Tổng Số Bản Ghi"] == 60
+
+        # cung tham so + du lieu khong doi -> dung lai file
+        again = queue.submit("attendance", params)
+        assert again.id == job.id and queue.stats()["cache_hits"] == 1
+
+        # du lieu doi (them ban ghi / doi trang thai) -> job moi
+        db.session.add(Attendance(user_id=1, checkin_time=datetime(2025, 3, 30, 9), status=AttendanceStatus.LATE))
+        db.session.commit()
+        newer = queue.submit("attendance", params)
+        assert newer.id != job.id
+        newer = wait_done(queue, newer.id)
+
+        Attendance.query.filter_by(user_id=1, status=AttendanceStatus.LATE).update({"status": AttendanceStatus.ON_TIME})
+        db.session.commit()
+        latest = wait_done(queue, queue.submit("attendance", params).id)
+        assert latest.id not in (job.id, newer.id)
+
+        # sua gio check-in (van trong pham vi) -> job moi
+        Attendance.query.filter_by(id=1).update({"checkin_time": datetime(2025, 3, 2, 8, 1)})
+        db.session.commit()
+        assert queue.submit("attendance", params).id != latest.id
+
+        # bang luong cung duoc cache
+        payroll = wait_done(queue, queue.submit("payroll", {"month": 3, "year": 2025}).id)
+        assert payroll.status == ReportJobStatus.DONE
+        assert queue.submit("payroll", {"month": 3, "year": 2025}).id == payroll.id
+        print("[ok] cache hit / job moi khi du lieu doi")
+
+
+def test_eviction():
+    print("test xoa cache theo tuoi / quota...")
+    app = make_app()
+    with tempfile.TemporaryDirectory() as cache_dir, app.app_context():
+        queue = ReportJobQueue(workers=1, cache_dir=cache_dir)
+        queue.init_app(app)
+        seed()
+        ids = []
+        for uid in (1, 2, 3):
+            job = queue.submit("attendance", {"start_date": None, "end_date": None, "user_id": uid})
+            ids.append(wait_done(queue, job.id).id)
+        assert len(os.listdir(cache_dir)) == 3
+
+        # tai lai job dau tien -> moi dung nhat, giu lai khi vuot quota
+        queue.open_file(queue.get(ids[0]))
+        queue.max_bytes = queue.get(ids[0]).file_size
+        queue.evict()
+        assert [j.id for j in ReportJob.query.all()] == [ids[0]]
+        assert os.listdir(cache_dir) == [f"{ids[0]}.xlsx"]
+
+        # job dang chay cua process khac: chi xoa khi mat heartbeat
+        now = datetime.utcnow()
+        db.session.add_all([
+            ReportJob(id="alive", report_type="attendance", params="{}", cache_key="a", status=ReportJobStatus.RUNNING,
+                      worker_id="other:1:x", created_at=now - timedelta(days=1), heartbeat_at=now),
+            ReportJob(id="dead", report_type="attendance", params="{}", cache_key="b", status=ReportJobStatus.RUNNING,
+                      worker_id="other:2:x", created_at=now, heartbeat_at=now - timedelta(hours=1)),
+        ])
+        db.session.commit()
+        queue.evict()
+        assert db.session.get(ReportJob, "alive") and not db.session.get(ReportJob, "dead")
+        db.session.delete(db.session.get(ReportJob, "alive"))
+        db.session.commit()
+
+        queue.max_age = 0
+        queue.evict()
+        assert ReportJob.query.count() == 0 and os.listdir(cache_dir) == []
+        print("[ok] eviction dung")
+
+
+if __name__ == "__main__":
+    test_cache_reuse_and_version()
+    test_eviction()
+    print("\nALL TESTS PASSED!")
@@ -0,0 +1,179 @@
+import sys
+import os
+import time
+import random
+from datetime import datetime, timedelta
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+from flask import Flask
+from models.db_models import db, User, Attendance, AttendanceStatus, UserRole, Payroll
+from core.salary_manager import SalaryManager
+from core.attendance_rollup import AttendanceRollupManager
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    return app
+
+
+def legacy_salary(user, month, year):
+    """Logic cu (3 query / user) de doi chieu ket qua"""
+    start_date = datetime(year, month, 1)
+    end_date = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    attendances = Attendance.query.filter(
+        Attendance.user_id == user.id,
+        Attendance.checkin_time >= start_date,
+        Attendance.checkin_time < end_date
+    ).all()
+    total_workdays = len([a for a in attendances if a.status in [AttendanceStatus.ON_TIME, AttendanceStatus.ON_LEAVE]])
+    late_count = len([a for a in attendances if a.status == AttendanceStatus.LATE])
+    year_attendances = Attendance.query.filter(
+        Attendance.user_id == user.id,
+        Attendance.checkin_time >= datetime(year, 1, 1),
+        Attendance.checkin_time <= datetime(year, 12, 31, 23, 59, 59),
+        Attendance.status.in_([AttendanceStatus.ON_TIME, AttendanceStatus.ON_LEAVE])
+    ).count()
+    auto_bonus = SalaryManager.BONUS_AMOUNT if year_attendances > SalaryManager.BONUS_THRESHOLD_DAYS else 0.0
+    base_salary = user.base_salary or 0.0
+    gross_salary = (base_salary / SalaryManager.WORKDAYS_PER_MONTH) * total_workdays
+    total_penalty = late_count * SalaryManager.DEFAULT_PENALTY_PER_LATE
+    return {
+        "user_id": user.id, "user_name": user.name, "username": user.username, "month": month, "year": year,
+        "base_salary": base_salary, "total_workdays": total_workdays, "late_count": late_count,
+        "penalty_per_late": SalaryManager.DEFAULT_PENALTY_PER_LATE, "bonus": auto_bonus,
+        "year_workdays": year_attendances, "gross_salary": round(gross_salary, 2),
+        "total_penalty": total_penalty, "net_salary": round(gross_salary - total_penalty + auto_bonus, 2)
+    }
+
+
+def seed(users, days, rng):
+    db.session.add_all([
+        User(id=i, name=f"NV {i}", username=f"nv{i}", role=UserRole.EMPLOYEE,
+             base_salary=None if i % 7 == 0 else 8000000 + i * 1000)
+        for i in range(1, users + 1)
+    ])
+    statuses = list(AttendanceStatus)
+    rows = []
+    for uid in range(1, users + 1):
+        if uid % 11 == 0:
+            continue    # nhan vien khong co cham cong
+        for day in rng.sample(range(365), days):
+            t = datetime(2025, 1, 1, 7) + timedelta(days=day, minutes=rng.randrange(600))
+            # vai nhan vien chuyen can -> du nguong thuong nam
+            status = AttendanceStatus.ON_TIME if uid <= 5 else rng.choice(statuses)
+            rows.append({"user_id": uid, "checkin_time": t, "status": status})
+    # Bien cuoi nam / dau nam sau
+    rows.append({"user_id": 1, "checkin_time": datetime(2025, 12, 31, 23, 59, 59), "status": AttendanceStatus.ON_TIME})
+    rows.append({"user_id": 1, "checkin_time": datetime(2026, 1, 1), "status": AttendanceStatus.ON_TIME})
+    db.session.bulk_insert_mappings(Attendance, rows)
+    db.session.commit()
+    # insert thang vao bang -> dung rollup nhu lenh backfill
+    AttendanceRollupManager.rebuild()
+
+
+def test_bulk_matches_legacy():
+    print("test bulk salary == logic cu...")
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        seed(users=60, days=320, rng=random.Random(1))
+        for month in (1, 6, 12):
+            bulk = SalaryManager.calculate_salary_for_all(month, 2025)
+            legacy = [legacy_salary(u, month, 2025) for u in User.query.order_by(User.id).all()]
+            assert bulk == legacy, month
+        assert SalaryManager.calculate_salary_for_user(5, 6, 2025) == legacy_salary(db.session.get(User, 5), 6, 2025)
+        assert SalaryManager.calculate_salary_for_user(999, 6, 2025) is None
+        assert any(r["bonus"] for r in bulk) and not all(r["bonus"] for r in bulk)
+    print("[ok] ket qua giong het")
+
+
+def test_bulk_speed():
+    print("test 10k nhan vien...")
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        seed(users=10000, days=25, rng=random.Random(2))
+        t0 = time.perf_counter()
+        results = SalaryManager.calculate_salary_for_all(6, 2025)
+        elapsed = time.perf_counter() - t0
+        assert len(results) == 10000
+        assert elapsed < 10, elapsed   # chi bat vong lap query / user, khong do hieu nang
+    print(f"[ok] 10k nhan vien: {elapsed:.2f}s")
+
+
+def test_confirm_batch():
+    print("test confirm luong hang loat (partial / atomic)...")
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(id=i, name=f"NV {i}", username=f"nv{i}", role=UserRole.EMPLOYEE) for i in range(1, 1201)])
+        db.session.commit()
+        ok, _, _ = SalaryManager.confirm_payroll({"user_id": 1, "month": 3, "year": 2025}, 1)
+        assert ok
+
+        rows = [{"user_id": i, "month": 3, "year": 2025, "base_salary": 2600000, "total_workdays": 26} for i in range(1, 1201)]
+        rows.append({"user_id": 5, "month": 3, "year": 2025})   # trung trong danh sach
+        rows.append({"user_id": 9999, "month": 3, "year": 2025})  # khong ton tai
+
+        saved, results = SalaryManager.confirm_payroll_batch(rows, 1, mode="atomic")
+        assert saved == 0 and Payroll.query.count() == 1
+
+        saved, results = SalaryManager.confirm_payroll_batch(rows, 1, mode="partial")
+        assert saved == 1199 and Payroll.query.count() == 1200
+        failed = [r["index"] for r in results if not r["success"]]
+        assert failed == [0, 1200, 1201]
+        assert all(r["payroll_id"] for r in results if r["success"])
+        assert db.session.get(Payroll, results[1]["payroll_id"]).user_id == 2
+        assert db.session.get(Payroll, results[1]["payroll_id"]).net_salary == 2600000
+
+        # id sai kieu -> loi tung dong thay vi TypeError; chuoi so duoc ep ve int
+        db.session.add(User(id=1201, name="NV 1201", username="nv1201", role=UserRole.EMPLOYEE))
+        db.session.commit()
+        rows = [
+            {"user_id": [1], "month": 4, "year": 2025},
+            {"user_id": {"id": 2}, "month": 4, "year": 2025},
+            {"user_id": "abc", "month": 4, "year": 2025},
+            {"user_id": 3, "month": [4], "year": 2025},
+            {"user_id": "1201", "month": "4", "year": "2025"},
+        ]
+        saved, results = SalaryManager.confirm_payroll_batch(rows, 1, mode="partial")
+        assert saved == 1
+        assert [r["message"] for r in results[:4]] == ["user_id không hợp lệ"] * 3 + ["month không hợp lệ"]
+        assert results[4]["success"] and results[4]["user_id"] == 1201
+        payroll = db.session.get(Payroll, results[4]["payroll_id"])
+        assert (payroll.user_id, payroll.month, payroll.year) == (1201, 4, 2025)
+
+        # cot so sai kieu -> loi tung dong, chuoi so duoc ep kieu truoc khi tinh
+        rows = [
+            {"user_id": 1, "month": 5, "year": 2025, "base_salary": "abc"},
+            {"user_id": 2, "month": 5, "year": 2025, "bonus": [1]},
+            {"user_id": 3, "month": 5, "year": 2025, "late_count": "2.5"},
+            {"user_id": 4, "month": 5, "year": 2025, "base_salary": "2600000", "total_workdays": "26",
+             "late_count": "2", "penalty_per_late": "5", "bonus": None},
+        ]
+        saved, results = SalaryManager.confirm_payroll_batch(rows, 1, mode="atomic")
+        assert saved == 0 and results[3]["message"].endswith("(atomic)")
+        saved, results = SalaryManager.confirm_payroll_batch(rows, 1, mode="partial")
+        assert saved == 1
+        assert [r["message"] for r in results[:3]] == [
+            "base_salary không hợp lệ", "bonus không hợp lệ", "late_count không hợp lệ"]
+        payroll = db.session.get(Payroll, results[3]["payroll_id"])
+        assert (payroll.late_count, payroll.total_penalty, payroll.bonus, payroll.net_salary) == (2, 10, 0.0, 2599990)
+
+        # xoa nhan vien da co luong confirm (nhu DELETE /api/employees/<id>) -> xoa ca lich su luong
+        AttendanceRollupManager.delete_user(4)
+        db.session.delete(db.session.get(User, 4))
+        db.session.commit()
+        assert Payroll.query.filter_by(user_id=4).count() == 0 and Payroll.query.count() > 0
+    print("[ok] confirm batch dung")
+
+
+if __name__ == "__main__":
+    test_bulk_matches_legacy()
+    test_bulk_speed()
+    test_confirm_batch()
+    print("\nALL TESTS PASSED!")
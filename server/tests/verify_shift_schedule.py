@@ -0,0 +1,62 @@
+import sys
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+# them duong dan server vao path
+sys.path.append(os.path.join(os.getcwd(), 'server'))
+
+from core.shift_manager import ShiftSchedule, ShiftManager, parse_time_seconds
+from models.db_models import AttendanceStatus
+
+
+def shift(id, start, end, grace=15):
+    return SimpleNamespace(id=id, start_time=start, end_time=end, grace_period_minutes=grace)
+
+
+def at(hms):
+    return parse_time_seconds(hms)
+
+
+def test_day_shifts():
+    print("test ca ngay + buffer 30p...")
+    schedule = ShiftSchedule([shift(1, "08:00:00", "12:00:00"), shift(2, "13:00:00", "17:00:00")])
+    assert schedule.candidates(at("07:29:59")) == ()
+    assert schedule.candidates(at("07:30:00")) == (1,)
+    assert schedule.candidates(at("12:00:00")) == (1,)
+    assert schedule.candidates(at("12:15:00")) == ()
+    assert schedule.candidates(at("12:30:00")) == (2,)
+    assert schedule.candidates(at("17:00:01")) == ()
+    print("[ok] ca ngay dung")
+
+
+def test_overnight_and_overlap():
+    print("test ca qua dem + ca chong nhau...")
+    schedule = ShiftSchedule([
+        shift(3, "22:00:00", "06:00:00"),
+        shift(1, "05:30:00", "14:00:00"),
+        shift(2, "bad", "14:00:00"),        # sai dinh dang -> bo qua
+    ])
+    assert len(schedule) == 2
+    assert schedule.candidates(at("21:30:00")) == (3,)
+    assert schedule.candidates(at("00:00:00")) == (3,)
+    assert schedule.candidates(at("05:00:00")) == (1, 3)  # sap theo id
+    assert schedule.candidates(at("06:00:01")) == (1,)
+    print("[ok] ca qua dem dung")
+
+
+def test_status_overnight():
+    print("test tinh di muon cho ca qua dem...")
+    night = shift(99, "22:00:00", "06:00:00", grace=15)
+    assert ShiftManager.calculate_status(datetime(2024, 1, 1, 21, 45), night) == AttendanceStatus.ON_TIME
+    assert ShiftManager.calculate_status(datetime(2024, 1, 1, 22, 10), night) == AttendanceStatus.ON_TIME
+    assert ShiftManager.calculate_status(datetime(2024, 1, 2, 1, 0), night) == AttendanceStatus.LATE
+    assert ShiftManager.calculate_status(None, None) == AttendanceStatus.OVERTIME
+    print("[ok] trang thai dung")
+
+
+if __name__ == "__main__":
+    test_day_shifts()
+    test_overnight_and_overlap()
+    test_status_overnight()
+    print("\nALL TESTS PASSED!")
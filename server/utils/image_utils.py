@@ -0,0 +1,144 @@
+import base64
+import binascii
+import struct
+import cv2
+import numpy as np
+
+# Ảnh sau decode chỉ cần cạnh dài ~640px cho detector / ArcFace
+DECODE_TARGET_SIDE = 640
+MAX_UPLOAD_BYTES = 15 * 1024 * 1024
+
+MAGIC_BYTES = {
+    b"\xff\xd8\xff": "jpeg",
+    b"\x89PNG\r\n\x1a\n": "png",
+    b"BM": "bmp",
+}
+
+# (hệ số thu nhỏ, flag) theo thứ tự từ nhỏ nhất
+_REDUCED_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+# SOF markers (trừ DHT 0xC4, JPG 0xC8, DAC 0xCC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def sniff_format(buf):
+    """Nhận dạng định dạng ảnh từ magic bytes, None nếu không hỗ trợ."""
+    head = bytes(buf[:12])
+    for magic, fmt in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return fmt
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def jpeg_dimensions(buf):
+    """Đọc (width, height) từ header JPEG mà không decode ảnh. None nếu không đọc được."""
+    i, n = 2, len(buf)
+    while i + 9 < n:
+        if buf[i] != 0xFF:
+            return None
+        marker = buf[i + 1]
+        if marker == 0xFF:          # padding
+            i += 1
+            continue
+        if marker in (0x01,) or 0xD0 <= marker <= 0xD9:
+            i += 2
+            continue
+        seg_len = struct.unpack(">H", bytes(buf[i + 2:i + 4]))[0]
+        if marker in _SOF_MARKERS:
+            height, width = struct.unpack(">HH", bytes(buf[i + 5:i + 9]))
+            return width, height
+        i += 2 + seg_len
+    return None
+
+
+def reduced_decode_flag(width, height, target_side=DECODE_TARGET_SIDE):
+    """Chọn IMREAD_REDUCED_* lớn nhất mà cạnh dài vẫn >= target_side."""
+    long_side = max(width, height)
+    for factor, flag in _REDUCED_FLAGS:
+        if long_side // factor >= target_side:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def b64_payload(b64_str):
+    """Bỏ prefix data URL ("data:image/jpeg;base64,") mà không split cả chuỗi."""
+    idx = b64_str.find("base64,", 0, 100)
+    return b64_str[idx + 7:] if idx != -1 else b64_str
+
+
+def read_stream(stream, length=None, limit=MAX_UPLOAD_BYTES, chunk_size=65536):
+    """
+    Đọc stream (request body / file upload) vào 1 bytearray duy nhất bằng readinto,
+    không tạo bản sao trung gian. Returns: bytearray hoặc None nếu vượt `limit`.
+    """
+    if length is not None:
+        if length > limit:
+            return None
+        buf = bytearray(length)
+        view = memoryview(buf)
+        pos = 0
+        while pos < length:
+            n = stream.readinto(view[pos:])
+            if not n:
+                break
+            pos += n
+        return buf if pos == length else buf[:pos]
+
+    buf = bytearray()
+    chunk = bytearray(chunk_size)
+    view = memoryview(chunk)
+    while True:
+        n = stream.readinto(view)
+        if not n:
+            return buf
+        buf += view[:n]
+        if len(buf) > limit:
+            return None
+
+
+def decode_image_bytes(buf, target_side=DECODE_TARGET_SIDE):
+    """
+    bytes-like (bytes, bytearray, memoryview) -> ảnh BGR, hoặc None nếu không hợp lệ.
+    JPEG lớn được decode ở độ phân giải giảm (IMREAD_REDUCED_*), không qua ảnh full-size.
+    """
+    if buf is None or len(buf) == 0 or len(buf) > MAX_UPLOAD_BYTES:
+        return None
+    fmt = sniff_format(buf)
+    if fmt is None:
+        return None
+
+    flag = cv2.IMREAD_COLOR
+    if fmt == "jpeg":
+        dims = jpeg_dimensions(memoryview(buf)[:65536])
+        if dims:
+            flag = reduced_decode_flag(*dims, target_side=target_side)
+
+    arr = np.frombuffer(buf, np.uint8)
+    return cv2.imdecode(arr, flag)
+
+
+def decode_image(source, target_side=DECODE_TARGET_SIDE):
+    """
+    Decode ảnh từ chuỗi base64 (có/không data URL), bytes-like
+    hoặc file-like (VD: FileStorage của multipart upload).
+    """
+    if source is None:
+        return None
+    if hasattr(source, "read"):
+        source = source.read(MAX_UPLOAD_BYTES + 1)
+    if isinstance(source, str):
+        payload = b64_payload(source)
+        try:
+            # Check magic bytes trên 16 ký tự đầu trước khi decode toàn bộ
+            if sniff_format(base64.b64decode(payload[:16])) is None:
+                return None
+            source = base64.b64decode(payload)
+        except (binascii.Error, ValueError):
+            return None
+    return decode_image_bytes(source, target_side=target_side)
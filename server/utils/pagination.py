@@ -0,0 +1,30 @@
+import base64
+from datetime import datetime
+
+# config
+PAGE_MAX_LIMIT = 200
+
+
+def encode_cursor(sort_value, row_id):
+    """(datetime, id) của dòng cuối trang -> chuỗi cursor (opaque) cho trang sau."""
+    raw = f"{sort_value.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Chuỗi cursor -> (datetime, id). Raise ValueError nếu cursor sai."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        sort_value, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def keyset_before(sort_column, id_column, cursor):
+    """
+    Điều kiện (sort_column, id) < cursor cho danh sách sắp giảm dần.
+    Viết tách ra (<= và OR) để SQLite vẫn seek được index bắt đầu bằng sort_column.
+    """
+    sort_value, row_id = cursor
+    return [sort_column <= sort_value, (sort_column < sort_value) | (id_column < row_id)]